@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Offline synthetic-scale benchmark for the ChatHistoryManager vector store.
+
+Generates synthetic conversations at several history sizes and measures add_entry
+throughput, cold-start load time, search latency percentiles, get_recent_history
+latency, resident memory and bytes on disk. No OpenAI key and no model download are
+needed: embeddings come from a deterministic stub encoder, or from a cached matrix of
+real embeddings (--embeddings cache.npy, e.g. from benchmark_encoders.py --save-embeddings).
+
+Every scale runs in a fresh subprocess so memory numbers are not polluted by the
+previous scale. Results are printed as a table and can be written as JSON and
+compared against a previous run to spot regressions.
+
+Usage:
+    python benchmark_chat_history.py                            # 1k, 10k, 100k and 1M entries
+    python benchmark_chat_history.py --scales 1000 10000 --json bench.json
+    python benchmark_chat_history.py --scales 1000 10000 --baseline bench.json --fail-threshold 0.25
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import numpy as np
+from datetime import datetime, timedelta
+
+DEFAULT_SCALES = [1000, 10000, 100000, 1000000]
+EMBEDDING_DIM = 384
+
+AGENTS = [
+    "Web Scraper", "Business Environment Analyst", "Market Research Analyst", "Data Analyst",
+    "Content Writer", "Social Media Manager", "Social Media Video Creator", "Graphic Designer",
+    "Video Editor", "PDF Producer", "PowerPoint Producer", "Pitch Deck Producer",
+]
+TOPICS = [
+    "social care in Peterborough", "electric vehicle charging", "a vegan bakery", "fintech onboarding",
+    "the American civil war", "remote work tools", "a boutique hotel", "cyber security training",
+    "urban beekeeping", "a SaaS pricing page", "renewable energy grants", "a fitness app launch",
+]
+SENTENCES = [
+    "The market has grown steadily over the last five years.",
+    "Key competitors focus on price while premium segments remain underserved.",
+    "Customer interviews point to onboarding friction as the main churn driver.",
+    "## Key Findings",
+    "- Demand is concentrated in urban areas with younger demographics.",
+    "- Regulatory changes expected next year will raise compliance costs.",
+    "Our recommendation is to pilot the offering in two regions before scaling.",
+    "### Next Steps",
+    "1. Validate pricing with a small cohort of early adopters.",
+    "2. Build partnerships with local suppliers to reduce lead times.",
+    "Social channels show strong engagement with short-form video content.",
+    "Data quality issues were found in roughly eight percent of scraped records.",
+]
+
+# Metrics where larger is better; for every other metric a larger number is a regression
+HIGHER_IS_BETTER = {"add_entry_per_sec"}
+
+
+class StubEncoder:
+    """Deterministic pseudo-embeddings (HistoryEncoder): the same text always maps to the same unit vector."""
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.identity = f"benchmark-stub:dim{dim}"
+
+    def encode(self, text: str) -> np.ndarray:
+        vector = np.random.default_rng(zlib.crc32(text.encode('utf-8'))).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+    def encode_batch(self, texts: list, batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.encode(text) for text in texts])
+
+
+class CachedEmbeddingEncoder(StubEncoder):
+    """Serves rows of a cached matrix of real embeddings, chosen deterministically per text."""
+
+    def __init__(self, path: str):
+        self.matrix = np.load(path).astype(np.float32)
+        super().__init__(self.matrix.shape[1])
+        self.identity = f"benchmark-cached:{os.path.basename(path)}"
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.matrix[zlib.crc32(text.encode('utf-8')) % len(self.matrix)]
+
+
+def make_encoder(args):
+    """Pick the benchmark encoder: cached real embeddings, the hashing encoder, or the stub."""
+    if args.embeddings:
+        return CachedEmbeddingEncoder(args.embeddings)
+    if args.encoder == "hashing":
+        from encoders import HashingEncoder
+        return HashingEncoder(EMBEDDING_DIM)
+    return StubEncoder()
+
+
+def synthetic_conversation(i: int, rng: np.random.Generator, response_words: int, start: datetime) -> dict:
+    """Build one synthetic conversation with realistic agent names and markdown-ish responses."""
+    topic = TOPICS[rng.integers(len(TOPICS))]
+    if rng.random() < 0.25:
+        workflow = rng.choice(AGENTS, size=3, replace=False)
+        chosen_agent = f"Multi-agent workflow: {' -> '.join(workflow)}"
+    else:
+        chosen_agent = AGENTS[rng.integers(len(AGENTS))]
+    sentences = []
+    words = 0
+    target = int(rng.integers(response_words // 2, response_words * 2))
+    while words < target:
+        sentence = SENTENCES[rng.integers(len(SENTENCES))]
+        sentences.append(sentence)
+        words += len(sentence.split())
+    return {
+        "user_prompt": f"Request {i}: prepare a report about {topic} and summarise the key risks",
+        "manager_response": f"# Report on {topic}\n\n" + "\n".join(sentences),
+        "chosen_agent": chosen_agent,
+        "timestamp": (start + timedelta(seconds=i)).isoformat(),
+    }
+
+
+def percentiles(samples_ms: list) -> dict:
+    if not samples_ms:
+        return {"p50": None, "p95": None, "p99": None}
+    return {
+        "p50": round(float(np.percentile(samples_ms, 50)), 4),
+        "p95": round(float(np.percentile(samples_ms, 95)), 4),
+        "p99": round(float(np.percentile(samples_ms, 99)), 4),
+    }
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (Linux /proc, falling back to peak RSS)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def timed_ms(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000
+
+
+def run_scale(scale: int, args) -> dict:
+    """Build a store of `scale` entries and measure it. Runs inside its own process."""
+    from chat_history_manager import ChatHistoryManager
+
+    encoder = make_encoder(args)
+    store_dir = os.path.join(args.store_dir, f"scale_{scale}")
+    shutil.rmtree(store_dir, ignore_errors=True)
+    rng = np.random.default_rng(args.seed)
+    start_time = datetime(2024, 1, 1)
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    # Build the store in chunks with the batched API, then compact once like a long-lived store
+    with quiet:
+        manager = ChatHistoryManager(db_path=store_dir, encoder=encoder)
+        build_start = time.perf_counter()
+        for chunk_start in range(0, scale, args.chunk_size):
+            chunk = [synthetic_conversation(i, rng, args.response_words, start_time)
+                     for i in range(chunk_start, min(scale, chunk_start + args.chunk_size))]
+            manager.add_entries(chunk)
+        build_seconds = time.perf_counter() - build_start
+        compaction = manager.compact_storage()
+
+        # add_entry throughput on top of the existing history (the save happens in the background)
+        append_ms = [
+            timed_ms(manager.add_entry, **{k: v for k, v in synthetic_conversation(
+                scale + i, rng, args.response_words, start_time).items() if k != "timestamp"})
+            for i in range(args.appends)
+        ]
+        manager.close()
+
+    # Cold start: a fresh manager loading everything from disk
+    rss_before = rss_bytes()
+    with quiet:
+        load_start = time.perf_counter()
+        manager = ChatHistoryManager(db_path=store_dir, encoder=encoder, out_of_core=args.out_of_core,
+                                     search_threads=args.search_threads)
+        cold_start_seconds = time.perf_counter() - load_start
+    rss_after = rss_bytes()
+
+    search_ms = [timed_ms(manager.search_similar_conversations, f"query {i} about {TOPICS[i % len(TOPICS)]}", 5)
+                 for i in range(args.queries)]
+    recent_ms = [timed_ms(manager.get_recent_history, 50) for _ in range(args.queries)]
+    recent_preview_ms = [timed_ms(manager.get_recent_history, 1000, include_text=False) for _ in range(args.queries)]
+    stats = manager.get_collection_stats()
+
+    result = {
+        "scale": scale,
+        "build_seconds": round(build_seconds, 3),
+        "compaction_seconds": compaction["seconds"],
+        "add_entry_per_sec": round(1000 * len(append_ms) / sum(append_ms), 2) if append_ms else None,
+        "add_entry_ms": percentiles(append_ms),
+        "cold_start_seconds": round(cold_start_seconds, 4),
+        "search_ms": percentiles(search_ms),
+        "recent_history_50_ms": percentiles(recent_ms),
+        "recent_history_1000_preview_ms": percentiles(recent_preview_ms),
+        "rss_bytes": rss_after,
+        "rss_delta_load_bytes": rss_after - rss_before,
+        "resident_embedding_bytes": stats["resident_embedding_bytes"],
+        "disk_bytes_total": stats["disk_bytes_total"],
+        "disk_bytes": stats["disk_bytes"],
+    }
+    if not args.keep:
+        shutil.rmtree(store_dir, ignore_errors=True)
+    return result
+
+
+def flatten(result: dict, prefix: str = "") -> dict:
+    """Flatten nested metrics into dotted keys (search_ms.p95, ...)."""
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare_with_baseline(results: list, baseline_path: str, threshold: float) -> list:
+    """Print relative change per metric against a previous run; return regressions above threshold."""
+    with open(baseline_path, 'r') as f:
+        baseline = {r["scale"]: flatten(r) for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\n📈 Change vs baseline {baseline_path}")
+    for result in results:
+        previous = baseline.get(result["scale"])
+        if not previous:
+            continue
+        for metric, value in flatten(result).items():
+            old = previous.get(metric)
+            if metric == "scale" or metric.startswith("disk_bytes.") or not old:
+                continue
+            change = (value - old) / old
+            worse = -change if metric.split(".")[0] in HIGHER_IS_BETTER else change
+            flag = " ⚠️" if worse > threshold else ""
+            print(f"  {result['scale']:>8} {metric:<40} {old:>14} -> {value:<14} {change:+.1%}{flag}")
+            if worse > threshold:
+                regressions.append((result["scale"], metric, old, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic-scale benchmark for the chat history vector store")
+    parser.add_argument("--scales", nargs="+", type=int, default=DEFAULT_SCALES)
+    parser.add_argument("--appends", type=int, default=10, help="add_entry calls measured per scale")
+    parser.add_argument("--queries", type=int, default=50, help="Searches / history reads measured per scale")
+    parser.add_argument("--response-words", type=int, default=120, help="Average words per synthetic response")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Entries per add_entries batch while building")
+    parser.add_argument("--encoder", choices=["stub", "hashing"], default="stub",
+                        help="stub: random vectors per text; hashing: the model-free HashingEncoder (realistic encode cost)")
+    parser.add_argument("--embeddings", default=None, help="Cached real embeddings (.npy) instead of the stub encoder")
+    parser.add_argument("--store-dir", default=None, help="Where synthetic stores are built (default: temp dir)")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic stores after measuring")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", default=None, help="Write machine-readable results here")
+    parser.add_argument("--baseline", default=None, help="Previous --json output to compare against")
+    parser.add_argument("--fail-threshold", type=float, default=None,
+                        help="Exit non-zero if any metric regresses by more than this fraction vs --baseline")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="Measure the cold-loaded store with embeddings left on disk (streaming search)")
+    parser.add_argument("--search-threads", type=int, default=1, help="Threads scanning blocks in streaming search")
+    parser.add_argument("--run-scale", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scale is not None:
+        # Child process: measure one scale and report JSON on the last stdout line
+        print(json.dumps(run_scale(args.run_scale, args)))
+        return 0
+
+    temp_dir = None
+    if args.store_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix="chat_history_bench_")
+        args.store_dir = temp_dir
+
+    print(f"🧪 Chat history benchmark: scales {args.scales} "
+          f"({'cached embeddings' if args.embeddings else args.encoder + ' encoder'})")
+    print("=" * 60)
+
+    results = []
+    child_args = ["--store-dir", args.store_dir, "--appends", str(args.appends), "--queries", str(args.queries),
+                  "--response-words", str(args.response_words), "--chunk-size", str(args.chunk_size),
+                  "--seed", str(args.seed), "--encoder", args.encoder,
+                  "--search-threads", str(args.search_threads)]
+    if args.embeddings:
+        child_args += ["--embeddings", os.path.abspath(args.embeddings)]
+    if args.keep:
+        child_args.append("--keep")
+    if args.out_of_core:
+        child_args.append("--out-of-core")
+    try:
+        for scale in args.scales:
+            print(f"⏱️ {scale:,} entries...")
+            cmd = [sys.executable, os.path.abspath(__file__), "--run-scale", str(scale)] + child_args
+            child = subprocess.run(cmd, capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+            if child.returncode != 0:
+                print(f"❌ Scale {scale} failed:\n{child.stderr[-2000:]}")
+                continue
+            results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+    finally:
+        if temp_dir and not args.keep:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print(f"\n{'entries':>9}{'build s':>9}{'add/s':>8}{'load s':>9}{'search p50':>11}{'p95':>8}{'p99':>8}"
+          f"{'recent50':>10}{'rss MB':>8}{'disk MB':>9}")
+    for r in results:
+        print(f"{r['scale']:>9}{r['build_seconds']:>9}{r['add_entry_per_sec']:>8}{r['cold_start_seconds']:>9}"
+              f"{r['search_ms']['p50']:>11}{r['search_ms']['p95']:>8}{r['search_ms']['p99']:>8}"
+              f"{r['recent_history_50_ms']['p50']:>10}{r['rss_bytes'] / 1e6:>8.1f}{r['disk_bytes_total'] / 1e6:>9.1f}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({"created": datetime.now().isoformat(), "encoder": "cached" if args.embeddings else args.encoder,
+                       "results": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.json_path}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.fail_threshold or 0.0)
+        if args.fail_threshold is not None and regressions:
+            print(f"\n❌ {len(regressions)} metric(s) regressed by more than {args.fail_threshold:.0%}")
+            return 1
+
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark the chat history encoder backends on CPU.
+
+For every backend this reports single-text latency (p50/p95), batch throughput and
+how closely its embeddings agree with the reference float32 torch model (cosine
+agreement and nearest-neighbour recall), so the fastest backend that keeps recall
+can be picked for HISTORY_ENCODER_BACKEND. The model-free hashing encoder lives in a
+different embedding space, so only its recall@5 is meaningful.
+
+Usage:
+    python benchmark_encoders.py
+    python benchmark_encoders.py --backends torch quantized onnx --threads 4 --json results.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from encoders import create_encoder, ENCODER_BACKENDS, DEFAULT_MODEL_NAME
+from blob_store import BlobStore
+from text_codec import TextCodec, CODEC_RAW
+
+
+def load_sample_texts(metadata_file: str, limit: int) -> list:
+    """Load real conversation texts from the history store, padded with synthetic ones."""
+    texts = []
+    if os.path.exists(metadata_file):
+        prefix = metadata_file[:-len("_metadata.json")]
+        blob_store = BlobStore(prefix + "_blobs.bin") if os.path.exists(prefix + "_blobs.bin") else None
+        codec = TextCodec(prefix)
+
+        def read(ref):
+            return codec.decode(blob_store.read(ref[0], ref[1]), ref[2] if len(ref) > 2 else CODEC_RAW)
+
+        with open(metadata_file, 'r') as f:
+            for entry in json.load(f):
+                if "user_prompt_ref" in entry and blob_store is not None:
+                    user_prompt = read(entry["user_prompt_ref"])
+                    manager_response = read(entry["manager_response_ref"])
+                else:
+                    user_prompt = entry.get("user_prompt", "")
+                    manager_response = entry.get("manager_response", "")
+                texts.append(f"User: {user_prompt}\nManager: {manager_response}")
+        if blob_store is not None:
+            blob_store.close()
+
+    topics = ["market research", "web scraping", "pitch deck", "social media campaign",
+              "PDF report", "data analysis", "logo design", "business environment"]
+    i = 0
+    while len(texts) < limit:
+        topic = topics[i % len(topics)]
+        texts.append(f"User: Please help with {topic} for project {i}\nManager: Allocating {topic} task {i}.")
+        i += 1
+    return texts[:limit]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _cell(value) -> str:
+    """A table cell, with n/a for metrics that do not apply."""
+    return "n/a" if value is None else str(value)
+
+
+def recall_at_k(reference: np.ndarray, candidate: np.ndarray, k: int = 5) -> float:
+    """Fraction of each text's k nearest neighbours (by the reference model) that the candidate also retrieves."""
+    k = min(k, len(reference) - 1)
+    if k <= 0:
+        return 1.0
+    ref_sim = reference @ reference.T
+    cand_sim = candidate @ candidate.T
+    np.fill_diagonal(ref_sim, -np.inf)
+    np.fill_diagonal(cand_sim, -np.inf)
+    ref_top = np.argpartition(-ref_sim, k, axis=1)[:, :k]
+    cand_top = np.argpartition(-cand_sim, k, axis=1)[:, :k]
+    overlap = [len(set(r) & set(c)) / k for r, c in zip(ref_top, cand_top)]
+    return float(np.mean(overlap))
+
+
+def benchmark_backend(backend: str, texts: list, num_threads: int, batch_size: int, repeats: int) -> dict:
+    """Measure load time, latency and throughput for one backend."""
+    start = time.perf_counter()
+    encoder = create_encoder(backend, DEFAULT_MODEL_NAME, num_threads)
+    load_seconds = time.perf_counter() - start
+
+    # Warm up kernels and caches before timing
+    encoder.encode_batch(texts[:batch_size], batch_size=batch_size)
+
+    latencies = []
+    for text in texts[:repeats]:
+        start = time.perf_counter()
+        encoder.encode(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    embeddings = encoder.encode_batch(texts, batch_size=batch_size)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "identity": encoder.identity,
+        "load_seconds": round(load_seconds, 3),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+        "throughput_texts_per_sec": round(len(texts) / batch_seconds, 1),
+        "embeddings": np.asarray(embeddings, dtype=np.float32),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat history encoder backends")
+    parser.add_argument("--backends", nargs="+", default=list(ENCODER_BACKENDS), choices=ENCODER_BACKENDS)
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads per backend")
+    parser.add_argument("--samples", type=int, default=256, help="Number of texts to encode")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=50, help="Single-text encodes used for latency")
+    parser.add_argument("--metadata-file", default="./vector_db/chat_history_metadata.json")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write machine-readable results here")
+    parser.add_argument("--save-embeddings", default=None,
+                        help="Save the reference embeddings as .npy (input for benchmark_chat_history.py --embeddings)")
+    args = parser.parse_args()
+
+    texts = load_sample_texts(args.metadata_file, args.samples)
+    print(f"🧪 Benchmarking {len(args.backends)} encoder backends on {len(texts)} texts "
+          f"(threads={args.threads or 'default'}, batch={args.batch_size})")
+    print("=" * 60)
+
+    # The float32 torch model is the reference for agreement, so always run it first
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    results = []
+    reference = None
+    reference_identity = None
+    for backend in backends:
+        try:
+            result = benchmark_backend(backend, texts, args.threads, args.batch_size, args.repeats)
+        except Exception as e:
+            print(f"⚠️ {backend}: skipped ({e})")
+            continue
+
+        embeddings = _normalize(result.pop("embeddings"))
+        if reference is None:
+            reference = embeddings
+            reference_identity = result["identity"]
+            if args.save_embeddings:
+                np.save(args.save_embeddings, reference)
+        # Cosine agreement only makes sense between encoders that share an embedding space
+        # (None otherwise, which stays valid JSON unlike NaN)
+        result["cosine_agreement_mean"] = result["cosine_agreement_min"] = None
+        if result["identity"] == reference_identity:
+            cosine = np.sum(reference * embeddings, axis=1)
+            result["cosine_agreement_mean"] = round(float(np.mean(cosine)), 5)
+            result["cosine_agreement_min"] = round(float(np.min(cosine)), 5)
+        result["recall_at_5"] = round(recall_at_k(reference, embeddings, k=5), 4)
+        results.append(result)
+
+    print(f"{'backend':<16}{'load s':>8}{'p50 ms':>9}{'p95 ms':>9}{'texts/s':>10}{'cos mean':>10}{'cos min':>9}{'R@5':>7}")
+    for r in results:
+        print(f"{r['backend']:<16}{r['load_seconds']:>8}{r['latency_ms_p50']:>9}{r['latency_ms_p95']:>9}"
+              f"{r['throughput_texts_per_sec']:>10}{_cell(r['cosine_agreement_mean']):>10}"
+              f"{_cell(r['cosine_agreement_min']):>9}{r['recall_at_5']:>7}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({"threads": args.threads, "samples": len(texts), "results": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.json_path}")
+
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import os
+import mmap
+import threading
+from typing import Tuple
+
+
+class BlobStore:
+    """
+    Append-only file of text blobs addressed by (offset, length).
+
+    Records are written once at the end of the file and read back through a
+    read-only mmap, so only the pages that are actually requested get loaded
+    and the OS page cache (not the Python heap) holds recently read text.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open (or create) a blob file.
+
+        Args:
+            path: Location of the blob file on disk
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._mapped_size = 0
+        self._detached = False
+        # Make sure the file exists so size and mmap calls never race a missing file
+        open(self.path, 'ab').close()
+
+    def size(self) -> int:
+        """Return the number of bytes currently stored."""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def append(self, data: bytes) -> Tuple[int, int]:
+        """
+        Append raw bytes to the blob file.
+
+        Args:
+            data: Bytes to store
+
+        Returns:
+            (offset, length) reference to the stored bytes
+        """
+        with self._lock:
+            if self._detached:
+                raise ValueError(f"Blob store for {self.path} was detached and is read-only")
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+            return offset, len(data)
+
+    def sync(self):
+        """Force every appended blob to stable storage."""
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                os.fsync(f.fileno())
+
+    def append_text(self, text: str) -> Tuple[int, int]:
+        """Append UTF-8 text and return its (offset, length) reference."""
+        return self.append(text.encode('utf-8'))
+
+    def read(self, offset: int, length: int) -> bytes:
+        """
+        Read a blob back from the mmap, remapping if the file has grown.
+
+        Args:
+            offset: Byte offset returned by append()
+            length: Byte length returned by append()
+
+        Returns:
+            The stored bytes
+        """
+        if length == 0:
+            return b""
+        end = offset + length
+        with self._lock:
+            if (self._mmap is None or end > self._mapped_size) and not self._detached:
+                self._remap()
+            if end > self._mapped_size:
+                raise ValueError(f"Blob reference ({offset}, {length}) is past the end of {self.path}")
+            return self._mmap[offset:end]
+
+    def read_text(self, offset: int, length: int) -> str:
+        """Read a blob back as UTF-8 text."""
+        return self.read(offset, length).decode('utf-8')
+
+    def _remap(self):
+        """(Re)create the read-only mapping over the whole file. Caller holds the lock."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._mapped_size = 0
+        size = self.size()
+        if size == 0:
+            return
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapped_size = size
+
+    def detach(self):
+        """
+        Map the whole file and stop following its path.
+
+        Readers that still hold this store keep reading the old contents through the
+        mapping after the file is replaced or removed (the mapping is released once the
+        store is garbage collected). Appends are not allowed afterwards.
+        """
+        with self._lock:
+            self._remap()
+            self._detached = True
+
+    def close(self):
+        """Release the mapping."""
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+                self._mapped_size = 0
+
+    def clear(self):
+        """Remove every stored blob."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        open(self.path, 'ab').close()
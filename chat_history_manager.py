@@ -1,44 +1,179 @@
 import os
 import json
 import uuid
+import time
+import heapq
+import atexit
+import base64
+import bisect
+import itertools
 import pickle
+import threading
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, NamedTuple, Tuple
+
+# Model-backed encoders import sentence-transformers lazily, so the hashing encoder needs only numpy
+from encoders import create_encoder, HistoryEncoder, ENCODER_BACKENDS, DEFAULT_MODEL_NAME
+from blob_store import BlobStore
+from embedding_store import EmbeddingStore
+from history_record import HistoryRecord, timestamp_to_us, us_to_timestamp
+from history_rollups import HistoryRollups
+from history_context import history_entry_tokens
+from write_ahead_log import WriteAheadLog
+from text_codec import TextCodec, train_dictionary, CODEC_RAW, HOT_LEVEL, COLD_LEVEL
+from perf_metrics import LatencyHistogram, HitRateCounter
+
+# Number of characters of each prompt/response kept resident for previews
+PREVIEW_CHARS = 150
+# Most recent records kept at the fast compression level; older ones are compacted harder
+DEFAULT_HOT_RECORDS = 200
+# Responses sampled when training a compression dictionary
+DICTIONARY_SAMPLES = 500
+MIN_DICTIONARY_SAMPLES = 8
+# Query embeddings kept for repeated searches
+QUERY_CACHE_SIZE = 256
+# Embedding space of collections created before encoders recorded their identity
+LEGACY_ENCODER_IDENTITY = f"sentence-transformers:{DEFAULT_MODEL_NAME}"
+# Group commit: new entries reach the collection files after this many ms or this many entries
+DEFAULT_FLUSH_INTERVAL_MS = 200
+DEFAULT_FLUSH_RECORDS = 32
+# Embedding rows allocated up front; the matrix grows by 1.5x when full
+INITIAL_CAPACITY = 1024
+# Rows scored per block by streaming (out-of-core) search: 16384 x 384 float32 = 24 MB
+DEFAULT_SEARCH_BLOCK_ROWS = 16384
+
+
+class _Snapshot(NamedTuple):
+    """
+    Immutable read view of the collection, published by writers as a new generation.
+    
+    Rows below `rows` are never modified in place: appends write past them and anything that
+    rewrites existing rows (compaction, clear, rebuild) builds new containers. The exceptions
+    are update_entry() and delete_entry(), which swap a single metadata record (and embedding
+    row), so a concurrent reader sees that row either before or after the change. Readers grab
+    the current snapshot once and need no lock.
+    """
+    generation: int
+    rows: int
+    embeddings: Optional[np.ndarray]  # read-only (rows, dim) view of the matrix; None when out of core
+    norms: Optional[np.ndarray]       # L2 norm of every row; None when out of core
+    embedding_store: EmbeddingStore   # on-disk matrix (the only copy when out of core)
+    metadata: List[HistoryRecord]  # shared with later generations; only the first `rows` entries belong here
+    blob_store: BlobStore    # blob file the metadata references point into
+    codec: TextCodec         # dictionaries the stored text was compressed with
+    encoder: HistoryEncoder  # encoder whose embedding space `embeddings` lives in
+    id_index: Dict[str, int] # entry id -> row; shared with later generations (rows past `rows` are newer)
+    deleted: np.ndarray      # sorted rows tombstoned by delete_entry()
 
-# Import required dependencies for simple vector search
-try:
-    from sentence_transformers import SentenceTransformer
-    from sklearn.metrics.pairwise import cosine_similarity
-    import numpy as np
-except ImportError:
-    raise ImportError("Required packages missing. Please install them with: pip install sentence-transformers scikit-learn numpy")
 
 class ChatHistoryManager:
-    def __init__(self, db_path="./vector_db", collection_name="chat_history"):
+    def __init__(self, db_path="./vector_db", collection_name="chat_history",
+                 encoder_backend: str = None, encoder_threads: int = None,
+                 compression_dictionary: bool = None, hot_records: int = None, encoder=None,
+                 durability: str = None, flush_interval_ms: int = None, flush_records: int = None,
+                 out_of_core: bool = None, search_block_rows: int = None, search_threads: int = None):
         """
         Initialize the ChatHistoryManager with simple vector database using sentence-transformers.
         
         Args:
             db_path: Path to store the database files
             collection_name: Name of the collection to store chat history
+            encoder_backend: Encoder backend (torch, quantized, onnx, onnx-quantized, openvino,
+                or hashing for the model-free encoder). Defaults to the backend the collection
+                was created with, then HISTORY_ENCODER_BACKEND, then "torch".
+            encoder_threads: Intra-op threads used by the encoder. Defaults to HISTORY_ENCODER_THREADS.
+            compression_dictionary: Train and use a zlib dictionary for stored text.
+                Defaults to HISTORY_COMPRESSION_DICTIONARY or True.
+            hot_records: Most recent records kept at the fast compression level.
+                Defaults to HISTORY_HOT_RECORDS or 200.
+            encoder: Already constructed HistoryEncoder; skips backend selection, e.g. for benchmarks.
+            durability: How hard add_entry pushes its write-ahead log record to disk before returning:
+                none, flush (survives a process crash) or fsync (survives power loss).
+                Defaults to HISTORY_DURABILITY or "flush".
+            flush_interval_ms: Maximum time between group commits. Defaults to HISTORY_FLUSH_INTERVAL_MS or 200.
+            flush_records: Pending entries that trigger an early group commit.
+                Defaults to HISTORY_FLUSH_RECORDS or 32.
+            out_of_core: Keep the embedding matrix on disk only and stream it block by block
+                on every search (histories larger than RAM). Defaults to HISTORY_OUT_OF_CORE or False.
+            search_block_rows: Rows per block for streaming search. Defaults to
+                HISTORY_SEARCH_BLOCK_ROWS or 16384.
+            search_threads: Threads scanning blocks in parallel (NumPy releases the GIL).
+                Defaults to HISTORY_SEARCH_THREADS or 1.
         """
         self.db_path = db_path
         self.collection_name = collection_name
+        threads_env = os.getenv("HISTORY_ENCODER_THREADS")
+        self.encoder_threads = encoder_threads or (int(threads_env) if threads_env else None)
         self.metadata_file = os.path.join(db_path, f"{collection_name}_metadata.json")
-        self.embeddings_file = os.path.join(db_path, f"{collection_name}_embeddings.pkl")
+        self.embeddings_file = os.path.join(db_path, f"{collection_name}_embeddings.f32")
+        self.legacy_embeddings_file = os.path.join(db_path, f"{collection_name}_embeddings.pkl")
+        self.blobs_file = os.path.join(db_path, f"{collection_name}_blobs.bin")
+        self.state_file = os.path.join(db_path, f"{collection_name}_state.json")
+        if compression_dictionary is None:
+            compression_dictionary = os.getenv("HISTORY_COMPRESSION_DICTIONARY", "true").lower() in ("1", "true", "yes")
+        self.hot_records = hot_records or int(os.getenv("HISTORY_HOT_RECORDS", DEFAULT_HOT_RECORDS))
+        self.durability = durability or os.getenv("HISTORY_DURABILITY", "flush")
+        self.flush_interval_ms = flush_interval_ms or int(os.getenv("HISTORY_FLUSH_INTERVAL_MS", DEFAULT_FLUSH_INTERVAL_MS))
+        self.flush_records = flush_records or int(os.getenv("HISTORY_FLUSH_RECORDS", DEFAULT_FLUSH_RECORDS))
+        if out_of_core is None:
+            out_of_core = os.getenv("HISTORY_OUT_OF_CORE", "false").lower() in ("1", "true", "yes")
+        self.out_of_core = out_of_core
+        self.search_block_rows = search_block_rows or int(os.getenv("HISTORY_SEARCH_BLOCK_ROWS", DEFAULT_SEARCH_BLOCK_ROWS))
+        self.search_threads = search_threads or int(os.getenv("HISTORY_SEARCH_THREADS", 1))
+        self._search_executor = (ThreadPoolExecutor(max_workers=self.search_threads, thread_name_prefix="history-search")
+                                 if self.search_threads > 1 else None)
+        
+        # Writers append under _write_lock and publish snapshots for lock-free readers;
+        # checkpoints are serialized by _checkpoint_lock, compactions by _compaction_lock and
+        # rebuilds by _rebuild_lock
+        self._write_lock = threading.RLock()
+        self._checkpoint_lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._pending_records = 0
+        self._persister = None
+        self._generation = 0
+        self._clear_count = 0
+        self._rebuilding = False
+        
+        # Live performance telemetry surfaced by get_collection_stats()
+        self.latency = {name: LatencyHistogram() for name in ("encode", "search", "wal_append", "save", "text_read", "compaction")}
+        self.cache_stats = {"query_embedding": HitRateCounter()}
+        self._query_cache = OrderedDict()
         
         # Create directory if it doesn't exist
         os.makedirs(db_path, exist_ok=True)
         
         try:
-            # Initialize sentence transformer for embeddings
-            print("🔄 Loading sentence transformer model...")
-            self.encoder = SentenceTransformer('all-MiniLM-L6-v2')  # Lightweight model
-            self.embedding_dim = 384  # Dimension for all-MiniLM-L6-v2
+            self._load_store_state()
+            
+            # Initialize the encoder (each collection remembers the backend it was built with)
+            if encoder is not None:
+                if not isinstance(encoder, HistoryEncoder):
+                    raise TypeError(f"{type(encoder).__name__} does not implement HistoryEncoder")
+                self.encoder = encoder
+                self.encoder_backend = type(encoder).__name__
+            else:
+                self.encoder_backend = (encoder_backend or self.store_state.get("encoder_backend")
+                                        or os.getenv("HISTORY_ENCODER_BACKEND", "torch"))
+                print(f"🔄 Loading {self.encoder_backend} encoder...")
+                self.encoder = create_encoder(self.encoder_backend, DEFAULT_MODEL_NAME, self.encoder_threads)
+            self.embedding_dim = self.encoder.dim  # 384 for all-MiniLM-L6-v2
+            
+            # Full prompt/response text lives in the blob file; metadata keeps only compact fields
+            self.blob_store = BlobStore(self.blobs_file)
+            self.embedding_store = EmbeddingStore(self.embeddings_file, self.embedding_dim)
+            self.codec = TextCodec(os.path.join(db_path, collection_name), compression_dictionary)
+            # Entries appended since the last group commit, replayed if the process died before it
+            self.wal = WriteAheadLog(os.path.join(db_path, collection_name), self.durability)
             
             # Initialize or load data
             self._load_or_create_data()
+            self._check_encoder_identity()
+            self._start_persister()
             
             print(f"✅ Vector database initialized: {collection_name}")
             print(f"📊 Total conversations: {len(self.metadata)}")
@@ -46,32 +181,752 @@ class ChatHistoryManager:
         except Exception as e:
             raise RuntimeError(f"Failed to initialize vector database: {e}")
 
+    def _load_store_state(self):
+        """Load the collection's bookkeeping (encoder, compaction progress)."""
+        self.store_state = {"last_compaction": None, "cold_records": 0}
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as f:
+                self.store_state.update(json.load(f))
+
+    def _check_encoder_identity(self):
+        """
+        Refuse to mix embedding spaces: a collection is searched with the encoder it was built with.
+        """
+        stored_identity = self.store_state.get("encoder_identity")
+        if stored_identity is None and self.metadata:
+            stored_identity = LEGACY_ENCODER_IDENTITY
+        if self.metadata and stored_identity != self.encoder.identity:
+            raise ValueError(
+                f"Collection '{self.collection_name}' was built with encoder '{stored_identity}' but "
+                f"'{self.encoder.identity}' was requested. Use the original backend or a new collection_name."
+            )
+        self._record_encoder()
+
+    def _record_encoder(self):
+        """Remember which encoder this collection's embeddings come from."""
+        self.store_state["encoder_identity"] = self.encoder.identity
+        if self.encoder_backend in ENCODER_BACKENDS:
+            self.store_state["encoder_backend"] = self.encoder_backend
+        # Written now rather than at the first checkpoint, so a log replay reopens with the same encoder
+        self._write_file(self.state_file, 'w', lambda f: json.dump(self.store_state, f, indent=2))
+
     def _load_or_create_data(self):
         """Load existing data or create new storage."""
-        if os.path.exists(self.metadata_file) and os.path.exists(self.embeddings_file):
+        migrated_embeddings = False
+        if os.path.exists(self.metadata_file):
             # Load existing data
             with open(self.metadata_file, 'r') as f:
-                self.metadata = json.load(f)
-            with open(self.embeddings_file, 'rb') as f:
-                self.embeddings = pickle.load(f)
+                # Records become compact objects as they are parsed; only legacy inline-text entries stay dicts
+                self.metadata = json.load(f, object_hook=self._parse_record)
+            if os.path.exists(self.legacy_embeddings_file):
+                # Older collections pickled the embeddings; move them to the raw append-only file
+                with open(self.legacy_embeddings_file, 'rb') as f:
+                    legacy = np.asarray(pickle.load(f), dtype=np.float32).reshape(-1, self.embedding_dim)
+                self.embedding_store.truncate(0)
+                self.embedding_store.append(legacy)
+                migrated_embeddings = True
+            stored_rows = self.embedding_store.rows()
+            if stored_rows < len(self.metadata):
+                raise ValueError(f"{self.embeddings_file} holds {stored_rows} rows for {len(self.metadata)} conversations")
+            # Rows past the checkpointed metadata belong to logged entries and are replayed below
+            self.embedding_store.truncate(len(self.metadata))
+            self._load_embeddings(len(self.metadata))
+            migrated = self._migrate_inline_text() or migrated_embeddings
             print(f"✅ Loaded existing data with {len(self.metadata)} conversations")
         else:
             # Create new storage
             self.metadata = []
-            self.embeddings = []
+            self.embedding_store.truncate(0)
+            self._load_embeddings(0)
+            migrated = False
             print(f"✅ Created new vector database")
+        
+        self._build_indexes()
+        
+        # Replay before any checkpoint, which would discard the log
+        replayed = self._replay_wal()
+        self._publish()
+        if replayed or migrated:
+            self._save_data()
+        if migrated_embeddings:
+            os.remove(self.legacy_embeddings_file)
+
+    @staticmethod
+    def _parse_record(data: Dict):
+        """json object_hook: turn each stored record into a HistoryRecord (legacy inline-text records stay dicts)."""
+        if "user_prompt_ref" in data:
+            return HistoryRecord.from_dict(data)
+        return data
+
+    def _build_indexes(self):
+        """
+        Index every stored record by id, collect the tombstoned rows and aggregate the rollups
+        (one pass over the metadata, whose records are kept in row order, so none of these
+        needs a file of its own). Afterwards they are maintained incrementally by every write.
+        """
+        self._id_index = {entry.id: row for row, entry in enumerate(self.metadata)}
+        self._deleted_rows = np.array([row for row, entry in enumerate(self.metadata) if entry.deleted],
+                                      dtype=np.int64)
+        self.rollups = HistoryRollups()
+        for entry in self.metadata:
+            if not entry.deleted:
+                self.rollups.add(entry)
+
+    def _load_embeddings(self, rows: int):
+        """Bring the first `rows` stored embeddings into memory (out of core they stay on disk)."""
+        self._persisted_rows = rows
+        self._dirty_rows = set()
+        if self.out_of_core:
+            self._matrix = self._norms = None
+            self._rows = rows
+        else:
+            self._set_embeddings(self.embedding_store.read(0, rows))
+
+    def _set_embeddings(self, matrix: np.ndarray):
+        """Replace the embedding matrix (load, clear, rebuild), leaving spare capacity for appends."""
+        rows = len(matrix)
+        capacity = max(INITIAL_CAPACITY, rows + rows // 4)
+        self._matrix = np.empty((capacity, self.embedding_dim), dtype=np.float32)
+        self._matrix[:rows] = matrix
+        self._norms = np.empty(capacity, dtype=np.float32)
+        self._norms[:rows] = np.linalg.norm(matrix, axis=1)
+        self._rows = rows
+
+    def _append_embeddings(self, embeddings: np.ndarray):
+        """Write new rows past the published ones, moving to a larger matrix (never resizing in place) when full."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.embedding_dim)
+        if self.out_of_core:
+            # The file is the matrix; metadata checkpoints decide which of its rows count after a crash
+            self.embedding_store.append(embeddings)
+            self._rows += len(embeddings)
+            self._persisted_rows = self._rows
+            return
+        end = self._rows + len(embeddings)
+        if end > len(self._matrix):
+            capacity = max(end, len(self._matrix) * 3 // 2)
+            matrix = np.empty((capacity, self.embedding_dim), dtype=np.float32)
+            matrix[:self._rows] = self._matrix[:self._rows]
+            norms = np.empty(capacity, dtype=np.float32)
+            norms[:self._rows] = self._norms[:self._rows]
+            # Published snapshots keep referencing the old arrays
+            self._matrix, self._norms = matrix, norms
+        self._matrix[self._rows:end] = embeddings
+        self._norms[self._rows:end] = np.linalg.norm(embeddings, axis=1)
+        self._rows = end
+
+    def _publish(self):
+        """Publish the current rows as the next snapshot generation. Caller holds the write lock."""
+        embeddings = norms = None
+        if self._matrix is not None:
+            embeddings = self._matrix[:self._rows]
+            embeddings.flags.writeable = False
+            norms = self._norms[:self._rows]
+            norms.flags.writeable = False
+        self._generation += 1
+        # A single attribute store, so readers see either the old or the new generation
+        self._snapshot = _Snapshot(self._generation, self._rows, embeddings, norms, self.embedding_store,
+                                   self.metadata, self.blob_store, self.codec, self.encoder,
+                                   self._id_index, self._deleted_rows)
+
+    def _set_embedding_row(self, row: int, embedding: np.ndarray):
+        """Overwrite one stored embedding (update_entry). Caller holds the write lock."""
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(1, self.embedding_dim)
+        if self.out_of_core:
+            self.embedding_store.write(row, embedding)
+            return
+        self._matrix[row] = embedding[0]
+        self._norms[row] = np.linalg.norm(embedding[0])
+        self._dirty_rows.add(row)
+
+    def _apply_update(self, row: int, record: HistoryRecord, embedding: Optional[np.ndarray]):
+        """Replace the record at `row`, and its embedding when the text changed. Caller holds the write lock."""
+        self.rollups.remove(self.metadata[row])
+        self.rollups.add(record)
+        self.metadata[row] = record
+        if embedding is not None:
+            self._set_embedding_row(row, embedding)
+
+    def _apply_delete(self, row: int):
+        """Tombstone the record at `row`; it stays in place so rows and cursors keep their meaning."""
+        self.rollups.remove(self.metadata[row])
+        self.metadata[row] = self.metadata[row].replace(deleted=True)
+        deleted = np.insert(self._deleted_rows, np.searchsorted(self._deleted_rows, row), row)
+        deleted.flags.writeable = False
+        self._deleted_rows = deleted
+
+    def _replay_wal(self) -> int:
+        """
+        Re-apply entries that were logged but not yet checkpointed when the last process stopped.
+        
+        Returns:
+            Number of recovered entries
+        """
+        blob_size = self.blob_store.size()
+        recovered = 0
+        for logged in self.wal.replay():
+            op = logged.get("op", "add")
+            row = self._id_index.get(logged["record"]["id"])
+            embedding = (np.frombuffer(base64.b64decode(logged["embedding"]), dtype=np.float32)
+                         if "embedding" in logged else None)
+            if op == "delete":
+                if row is not None and not self.metadata[row].deleted:
+                    self._apply_delete(row)
+                    recovered += 1
+                continue
+            record = HistoryRecord.from_dict(logged["record"])
+            if any(ref[0] + ref[1] > blob_size for ref in (record.user_prompt_ref, record.manager_response_ref)):
+                continue  # Its text never reached the blob file
+            if op == "update":
+                # Re-applying an update that was already checkpointed is harmless; reviving a deleted record is not
+                if row is not None and not self.metadata[row].deleted:
+                    self._apply_update(row, record, embedding)
+                    recovered += 1
+                continue
+            if row is not None:
+                continue  # Checkpointed before the log segment was discarded
+            self._id_index[record.id] = len(self.metadata)
+            self.metadata.append(record)
+            self.rollups.add(record)
+            self._append_embeddings(embedding)
+            recovered += 1
+        if recovered:
+            print(f"🔁 Recovered {recovered} unflushed changes from the write-ahead log")
+        return recovered
+
+    def _compact_record(self, entry_id: str, timestamp: str, user_prompt: str, manager_response: str,
+                        chosen_agent: str, agent_suggestion: str) -> HistoryRecord:
+        """
+        Store the full texts in the blob file and build the resident metadata record.
+        
+        Returns:
+            Record holding only ids, lengths, short previews, blob references and the entry's
+            token count in specialist context (counted once here instead of per request)
+        """
+        prompt_ref = self._store_text(user_prompt, HOT_LEVEL)
+        response_ref = self._store_text(manager_response, HOT_LEVEL)
+        chosen_agent = chosen_agent or "None"
+        return HistoryRecord(
+            entry_id, timestamp_to_us(timestamp), chosen_agent, agent_suggestion or "None",
+            len(user_prompt), len(manager_response),
+            user_prompt[:PREVIEW_CHARS], manager_response[:PREVIEW_CHARS],
+            prompt_ref, response_ref,
+            context_tokens=history_entry_tokens(timestamp, chosen_agent, user_prompt, manager_response)
+        )
+
+    def _migrate_inline_text(self) -> bool:
+        """
+        Move full texts from older metadata files (which stored them inline) into the blob file.
+        
+        Returns:
+            True if any record was migrated and the metadata needs to be rewritten
+        """
+        migrated = False
+        for i, entry in enumerate(self.metadata):
+            if isinstance(entry, HistoryRecord):
+                continue
+            self.metadata[i] = self._compact_record(
+                entry.get("id") or str(uuid.uuid4()),
+                entry.get("timestamp", datetime.now().isoformat()),
+                entry.get("user_prompt", ""),
+                entry.get("manager_response", ""),
+                entry.get("chosen_agent"),
+                entry.get("agent_suggestion")
+            )
+            migrated = True
+        if migrated:
+            print(f"🔄 Moved conversation text for {len(self.metadata)} entries into {self.blobs_file}")
+        return migrated
+
+    def _store_text(self, text: str, level: int) -> Tuple[int, int, int]:
+        """Compress a text and append it to the blob file, returning its [offset, length, codec] reference."""
+        payload, codec = self.codec.encode(text, level)
+        offset, length = self.blob_store.append(payload)
+        return offset, length, codec
+
+    def _load_text(self, entry: HistoryRecord, field: str, snapshot: _Snapshot = None) -> str:
+        """
+        Read and decompress the full text of a prompt or response from the blob file on demand.
+        Readers pass their snapshot, whose blob file and dictionaries stay readable after a
+        compaction or clear.
+        """
+        start = time.perf_counter()
+        ref = getattr(entry, f"{field}_ref")
+        blob_store, text_codec = (snapshot.blob_store, snapshot.codec) if snapshot else (self.blob_store, self.codec)
+        # References written before compression existed have no codec and hold raw UTF-8
+        codec = ref[2] if len(ref) > 2 else CODEC_RAW
+        text = text_codec.decode(blob_store.read(ref[0], ref[1]), codec)
+        self.latency["text_read"].record((time.perf_counter() - start) * 1000)
+        return text
+
+    def compact_storage(self, retrain_dictionary: bool = False) -> Dict:
+        """
+        Recompress records that went cold at the highest zlib level.
+        
+        Everything except the most recent `hot_records` entries is cold. Only records that
+        went cold since the last compaction are recompressed, without any lock, and appended
+        to the blob file as a cold segment; their references are then swapped in under the
+        write lock, which is held only briefly. A compression dictionary is trained from stored
+        responses the first time (or when asked to retrain, which also recompresses older cold
+        records with the new version); other records keep decoding with the dictionary they
+        were written with. The copies replaced by a compaction (and the text of deleted
+        entries) are dead bytes; once they outweigh the live ones the blob file is rewritten
+        without them, so it stays within about twice the size of the live text.
+        
+        Args:
+            retrain_dictionary: Train a new dictionary version even if one exists
+            
+        Returns:
+            Dictionary with blob sizes before/after, recompressed records and the time taken
+        """
+        try:
+            with self._compaction_lock:
+                start = time.perf_counter()
+                with self._write_lock:
+                    snapshot = self._snapshot
+                    clear_count = self._clear_count
+                    already_cold = self.store_state.get("cold_records", 0)
+                bytes_before = snapshot.blob_store.size()
+                
+                text_codec = snapshot.codec
+                if text_codec.use_dictionary and (retrain_dictionary or not text_codec.dictionary_version):
+                    samples = [self._load_text(entry, "manager_response", snapshot)
+                               for entry in snapshot.metadata[max(0, snapshot.rows - DICTIONARY_SAMPLES):snapshot.rows]
+                               if not entry.deleted]
+                    if len(samples) >= MIN_DICTIONARY_SAMPLES:
+                        dictionary = train_dictionary(samples)
+                        if dictionary:
+                            version = text_codec.add_dictionary(dictionary)
+                            print(f"📖 Trained compression dictionary v{version} ({len(dictionary)} bytes)")
+                
+                current_codec = text_codec.current_codec()
+                cold_boundary = max(0, snapshot.rows - self.hot_records)
+                already_cold = min(already_cold, cold_boundary)
+                
+                # The slow part runs without any lock; hot writers keep appending to the same file
+                recompressed = {}
+                for row in range(0 if retrain_dictionary else already_cold, cold_boundary):
+                    entry = snapshot.metadata[row]
+                    if entry.deleted:
+                        continue
+                    if row < already_cold and all(self._ref_codec(ref) in (current_codec, CODEC_RAW)
+                                                  for ref in (entry.user_prompt_ref, entry.manager_response_ref)):
+                        continue
+                    recompressed[row] = (entry, self._cold_record(entry, snapshot))
+                
+                with self._checkpoint_lock:
+                    with self._write_lock:
+                        if self._clear_count != clear_count:
+                            raise ValueError("history was cleared during the compaction")
+                        dead_bytes = self.store_state.get("dead_bytes", 0)
+                        # Published snapshots share self.metadata, so the swaps go into a copy
+                        metadata = list(self.metadata)
+                        for row, (entry, cold) in recompressed.items():
+                            current = metadata[row]
+                            if current.deleted:
+                                continue
+                            if current is not entry:
+                                # Updated meanwhile: catch its new text up here
+                                cold = self._cold_record(current, self._snapshot)
+                            dead_bytes += self._text_bytes(current)
+                            metadata[row] = cold
+                        # Tombstones give up their text
+                        for row in self._deleted_rows:
+                            entry = metadata[row]
+                            if self._text_bytes(entry):
+                                dead_bytes += self._text_bytes(entry)
+                                metadata[row] = entry.replace(
+                                    user_prompt_ref=(0, 0, CODEC_RAW), manager_response_ref=(0, 0, CODEC_RAW),
+                                    user_prompt_preview="", manager_response_preview=""
+                                )
+                        self.metadata = metadata
+                        self._publish()
+                        self.store_state["cold_records"] = max(already_cold, cold_boundary)
+                        self.store_state["dead_bytes"] = dead_bytes
+                        self.store_state["last_compaction"] = datetime.now().isoformat()
+                    # Checkpoint now so the metadata file points at the cold copies
+                    self._save_data()
+                
+                reclaimed = dead_bytes * 2 > self.blob_store.size()
+                if reclaimed:
+                    self._reclaim_blob_space(clear_count)
+                self.latency["compaction"].record((time.perf_counter() - start) * 1000)
+                
+                result = {
+                    "blob_bytes_before": bytes_before,
+                    "blob_bytes_after": self.blob_store.size(),
+                    "cold_records": self.store_state["cold_records"],
+                    "recompressed_records": len(recompressed),
+                    "reclaimed": reclaimed,
+                    "dictionary_version": self.codec.dictionary_version,
+                    "seconds": round(time.perf_counter() - start, 3)
+                }
+                print(f"🗜️ Compacted chat history text: {result['recompressed_records']} records recompressed, "
+                      f"{result['blob_bytes_before']} -> {result['blob_bytes_after']} bytes")
+                return result
+            
+        except Exception as e:
+            raise RuntimeError(f"Failed to compact chat history storage: {e}")
+
+    @staticmethod
+    def _ref_codec(ref: Tuple) -> int:
+        # References written before compression existed have no codec and hold raw UTF-8
+        return ref[2] if len(ref) > 2 else CODEC_RAW
+
+    @staticmethod
+    def _text_bytes(entry: HistoryRecord) -> int:
+        """Blob bytes held by a record's prompt and response."""
+        return entry.user_prompt_ref[1] + entry.manager_response_ref[1]
+
+    def _cold_record(self, entry: HistoryRecord, snapshot: _Snapshot) -> HistoryRecord:
+        """Append a record's texts to the blob file at the cold level; returns the record pointing at them."""
+        changes = {}
+        for field in ("user_prompt", "manager_response"):
+            payload, codec = snapshot.codec.encode(self._load_text(entry, field, snapshot), COLD_LEVEL)
+            offset, length = snapshot.blob_store.append(payload)
+            changes[f"{field}_ref"] = (offset, length, codec)
+        return entry.replace(**changes)
+
+    def _copy_record(self, entry: HistoryRecord, source: BlobStore, target: BlobStore) -> HistoryRecord:
+        """Copy a record's compressed texts as they are into another blob file."""
+        changes = {}
+        for field in ("user_prompt", "manager_response"):
+            ref = getattr(entry, f"{field}_ref")
+            if ref[1]:
+                offset, length = target.append(source.read(ref[0], ref[1]))
+                changes[f"{field}_ref"] = (offset, length, self._ref_codec(ref))
+        return entry.replace(**changes) if changes else entry
+
+    def _reclaim_blob_space(self, clear_count: int):
+        """
+        Rewrite the blob file without dead bytes. Live records are copied to a side file
+        without any lock; records added or changed meanwhile are caught up under the write
+        lock before the file is swapped in, like rebuild_index(). Caller holds _compaction_lock.
+        """
+        with self._write_lock:
+            snapshot = self._snapshot
+        compact_path = self.blobs_file + ".compact"
+        if os.path.exists(compact_path):
+            os.remove(compact_path)
+        compacted_store = BlobStore(compact_path)
+        copied = [snapshot.metadata[row] for row in range(snapshot.rows)]
+        compacted_metadata = [self._copy_record(entry, snapshot.blob_store, compacted_store) for entry in copied]
+        
+        with self._checkpoint_lock:
+            with self._write_lock:
+                if self._clear_count != clear_count:
+                    compacted_store.close()
+                    os.remove(compact_path)
+                    raise ValueError("history was cleared during the compaction")
+                for row, entry in enumerate(copied):
+                    if self.metadata[row] is not entry:
+                        compacted_metadata[row] = self._copy_record(self.metadata[row], self.blob_store, compacted_store)
+                for entry in self.metadata[len(copied):]:
+                    compacted_metadata.append(self._copy_record(entry, self.blob_store, compacted_store))
+                compacted_store.close()
+                
+                # Snapshots taken before the swap keep reading the old file through its mapping
+                self.blob_store.detach()
+                os.replace(compact_path, self.blobs_file)
+                self.blob_store = BlobStore(self.blobs_file)
+                self.metadata = compacted_metadata
+                self._publish()
+                self.store_state["dead_bytes"] = 0
+            # The log and the metadata file hold offsets into the replaced file; checkpoint at once
+            self._save_data()
+
+    def rebuild_index(self, encoder_backend: str = None, encoder=None, batch_size: int = 64) -> Dict:
+        """
+        Rebuild the embedding matrix off to the side while searches keep using the published snapshot.
+        
+        Without an encoder the matrix is re-packed (file rewritten, spare capacity trimmed, norms
+        recomputed). With one, every stored conversation is re-embedded, moving the collection to
+        that encoder's embedding space (e.g. from a model backend to the hashing encoder). The new
+        matrix is written block by block to a side file; entries added during the rebuild are
+        caught up under the write lock before the file is swapped in and a new generation published.
+        
+        Args:
+            encoder_backend: Backend to re-embed with (one of ENCODER_BACKENDS)
+            encoder: Already constructed HistoryEncoder to re-embed with
+            batch_size: Encoder batch size
+            
+        Returns:
+            Dictionary with rows, generation, encoder identity and the time taken
+        """
+        try:
+            with self._rebuild_lock:
+                start = time.perf_counter()
+                self._rebuilding = True
+                try:
+                    if encoder_backend is not None:
+                        encoder = create_encoder(encoder_backend, DEFAULT_MODEL_NAME, self.encoder_threads)
+                    snapshot = self._snapshot
+                    clear_count = self._clear_count
+                    rebuilt = EmbeddingStore(self.embeddings_file + ".rebuild", (encoder or snapshot.encoder).dim)
+                    rebuilt.truncate(0)
+                    
+                    # The slow part runs without any lock
+                    self._copy_rows(rebuilt, encoder, snapshot, 0, snapshot.rows, batch_size)
+                    
+                    with self._checkpoint_lock, self._write_lock:
+                        if self._clear_count != clear_count:
+                            raise ValueError("history was cleared during the rebuild")
+                        # Every write publishes under this lock, so the latest snapshot is the current state
+                        latest = self._snapshot
+                        self._copy_rows(rebuilt, encoder, latest, snapshot.rows, latest.rows, batch_size)
+                        rebuilt.append(np.zeros((0, rebuilt.dim), dtype=np.float32), sync=self.durability == "fsync")
+                        rebuilt.close()
+                        os.replace(rebuilt.path, self.embeddings_file)
+                        # Older snapshots keep reading the replaced file through their own descriptor
+                        self.embedding_store = EmbeddingStore(self.embeddings_file, rebuilt.dim)
+                        if encoder is not None:
+                            self.encoder = encoder
+                            self.encoder_backend = encoder_backend or type(encoder).__name__
+                            self.embedding_dim = encoder.dim
+                            self._query_cache.clear()
+                        self._load_embeddings(latest.rows)
+                        self._publish()
+                        # Checkpoint now so the log no longer holds vectors from the old embedding space
+                        self._save_data()
+                        if encoder is not None:
+                            self._record_encoder()
+                finally:
+                    self._rebuilding = False
+                
+                result = {
+                    "rows": self._snapshot.rows,
+                    "generation": self._snapshot.generation,
+                    "encoder_identity": self.encoder.identity,
+                    "seconds": round(time.perf_counter() - start, 3)
+                }
+                print(f"🧱 Rebuilt chat history index: {result['rows']} rows, generation {result['generation']}")
+                return result
+                
+        except Exception as e:
+            raise RuntimeError(f"Failed to rebuild chat history index: {e}")
+
+    def _copy_rows(self, target: EmbeddingStore, encoder: Optional[HistoryEncoder], snapshot: _Snapshot,
+                   start: int, end: int, batch_size: int):
+        """Append rows [start, end) of a snapshot to `target`, re-embedding them when an encoder is given."""
+        for block_start in range(start, end, self.search_block_rows):
+            block_end = min(end, block_start + self.search_block_rows)
+            if encoder is None:
+                target.append(self._read_rows(snapshot, block_start, block_end))
+            else:
+                target.append(self._embed_rows(encoder, snapshot, block_start, block_end, batch_size))
+
+    def _embed_rows(self, encoder: HistoryEncoder, snapshot: _Snapshot, start: int, end: int,
+                    batch_size: int) -> np.ndarray:
+        """Re-embed the stored conversations in rows [start, end) with `encoder`."""
+        embeddings = np.empty((end - start, encoder.dim), dtype=np.float32)
+        for batch_start in range(start, end, batch_size):
+            batch_end = min(end, batch_start + batch_size)
+            texts = [
+                f"User: {self._load_text(entry, 'user_prompt', snapshot)}\nManager: {self._load_text(entry, 'manager_response', snapshot)}"
+                for entry in snapshot.metadata[batch_start:batch_end]
+            ]
+            embeddings[batch_start - start:batch_end - start] = encoder.encode_batch(texts, batch_size=batch_size)
+        return embeddings
 
     def _save_data(self):
-        """Save data to disk."""
+        """
+        Save data to disk (a checkpoint) and discard the write-ahead log segments it covers.
+        
+        The files are written from the current snapshot, so writers are only blocked while the
+        log is rotated. They are written to temporary names and renamed, so a crash mid-write
+        keeps the previous checkpoint.
+        """
+        with self._checkpoint_lock:
+            with self._write_lock:
+                # Every logged entry is already published, so the snapshot covers the rotated segments
+                snapshot = self._snapshot
+                store_state = dict(self.store_state)
+                covered_segment = self.wal.rotate()
+                pending_records, self._pending_records = self._pending_records, 0
+                dirty_rows, self._dirty_rows = self._dirty_rows, set()
+            metadata = snapshot.metadata[:snapshot.rows]
+            
+            start = time.perf_counter()
+            try:
+                self._persist_embeddings(snapshot, dirty_rows)
+                # Records are turned into dicts one at a time as the encoder reaches them
+                self._write_file(self.metadata_file, 'w',
+                                 lambda f: json.dump(metadata, f, indent=2, default=HistoryRecord.to_dict))
+                self._write_file(self.state_file, 'w', lambda f: json.dump(store_state, f, indent=2))
+                self.wal.discard_through(covered_segment)
+            except Exception as e:
+                # The log segments are kept, so these entries are replayed on the next start
+                with self._write_lock:
+                    self._pending_records += pending_records
+                    self._dirty_rows |= dirty_rows
+                print(f"⚠️ Warning: Failed to save data: {e}")
+            finally:
+                self.latency["save"].record((time.perf_counter() - start) * 1000)
+
+    def _persist_embeddings(self, snapshot: _Snapshot, dirty_rows: set):
+        """
+        Rewrite updated rows and append the snapshot's rows that are not on disk yet (out of
+        core both already are). Runs before the metadata is written, so the file never holds
+        fewer rows than the metadata.
+        """
+        if snapshot.embeddings is not None:
+            for row in sorted(row for row in dirty_rows if row < self._persisted_rows):
+                self.embedding_store.write(row, snapshot.embeddings[row:row + 1])
+        new_rows = np.zeros((0, self.embedding_dim), dtype=np.float32)
+        if snapshot.embeddings is not None and snapshot.rows > self._persisted_rows:
+            new_rows = snapshot.embeddings[self._persisted_rows:snapshot.rows]
+        self.embedding_store.append(new_rows, sync=self.durability == "fsync")
+        self._persisted_rows = max(self._persisted_rows, snapshot.rows)
+
+    def _write_file(self, path: str, mode: str, write):
+        """Write a collection file atomically (temporary file + rename)."""
+        temp_path = path + ".tmp"
+        with open(temp_path, mode) as f:
+            write(f)
+            if self.durability == "fsync":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def _start_persister(self):
+        """Start the write-behind thread that group-commits new entries."""
+        self._persist_wake = threading.Event()
+        self._persist_stop = threading.Event()
+        self._persister = threading.Thread(target=self._persist_loop, name=f"{self.collection_name}-persister", daemon=True)
+        self._persister.start()
+        # Drain on interpreter exit as well, for callers that never call close()
+        atexit.register(self.close)
+
+    def _persist_loop(self):
+        """Checkpoint every flush_interval_ms, or sooner once flush_records entries are pending."""
+        while not self._persist_stop.is_set():
+            self._persist_wake.wait(self.flush_interval_ms / 1000)
+            self._persist_wake.clear()
+            if self._pending_records:
+                self._save_data()
+                self._maybe_compact()
+
+    def _maybe_compact(self):
+        """Recompress the cold tail once the hot window has doubled."""
+        if len(self.metadata) - self.store_state.get("cold_records", 0) >= 2 * self.hot_records:
+            try:
+                self.compact_storage()
+            except Exception as e:
+                print(f"⚠️ Warning: {e}")
+
+    def flush(self):
+        """Group-commit pending entries now; returns once they are in the collection files."""
+        if self._pending_records:
+            self._save_data()
+
+    def close(self):
+        """
+        Drain pending entries and stop the write-behind thread. Safe to call more than once;
+        entries added afterwards are saved synchronously.
+        """
+        persister, self._persister = self._persister, None
+        if persister is not None:
+            # The exit hook holds a reference to this manager; drop it once closed
+            atexit.unregister(self.close)
+            self._persist_stop.set()
+            self._persist_wake.set()
+            persister.join()
+        self.flush()
+        self.wal.close()
+
+    def _log_entry(self, record: HistoryRecord, embedding: np.ndarray = None, op: str = "add"):
+        """Append a change (a new entry by default, or an update/delete) to the write-ahead log."""
+        logged = {"record": record.to_dict()}
+        if op != "add":
+            logged["op"] = op
+        if embedding is not None:
+            logged["embedding"] = base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode('ascii')
+        with self.latency["wal_append"].time():
+            if self.durability == "fsync":
+                self.blob_store.sync()
+            self.wal.append(logged)
+
+    def _schedule_checkpoint(self, pending_records: int):
+        """Wake the persister once enough changes are pending (or save now if the manager is closed)."""
+        if self._persister is None:
+            # Closed manager: save synchronously
+            self._save_data()
+            self._maybe_compact()
+        elif pending_records >= self.flush_records:
+            self._persist_wake.set()
+
+    def _encode(self, text: str, encoder: HistoryEncoder = None) -> np.ndarray:
+        """Encode one text, recording encoder latency."""
+        with self.latency["encode"].time():
+            return (encoder or self.encoder).encode(text)
+
+    def _encode_query(self, query: str, encoder: HistoryEncoder) -> np.ndarray:
+        """Encode a search query through a small LRU cache (repeated searches skip the encoder)."""
+        key = (encoder.identity, query)
+        embedding = self._query_cache.get(key)
+        if embedding is not None:
+            try:
+                self._query_cache.move_to_end(key)
+            except KeyError:
+                pass  # Evicted by a concurrent search
+            self.cache_stats["query_embedding"].hit()
+            return embedding
+        self.cache_stats["query_embedding"].miss()
+        embedding = self._encode(query, encoder)
+        self._query_cache[key] = embedding
+        while len(self._query_cache) > QUERY_CACHE_SIZE:
+            try:
+                self._query_cache.popitem(last=False)
+            except KeyError:
+                break
+        return embedding
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """
+        Embed a query in the collection's embedding space (through the query cache, so a
+        following search for the same text does not encode it again).
+        
+        Args:
+            query: Text to embed
+            
+        Returns:
+            float32 embedding vector
+        """
         try:
-            with open(self.metadata_file, 'w') as f:
-                json.dump(self.metadata, f, indent=2)
-            with open(self.embeddings_file, 'wb') as f:
-                pickle.dump(self.embeddings, f)
+            return self._encode_query(query, self._snapshot.encoder)
         except Exception as e:
-            print(f"⚠️ Warning: Failed to save data: {e}")
+            raise RuntimeError(f"Failed to encode query: {e}")
 
-    def add_entry(self, user_prompt: str, manager_response: str, chosen_agent: str = None, agent_suggestion: str = None):
+    def encode_texts(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Embed several texts in one batch with the collection's encoder (no caching).
+        
+        Args:
+            texts: Texts to embed
+            batch_size: Encoder batch size
+            
+        Returns:
+            float32 matrix with one row per text
+        """
+        try:
+            with self.latency["encode"].time():
+                return self._snapshot.encoder.encode_batch(texts, batch_size=batch_size)
+        except Exception as e:
+            raise RuntimeError(f"Failed to encode texts: {e}")
+
+    def _last_timestamp_us(self) -> Optional[int]:
+        """Timestamp of the newest row, or None when empty. Caller holds the write lock."""
+        return self.metadata[-1].timestamp_us if self.metadata else None
+
+    @staticmethod
+    def _now(previous_us: Optional[int]) -> str:
+        """The current time, held at `previous_us` if the clock went back, so rows stay in timestamp order."""
+        now = datetime.now().isoformat()
+        if previous_us is not None and timestamp_to_us(now) < previous_us:
+            return us_to_timestamp(previous_us)
+        return now
+
+    def add_entry(self, user_prompt: str, manager_response: str, chosen_agent: str = None, agent_suggestion: str = None,
+                  entry_id: str = None) -> str:
         """
         Adds an entry to the chat history with vector embeddings.
         
@@ -80,137 +935,540 @@ class ChatHistoryManager:
             manager_response: The AI Workforce Manager's response
             chosen_agent: The agent that was chosen (if any)
             agent_suggestion: Any agent suggestion made (if any)
+            entry_id: Id to store the entry under (e.g. assigned by a service client); generated if omitted
+            
+        Returns:
+            The id of the new entry
         """
         try:
             # Create unique ID for this entry
-            entry_id = str(uuid.uuid4())
-            
-            # Prepare metadata
-            metadata = {
-                "id": entry_id,
-                "timestamp": datetime.now().isoformat(),
-                "user_prompt": user_prompt,
-                "manager_response": manager_response,
-                "chosen_agent": chosen_agent or "None",
-                "agent_suggestion": agent_suggestion or "None",
-                "user_prompt_length": len(user_prompt),
-                "manager_response_length": len(manager_response)
-            }
+            entry_id = entry_id or str(uuid.uuid4())
             
             # Combine user prompt and manager response for embedding
             combined_text = f"User: {user_prompt}\nManager: {manager_response}"
             
-            # Generate embedding
-            embedding = self.encoder.encode(combined_text)
+            # Generate embedding (outside the lock, so concurrent writers encode in parallel)
+            encoder = self.encoder
+            embedding = self._encode(combined_text, encoder)
             
-            # Add to storage
-            self.metadata.append(metadata)
-            self.embeddings.append(embedding)
+            with self._write_lock:
+                if encoder is not self.encoder:
+                    # rebuild_index() switched embedding spaces while this entry was being encoded
+                    embedding = self._encode(combined_text)
+                
+                # Prepare metadata (full texts go to the blob file, only previews stay in memory)
+                metadata = self._compact_record(
+                    entry_id, self._now(self._last_timestamp_us()), user_prompt, manager_response,
+                    chosen_agent, agent_suggestion
+                )
+                
+                # Log it, then add to storage; the persister writes the collection files later
+                self._log_entry(metadata, embedding)
+                self._id_index[entry_id] = len(self.metadata)
+                self.metadata.append(metadata)
+                self.rollups.add(metadata)
+                self._append_embeddings(embedding)
+                self._publish()
+                self._pending_records += 1
+                pending_records = self._pending_records
             
-            # Save to disk
-            self._save_data()
+            self._schedule_checkpoint(pending_records)
             
             print(f"💾 Chat history saved to vector database (ID: {entry_id[:8]}...)")
+            return entry_id
             
         except Exception as e:
             raise RuntimeError(f"Failed to save chat history to vector database: {e}")
 
-    def search_similar_conversations(self, query: str, n_results: int = 5) -> List[Dict]:
+    def add_entries(self, entries: List[Dict], batch_size: int = 64) -> List[str]:
+        """
+        Adds many entries with one batched encode and a single save (bulk imports, benchmarks).
+        
+        Args:
+            entries: Dicts with user_prompt, manager_response and optionally chosen_agent,
+                agent_suggestion and timestamp (ISO string, not earlier than the entry before it)
+            batch_size: Encoder batch size
+            
+        Returns:
+            The ids of the new entries
+            
+        Raises:
+            RuntimeError: A timestamp goes backwards (nothing is added)
+        """
+        try:
+            texts = [f"User: {entry['user_prompt']}\nManager: {entry['manager_response']}" for entry in entries]
+            encoder = self.encoder
+            embeddings = encoder.encode_batch(texts, batch_size=batch_size)
+            
+            with self._write_lock:
+                if encoder is not self.encoder:
+                    embeddings = self.encoder.encode_batch(texts, batch_size=batch_size)
+                # Pages are found by bisecting on timestamps, so they must not go backwards
+                timestamps = []
+                previous_us = self._last_timestamp_us()
+                for i, entry in enumerate(entries):
+                    timestamp = entry.get("timestamp") or self._now(previous_us)
+                    timestamp_us = timestamp_to_us(timestamp)
+                    if previous_us is not None and timestamp_us < previous_us:
+                        raise ValueError(f"entry {i} has timestamp {timestamp}, earlier than the entry "
+                                         f"before it ({us_to_timestamp(previous_us)})")
+                    timestamps.append(timestamp)
+                    previous_us = timestamp_us
+                records = [self._compact_record(
+                    str(uuid.uuid4()), timestamp,
+                    entry["user_prompt"], entry["manager_response"],
+                    entry.get("chosen_agent"), entry.get("agent_suggestion")
+                ) for entry, timestamp in zip(entries, timestamps)]
+                for row, record in enumerate(records, start=len(self.metadata)):
+                    self._id_index[record.id] = row
+                    self.rollups.add(record)
+                self.metadata.extend(records)
+                self._append_embeddings(embeddings)
+                self._publish()
+            
+            # Bulk imports skip the log and checkpoint straight away
+            self._save_data()
+            
+            return [record.id for record in records]
+            
+        except Exception as e:
+            raise RuntimeError(f"Failed to save chat history batch to vector database: {e}")
+
+    def get_entry(self, entry_id: str, include_text: bool = True) -> Optional[Dict]:
+        """
+        Fetch one conversation by id (a hash lookup, no scan).
+        
+        Args:
+            entry_id: Id returned by add_entry()
+            include_text: Read the full prompt/response from the blob file
+            
+        Returns:
+            The history entry, or None if the id is unknown or deleted
+        """
+        try:
+            snapshot = self._snapshot
+            row = snapshot.id_index.get(entry_id)
+            if row is None or row >= snapshot.rows or snapshot.metadata[row].deleted:
+                return None
+            return self._history_entry(snapshot.metadata[row], include_text, snapshot)
+            
+        except Exception as e:
+            raise RuntimeError(f"Failed to retrieve chat history entry: {e}")
+
+    def update_entry(self, entry_id: str, user_prompt: str = None, manager_response: str = None,
+                     chosen_agent: str = None, agent_suggestion: str = None) -> Optional[Dict]:
+        """
+        Change fields of one conversation in place (it keeps its row, timestamp and id).
+        
+        The embedding is recomputed only if the prompt or response text actually changed;
+        agent-only edits just replace the metadata record.
+        
+        Args:
+            entry_id: Id of the conversation to change
+            user_prompt: New prompt text (None keeps the current one)
+            manager_response: New response text (None keeps the current one)
+            chosen_agent: New chosen agent (None keeps the current one)
+            agent_suggestion: New agent suggestion (None keeps the current one)
+            
+        Returns:
+            The updated history entry (without full text), or None if the id is unknown or deleted
+        """
+        try:
+            snapshot = self._snapshot
+            row = snapshot.id_index.get(entry_id)
+            if row is None or row >= snapshot.rows or snapshot.metadata[row].deleted:
+                return None
+            current = snapshot.metadata[row]
+            old_prompt = self._load_text(current, "user_prompt", snapshot)
+            old_response = self._load_text(current, "manager_response", snapshot)
+            new_prompt = old_prompt if user_prompt is None else user_prompt
+            new_response = old_response if manager_response is None else manager_response
+            text_changed = (new_prompt, new_response) != (old_prompt, old_response)
+            
+            # Encode outside the lock, like add_entry()
+            encoder = self.encoder
+            combined_text = f"User: {new_prompt}\nManager: {new_response}"
+            embedding = self._encode(combined_text, encoder) if text_changed else None
+            
+            with self._write_lock:
+                row = self._id_index.get(entry_id)
+                if row is None or self.metadata[row].deleted:
+                    return None  # Cleared or deleted while encoding
+                current = self.metadata[row]
+                if text_changed:
+                    if encoder is not self.encoder:
+                        embedding = self._encode(combined_text)
+                    record = self._compact_record(
+                        entry_id, current.timestamp, new_prompt, new_response,
+                        chosen_agent or current.chosen_agent, agent_suggestion or current.agent_suggestion
+                    )
+                else:
+                    new_agent = chosen_agent or current.chosen_agent
+                    record = current.replace(
+                        chosen_agent=new_agent, agent_suggestion=agent_suggestion or current.agent_suggestion,
+                        context_tokens=history_entry_tokens(current.timestamp, new_agent, new_prompt, new_response)
+                    )
+                
+                self._log_entry(record, embedding, op="update")
+                self._apply_update(row, record, embedding)
+                self._publish()
+                self._pending_records += 1
+                pending_records = self._pending_records
+            
+            self._schedule_checkpoint(pending_records)
+            
+            print(f"✏️ Chat history entry updated (ID: {entry_id[:8]}...{', re-embedded' if text_changed else ''})")
+            return self._history_entry(record, False, self._snapshot)
+            
+        except Exception as e:
+            raise RuntimeError(f"Failed to update chat history entry: {e}")
+
+    def delete_entry(self, entry_id: str) -> bool:
+        """
+        Delete one conversation. Its row is tombstoned (skipped by search and the history APIs)
+        and its text is dropped at the next compaction.
+        
+        Args:
+            entry_id: Id of the conversation to delete
+            
+        Returns:
+            True if the entry existed and was deleted
+        """
+        try:
+            with self._write_lock:
+                row = self._id_index.get(entry_id)
+                if row is None or self.metadata[row].deleted:
+                    return False
+                self._log_entry(self.metadata[row], op="delete")
+                self._apply_delete(row)
+                self._publish()
+                self._pending_records += 1
+                pending_records = self._pending_records
+            
+            self._schedule_checkpoint(pending_records)
+            
+            print(f"🗑️ Chat history entry deleted (ID: {entry_id[:8]}...)")
+            return True
+            
+        except Exception as e:
+            raise RuntimeError(f"Failed to delete chat history entry: {e}")
+
+    def search_similar_conversations(self, query: str, n_results: int = 5, streaming: bool = None,
+                                     include_text: bool = True) -> List[Dict]:
         """
         Search for similar conversations using semantic similarity.
         
         Args:
             query: The search query
             n_results: Number of similar results to return
+            streaming: Scan the matrix in blocks of search_block_rows, merging each block's
+                best rows into a running top-k heap. Always on out of core; off by default otherwise.
+            include_text: Read the full prompt/response from the blob file (without it, results
+                carry only the score and metadata, whose previews are often enough)
             
         Returns:
             List of similar conversation entries with metadata
         """
+        start = time.perf_counter()
         try:
-            if len(self.metadata) == 0:
+            # Everything below reads one snapshot, so concurrent writes cannot skew rows and metadata
+            snapshot = self._snapshot
+            if snapshot.rows == 0:
                 return []
             
             # Generate embedding for query
-            query_embedding = self.encoder.encode(query)
-            
-            # Calculate cosine similarities
-            embeddings_matrix = np.array(self.embeddings)
-            similarities = cosine_similarity([query_embedding], embeddings_matrix)[0]
+            query_embedding = self._encode_query(query, snapshot.encoder)
+            n_results = min(n_results, snapshot.rows - len(snapshot.deleted))
+            if n_results <= 0:
+                return []
             
-            # Get top n_results
-            n_results = min(n_results, len(self.metadata))
-            top_indices = np.argsort(similarities)[::-1][:n_results]
+            if streaming or snapshot.embeddings is None:
+                top = self._blockwise_top_k(snapshot, query_embedding, n_results)
+            else:
+                # Calculate cosine similarities (row norms are kept up to date on insert)
+                similarities = self._cosine(snapshot.embeddings, snapshot.norms, query_embedding)
+                similarities[snapshot.deleted] = -np.inf
+                top = self._top_k(similarities, 0, n_results)
             
             similar_conversations = []
-            for idx in top_indices:
-                metadata = self.metadata[idx]
-                similar_conversations.append({
-                    "similarity_score": float(similarities[idx]),
-                    "user_prompt": metadata["user_prompt"],
-                    "manager_response": metadata["manager_response"],
-                    "metadata": metadata
-                })
+            for score, idx in top:
+                metadata = snapshot.metadata[idx]
+                conversation = {"similarity_score": score, "metadata": metadata.to_dict()}
+                if include_text:
+                    conversation["user_prompt"] = self._load_text(metadata, "user_prompt", snapshot)
+                    conversation["manager_response"] = self._load_text(metadata, "manager_response", snapshot)
+                similar_conversations.append(conversation)
             
+            self.latency["search"].record((time.perf_counter() - start) * 1000)
             return similar_conversations
             
         except Exception as e:
             raise RuntimeError(f"Failed to search vector database: {e}")
 
-    def get_recent_history(self, limit: int = 1000) -> List[Dict]:
+    @staticmethod
+    def _cosine(embeddings: np.ndarray, norms: np.ndarray, query_embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row against the query (zero rows score 0)."""
+        norms = norms * (np.linalg.norm(query_embedding) or 1.0)
+        return (embeddings @ query_embedding) / np.where(norms == 0, 1.0, norms)
+
+    @staticmethod
+    def _top_k(similarities: np.ndarray, offset: int, k: int) -> List[Tuple[float, int]]:
+        """Best k (score, row) pairs, best first; argpartition keeps this O(n) instead of a full sort."""
+        if k < len(similarities):
+            candidates = np.argpartition(similarities, -k)[-k:]
+        else:
+            candidates = np.arange(len(similarities))
+        candidates = candidates[np.argsort(similarities[candidates])[::-1]]
+        return [(float(similarities[i]), offset + int(i)) for i in candidates]
+
+    def _read_rows(self, snapshot: _Snapshot, start: int, end: int) -> np.ndarray:
+        """Rows [start, end) of a snapshot, from memory when resident and from disk otherwise."""
+        if snapshot.embeddings is not None:
+            return snapshot.embeddings[start:end]
+        return snapshot.embedding_store.read(start, end)
+
+    def _blockwise_top_k(self, snapshot: _Snapshot, query_embedding: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        """
+        Streaming top-k: score one block of rows at a time and merge each block's best k
+        into a running min-heap, so peak memory is bounded by the block size rather than
+        the collection size. Blocks are scored on search_threads threads when configured.
+        """
+        def scan(block_start: int) -> List[Tuple[float, int]]:
+            block_end = min(snapshot.rows, block_start + self.search_block_rows)
+            block = self._read_rows(snapshot, block_start, block_end)
+            if snapshot.norms is not None:
+                norms = snapshot.norms[block_start:block_end]
+            else:
+                norms = np.linalg.norm(block, axis=1)
+            similarities = self._cosine(block, norms, query_embedding)
+            first, last = np.searchsorted(snapshot.deleted, [block_start, block_end])
+            similarities[snapshot.deleted[first:last] - block_start] = -np.inf
+            return self._top_k(similarities, block_start, k)
+        
+        block_starts = range(0, snapshot.rows, self.search_block_rows)
+        scanned = self._search_executor.map(scan, block_starts) if self._search_executor else map(scan, block_starts)
+        heap: List[Tuple[float, int]] = []
+        for candidates in scanned:
+            for candidate in candidates:
+                if len(heap) < k:
+                    heapq.heappush(heap, candidate)
+                elif candidate > heap[0]:
+                    heapq.heapreplace(heap, candidate)
+        return sorted(heap, reverse=True)
+
+    def get_recent_history(self, limit: int = 1000, include_text: bool = True) -> List[Dict]:
         """
         Get recent chat history entries.
         
         Args:
             limit: Maximum number of recent entries to return
+            include_text: Read the full prompt/response from the blob file. When False only
+                the resident previews and lengths are returned, which never touches disk.
             
         Returns:
             List of recent conversation entries
         """
         try:
-            if not self.metadata:
-                return []
+            # Entries are appended in timestamp order, so walking backwards is most recent first
+            snapshot = self._snapshot
+            rows = itertools.islice(self._live_rows(snapshot, snapshot.rows), max(limit, 0))
+            return [self._history_entry(snapshot.metadata[row], include_text, snapshot) for row in rows]
             
-            # Sort by timestamp (most recent first)
-            sorted_metadata = sorted(self.metadata, key=lambda x: x["timestamp"], reverse=True)
+        except Exception as e:
+            raise RuntimeError(f"Failed to retrieve recent history from vector database: {e}")
+
+    def _history_entry(self, entry: HistoryRecord, include_text: bool, snapshot: _Snapshot) -> Dict:
+        """Materialize the dict returned by the history APIs for one stored record."""
+        history_entry = {
+            "id": entry.id,
+            "timestamp": entry.timestamp,
+            "chosen_agent": entry.chosen_agent,
+            "agent_suggestion": entry.agent_suggestion,
+            "user_prompt_length": entry.user_prompt_length,
+            "manager_response_length": entry.manager_response_length,
+            "user_prompt_preview": entry.user_prompt_preview,
+            "manager_response_preview": entry.manager_response_preview
+        }
+        if include_text:
+            history_entry["user_prompt"] = self._load_text(entry, "user_prompt", snapshot)
+            history_entry["manager_response"] = self._load_text(entry, "manager_response", snapshot)
+        return history_entry
+
+    @staticmethod
+    def _live_rows(snapshot: _Snapshot, start: int) -> Iterator[int]:
+        """Rows start-1, start-2, ... 0 of a snapshot, skipping deleted entries."""
+        return (row for row in range(start - 1, -1, -1) if not snapshot.metadata[row].deleted)
+
+    def _page_start(self, snapshot: _Snapshot, after_id: str = None, before_ts: str = None) -> int:
+        """
+        Find the row (exclusive upper bound) a newest-first page starts below.
+        
+        Args:
+            snapshot: Snapshot the page is read from
+            after_id: Cursor returned by a previous page; the page continues with older entries
+            before_ts: Only entries with a timestamp strictly before this ISO timestamp
             
-            # Return limited results
-            recent_entries = []
-            for entry in sorted_metadata[:limit]:
-                recent_entries.append({
-                    "timestamp": entry["timestamp"],
-                    "user_prompt": entry["user_prompt"],
-                    "manager_response": entry["manager_response"],
-                    "chosen_agent": entry["chosen_agent"],
-                    "agent_suggestion": entry["agent_suggestion"]
-                })
+        Returns:
+            Row index; the page covers rows start-1, start-2, ... 0
+        """
+        start = snapshot.rows
+        if after_id is not None:
+            # Deleted entries keep their index slot, so a cursor stays valid after its entry is deleted
+            start = snapshot.id_index.get(after_id, snapshot.rows)
+            if start >= snapshot.rows:
+                raise ValueError(f"Unknown history cursor: {after_id}")
+        if before_ts is not None:
+            start = min(start, bisect.bisect_left(snapshot.metadata, timestamp_to_us(before_ts), hi=snapshot.rows,
+                                                  key=lambda e: e.timestamp_us))
+        return start
+
+    def get_history_page(self, page_size: int = 50, after_id: str = None, before_ts: str = None,
+                         include_text: bool = False) -> Dict:
+        """
+        Get one page of history, most recent first, using a cursor instead of a large limit.
+        
+        Args:
+            page_size: Maximum number of entries in the page
+            after_id: The `next_cursor` of the previous page (None for the newest page)
+            before_ts: Only return entries older than this ISO timestamp
+            include_text: Read the full prompt/response from the blob file
             
-            return recent_entries
+        Returns:
+            Dictionary with "entries", "next_cursor" (None on the last page) and "has_more"
+        """
+        try:
+            snapshot = self._snapshot
+            start = self._page_start(snapshot, after_id, before_ts)
+            # One row past the page tells whether another page follows
+            rows = list(itertools.islice(self._live_rows(snapshot, start), page_size + 1))
+            has_more = page_size > 0 and len(rows) > page_size
+            entries = [self._history_entry(snapshot.metadata[row], include_text, snapshot) for row in rows[:page_size]]
+            return {
+                "entries": entries,
+                "next_cursor": entries[-1]["id"] if has_more else None,
+                "has_more": has_more
+            }
             
+        except ValueError:
+            raise
         except Exception as e:
-            raise RuntimeError(f"Failed to retrieve recent history from vector database: {e}")
+            raise RuntimeError(f"Failed to retrieve history page from vector database: {e}")
+
+    def iter_history(self, page_size: int = 100, after_id: str = None, before_ts: str = None,
+                     include_text: bool = False) -> Iterator[Dict]:
+        """
+        Stream history entries, most recent first, one page at a time.
+        
+        Only one page of dicts is alive at a time, so callers can walk the whole
+        history (or stop early) without materializing it.
+        
+        Args:
+            page_size: Entries fetched per page
+            after_id: Start after this entry id
+            before_ts: Only yield entries older than this ISO timestamp
+            include_text: Read the full prompt/response from the blob file
+            
+        Yields:
+            History entries
+        """
+        cursor = after_id
+        while True:
+            page = self.get_history_page(page_size, cursor, before_ts, include_text)
+            yield from page["entries"]
+            if not page["has_more"]:
+                return
+            cursor = page["next_cursor"]
+            before_ts = None  # The cursor already sits below the timestamp bound
 
     def get_history(self) -> List[Dict]:
         """
         Retrieves all chat history (for backward compatibility).
+        Prefer iter_history() or get_history_page() for large histories.
         
         Returns:
             List of all conversation entries
         """
         return self.get_recent_history(limit=1000)  # Get up to 1000 recent entries
 
+    def get_rollups(self, days: int = None) -> Dict:
+        """
+        Usage aggregates maintained on every write: conversations and average prompt/response
+        length per agent, conversations per day and agent, and per workflow type.
+        
+        Args:
+            days: Only include the most recent `days` days with activity (None for all)
+            
+        Returns:
+            Dictionary with "total_conversations", "agents", "days" and "workflows"
+        """
+        with self._write_lock:
+            return self.rollups.summary(days)
+
+    def get_agent_counts(self) -> Dict[str, int]:
+        """Number of stored conversations per chosen agent, without scanning history."""
+        with self._write_lock:
+            return self.rollups.agent_counts()
+
+    def _resident_embedding_bytes(self) -> int:
+        """Memory held by the embedding matrix and row norms, including spare capacity (0 out of core)."""
+        if self._matrix is None:
+            return 0
+        return self._matrix.nbytes + self._norms.nbytes
+
     def get_collection_stats(self) -> Dict:
         """
-        Get statistics about the chat history collection.
+        Get statistics about the chat history collection, including live performance telemetry
+        (latency percentiles, bytes on disk, resident embedding memory, cache hit rates, index state).
         
         Returns:
             Dictionary with collection statistics
         """
         try:
+            file_sizes = {
+                os.path.basename(path): os.path.getsize(path)
+                for path in ([self.metadata_file, self.embeddings_file, self.blobs_file, self.state_file]
+                             + self.codec.dictionary_files() + self.wal.files())
+                if os.path.exists(path)
+            }
+            snapshot = self._snapshot
+            with self._write_lock:
+                text_chars = self.rollups.text_chars
+            blob_bytes = file_sizes.get(os.path.basename(self.blobs_file), 0)
+            
             return {
-                "total_conversations": len(self.metadata),
+                "total_conversations": snapshot.rows - len(snapshot.deleted),
+                "deleted_conversations": len(snapshot.deleted),
                 "collection_name": self.collection_name,
                 "database_path": self.db_path,
-                "embedding_dimension": self.embedding_dim
+                "embedding_dimension": self.embedding_dim,
+                "encoder_backend": self.encoder_backend,
+                "encoder_identity": self.encoder.identity,
+                "encoder_threads": self.encoder_threads,
+                "disk_bytes": file_sizes,
+                "disk_bytes_total": sum(file_sizes.values()),
+                "text_compression_ratio": round(text_chars / blob_bytes, 2) if blob_bytes else None,
+                "compression_dictionary_version": self.codec.dictionary_version,
+                "last_compaction": self.store_state.get("last_compaction"),
+                "write_behind": {
+                    "durability": self.durability,
+                    "flush_interval_ms": self.flush_interval_ms,
+                    "flush_records": self.flush_records,
+                    "pending_records": self._pending_records,
+                    "persister_running": self._persister is not None
+                },
+                "latency_ms": {name: histogram.summary() for name, histogram in self.latency.items()},
+                "resident_embedding_bytes": self._resident_embedding_bytes(),
+                "cache_hit_rates": {name: counter.summary() for name, counter in self.cache_stats.items()},
+                "index": {
+                    "type": "flat_cosine",
+                    "storage": "out_of_core" if self.out_of_core else "in_memory",
+                    "state": "rebuilding" if self._rebuilding else "ready",
+                    "rows": snapshot.rows,
+                    "capacity": len(self._matrix) if self._matrix is not None else snapshot.rows,
+                    "generation": snapshot.generation,
+                    "search_block_rows": self.search_block_rows,
+                    "search_threads": self.search_threads
+                }
             }
         except Exception as e:
             raise RuntimeError(f"Failed to get collection stats: {e}")
@@ -220,14 +1478,29 @@ class ChatHistoryManager:
         Clear all chat history (use with caution).
         """
         try:
-            # Clear data
-            self.metadata = []
-            self.embeddings = []
-            
-            # Remove files
-            for file_path in [self.metadata_file, self.embeddings_file]:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+            with self._checkpoint_lock, self._write_lock:
+                # Clear data (new containers, so readers of older snapshots are unaffected)
+                self.metadata = []
+                self._build_indexes()
+                self._pending_records = 0
+                self._clear_count += 1
+                
+                # Remove files; the old blob store and codec keep serving older snapshots from memory
+                # (the old embedding store likewise keeps its open descriptor on the removed file)
+                for file_path in [self.metadata_file, self.embeddings_file, self.state_file]:
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                self.embedding_store = EmbeddingStore(self.embeddings_file, self.embedding_dim)
+                self._load_embeddings(0)
+                self.blob_store.detach()
+                os.remove(self.blobs_file)
+                self.blob_store = BlobStore(self.blobs_file)
+                self.codec.detach()
+                self.codec = TextCodec(self.codec.dictionary_prefix, self.codec.use_dictionary)
+                self.wal.clear()
+                self._publish()
+                self.store_state = {"last_compaction": None, "cold_records": 0}
+                self._record_encoder()
             
             print(f"🗑️ Chat history cleared successfully")
         except Exception as e:
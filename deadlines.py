@@ -0,0 +1,83 @@
+import time
+import asyncio
+from typing import Awaitable, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request ran out of time or its client went away; retrying the call cannot help."""
+
+
+class Deadline:
+    """
+    When a request has to be finished by, and whether it has been cancelled (e.g. the
+    client disconnected). One is created per request and passed down to every LLM call
+    and workflow step it makes, so they all stop at the same moment and nothing keeps
+    running after its answer can no longer be delivered.
+    """
+
+    def __init__(self, seconds: float = None):
+        """
+        Args:
+            seconds: Time the request has from now (None or 0 = no time limit)
+        """
+        self.seconds = seconds or None
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        self._cancelled = asyncio.Event()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or None without a time limit."""
+        return max(0.0, self.expires_at - time.monotonic()) if self.expires_at is not None else None
+
+    def expired(self) -> bool:
+        """Whether the request should stop: out of time or cancelled."""
+        return self._cancelled.is_set() or self.remaining() == 0.0
+
+    def cancel(self):
+        """Stop the request cooperatively: running calls are interrupted and no new ones start."""
+        self._cancelled.set()
+
+    def reason(self) -> str:
+        if self._cancelled.is_set():
+            return "the request was cancelled"
+        return f"the request time limit of {self.seconds:g}s was reached"
+
+    async def run(self, awaitable: Awaitable, limit: float = None):
+        """
+        Await something, interrupting it when the deadline passes, the request is cancelled
+        or `limit` seconds elapse, whichever comes first.
+
+        Args:
+            awaitable: The work (e.g. one LLM call)
+            limit: Its own time limit in seconds (e.g. the agent's timeout)
+
+        Returns:
+            Its result
+
+        Raises:
+            DeadlineExceeded: The request ran out of time or was cancelled
+            asyncio.TimeoutError: Only `limit` was exceeded (the request still has time)
+        """
+        if self.expired():
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded(self.reason())
+        remaining = self.remaining()
+        timeout = limit if remaining is None else remaining if limit is None else min(limit, remaining)
+        work = asyncio.ensure_future(awaitable)
+        cancelled = asyncio.ensure_future(self._cancelled.wait())
+        try:
+            done, _ = await asyncio.wait({work, cancelled}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            cancelled.cancel()
+            if not work.done():
+                work.cancel()
+        if work in done:
+            return work.result()
+        # Let the interrupted work run its cleanup (e.g. release its scheduler slot). asyncio.wait
+        # never raises the work's own cancellation or error, only this task's cancellation
+        await asyncio.wait({work})
+        if not work.cancelled():
+            work.exception()
+        if self.expired():
+            raise DeadlineExceeded(self.reason())
+        raise asyncio.TimeoutError(f"no response within {limit:g}s")
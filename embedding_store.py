@@ -0,0 +1,102 @@
+import os
+import threading
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Append-only file of float32 embedding rows (raw, row-major, no header).
+
+    Rows are appended at checkpoints instead of rewriting the whole matrix, and can be
+    read back in arbitrary row ranges, so a search can stream the matrix block by block
+    without ever holding all of it in memory. Reads go through a descriptor opened with
+    the store, so a store keeps reading the file it was opened on even after that file
+    is replaced (readers of older snapshots).
+    """
+
+    def __init__(self, path: str, dim: int):
+        """
+        Open (or create) an embedding file.
+
+        Args:
+            path: Location of the embedding file on disk
+            dim: Embedding dimension (floats per row)
+        """
+        self.path = path
+        self.dim = dim
+        self.row_bytes = dim * np.dtype(np.float32).itemsize
+        self._lock = threading.Lock()
+        open(self.path, 'ab').close()
+        self._reader = open(self.path, 'rb')
+
+    def rows(self) -> int:
+        """Number of complete rows in the file (a torn final row is ignored)."""
+        return os.fstat(self._reader.fileno()).st_size // self.row_bytes
+
+    def size(self) -> int:
+        """Return the number of bytes currently stored."""
+        return os.fstat(self._reader.fileno()).st_size
+
+    def append(self, matrix: np.ndarray, sync: bool = False):
+        """
+        Append rows to the end of the file.
+
+        Args:
+            matrix: (n, dim) rows to store
+            sync: fsync before returning
+        """
+        data = np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        if len(data) == 0 and not sync:
+            return
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                # Start at a row boundary even if a crash left a torn row behind
+                f.truncate(self.rows() * self.row_bytes)
+                f.write(data.tobytes())
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def write(self, start: int, matrix: np.ndarray):
+        """
+        Overwrite existing rows in place, starting at row `start` (updated entries).
+
+        Args:
+            start: First row to overwrite
+            matrix: (n, dim) replacement rows; they must already exist in the file
+        """
+        data = np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            if start + len(data) > self.rows():
+                raise ValueError(f"Rows [{start}, {start + len(data)}) are past the end of {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.seek(start * self.row_bytes)
+                f.write(data.tobytes())
+
+    def truncate(self, rows: int):
+        """Drop every row from `rows` on (rows beyond the checkpointed metadata after a crash)."""
+        with self._lock:
+            with open(self.path, 'r+b') as f:
+                f.truncate(rows * self.row_bytes)
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """
+        Read rows [start, end) into a new (end - start, dim) float32 array.
+
+        Safe to call from several threads at once.
+        """
+        count = max(0, end - start)
+        offset = start * self.row_bytes
+        if hasattr(os, "pread"):
+            data = os.pread(self._reader.fileno(), count * self.row_bytes, offset)
+        else:
+            with self._lock:
+                self._reader.seek(offset)
+                data = self._reader.read(count * self.row_bytes)
+        if len(data) != count * self.row_bytes:
+            raise ValueError(f"Rows [{start}, {end}) are past the end of {self.path}")
+        return np.frombuffer(data, dtype=np.float32).reshape(count, self.dim)
+
+    def close(self):
+        """Close the read descriptor."""
+        self._reader.close()
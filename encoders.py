@@ -0,0 +1,207 @@
+import os
+import re
+import numpy as np
+from typing import List, Protocol, runtime_checkable
+
+# Encoder backends for the chat history vector database.
+#
+#   torch           - reference float32 SentenceTransformer model
+#   quantized       - torch model with dynamic int8 quantization of every Linear layer
+#   onnx            - exported ONNX graph run by ONNX Runtime (graph optimizations enabled)
+#   onnx-quantized  - int8 quantized ONNX graph shipped with the model on the hub
+#   openvino        - OpenVINO IR graph (Intel CPUs)
+#   hashing         - pure-NumPy character n-gram feature hashing, no model at all
+DEFAULT_MODEL_NAME = 'all-MiniLM-L6-v2'
+MODEL_BACKENDS = ("torch", "quantized", "onnx", "onnx-quantized", "openvino")
+ENCODER_BACKENDS = MODEL_BACKENDS + ("hashing",)
+DEFAULT_QUANTIZED_ONNX_FILE = "onnx/model_qint8_avx2.onnx"
+
+
+@runtime_checkable
+class HistoryEncoder(Protocol):
+    """
+    Interface every chat history encoder implements.
+
+    `identity` names the embedding space: two encoders with the same identity produce
+    comparable vectors, so a collection can only be searched with the identity it was
+    built with.
+    """
+
+    dim: int
+    identity: str
+
+    def encode(self, text: str) -> np.ndarray:
+        """Embed one text as a 1-D float32 vector of length `dim`."""
+        ...
+
+    def encode_batch(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Embed many texts as a (len(texts), dim) float32 matrix."""
+        ...
+
+
+class SentenceTransformerEncoder:
+    """HistoryEncoder backed by a sentence-transformers model on one of the CPU backends."""
+
+    def __init__(self, backend: str = "torch", model_name: str = DEFAULT_MODEL_NAME, num_threads: int = None):
+        self.backend = backend
+        self.model_name = model_name
+        self.model = load_sentence_transformer(backend, model_name, num_threads)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        # Quantized/exported graphs approximate the same model, so they share its embedding space
+        self.identity = f"sentence-transformers:{model_name}"
+
+    def encode(self, text: str) -> np.ndarray:
+        return np.asarray(self.model.encode(text), dtype=np.float32)
+
+    def encode_batch(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.asarray(self.model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+class HashingEncoder:
+    """
+    Model-free HistoryEncoder using signed feature hashing of character n-grams.
+
+    Every n-gram of the lowercased, whitespace-normalized UTF-8 bytes is hashed with a
+    vectorized polynomial rolling hash into one of `dim` buckets with a +/-1 sign, term
+    frequencies are damped with log1p and the vector is L2-normalized. Encoding takes a few
+    milliseconds even for a several-thousand-word report and needs no torch import or model
+    download, which suits latency-critical tenants and benchmarks. Similarity is lexical
+    rather than semantic.
+    """
+
+    _BASE = np.uint64(0x100000001B3)       # FNV prime used as the rolling-hash base
+    _MIX = np.uint64(0x9E3779B97F4A7C15)   # Fibonacci hashing multiplier to spread bits
+
+    def __init__(self, dim: int = 384, ngram_range: tuple = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.identity = f"hashing:char{ngram_range[0]}-{ngram_range[1]}:dim{dim}:v1"
+
+    def _ngram_hashes(self, data: np.ndarray) -> np.ndarray:
+        hashes = []
+        h = np.zeros(len(data), dtype=np.uint64)
+        # Extend every (n-1)-gram hash by one byte to get the n-gram hashes
+        for n in range(1, self.ngram_range[1] + 1):
+            if len(data) < n:
+                break
+            h = h[:len(data) - n + 1] * self._BASE + data[n - 1:]
+            if n >= self.ngram_range[0]:
+                hashes.append(h + np.uint64(n))  # offset by n so different lengths land apart
+        if not hashes:
+            return np.zeros(0, dtype=np.uint64)
+        return np.concatenate(hashes) * self._MIX
+
+    def encode(self, text: str) -> np.ndarray:
+        normalized = " " + re.sub(r"\s+", " ", text.lower()).strip() + " "
+        data = np.frombuffer(normalized.encode('utf-8'), dtype=np.uint8).astype(np.uint64)
+        hashes = self._ngram_hashes(data)
+        vector = np.zeros(self.dim, dtype=np.float64)
+        if len(hashes):
+            buckets = ((hashes >> np.uint64(32)) % np.uint64(self.dim)).astype(np.int64)
+            signs = np.where((hashes >> np.uint64(31)) & np.uint64(1), 1.0, -1.0)
+            vector = np.bincount(buckets, weights=signs, minlength=self.dim)
+            vector = np.sign(vector) * np.log1p(np.abs(vector))
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector /= norm
+        return vector.astype(np.float32)
+
+    def encode_batch(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.encode(text) for text in texts])
+
+
+def _set_torch_threads(num_threads: int = None):
+    """Pin torch intra-op parallelism so encoding does not oversubscribe the CPU."""
+    if not num_threads:
+        return
+    import torch
+    torch.set_num_threads(num_threads)
+    try:
+        # Inter-op threads can only be set once per process, before any parallel work
+        torch.set_interop_threads(1)
+    except RuntimeError:
+        pass
+
+
+def _onnx_model_kwargs(num_threads: int = None) -> dict:
+    """Build ONNX Runtime session options with explicit intra-op thread control."""
+    model_kwargs = {"provider": "CPUExecutionProvider"}
+    if num_threads:
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = num_threads
+        session_options.inter_op_num_threads = 1
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_kwargs["session_options"] = session_options
+    return model_kwargs
+
+
+def load_sentence_transformer(backend: str = "torch", model_name: str = DEFAULT_MODEL_NAME, num_threads: int = None):
+    """
+    Load a SentenceTransformer model for the requested CPU inference backend.
+
+    Args:
+        backend: One of MODEL_BACKENDS
+        model_name: Sentence transformer model to load
+        num_threads: Intra-op thread count (None keeps the runtime default)
+
+    Returns:
+        A SentenceTransformer instance exposing encode()
+    """
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}'. Expected one of: {', '.join(MODEL_BACKENDS)}")
+
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        raise ImportError("sentence-transformers is not installed. Install it with: pip install sentence-transformers "
+                          "(or use HISTORY_ENCODER_BACKEND=hashing, which needs no model)")
+
+    if backend == "torch":
+        _set_torch_threads(num_threads)
+        return SentenceTransformer(model_name, device="cpu")
+
+    if backend == "quantized":
+        import torch
+        _set_torch_threads(num_threads)
+        model = SentenceTransformer(model_name, device="cpu")
+        # Dynamic quantization stores Linear weights as int8 and quantizes activations on the fly
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if backend == "onnx":
+        return SentenceTransformer(model_name, device="cpu", backend="onnx",
+                                   model_kwargs=_onnx_model_kwargs(num_threads))
+
+    if backend == "onnx-quantized":
+        model_kwargs = _onnx_model_kwargs(num_threads)
+        model_kwargs["file_name"] = os.getenv("HISTORY_ENCODER_ONNX_FILE", DEFAULT_QUANTIZED_ONNX_FILE)
+        return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    # openvino
+    model_kwargs = {}
+    if num_threads:
+        model_kwargs["ov_config"] = {"INFERENCE_NUM_THREADS": str(num_threads)}
+    return SentenceTransformer(model_name, device="cpu", backend="openvino", model_kwargs=model_kwargs)
+
+
+def create_encoder(backend: str = "torch", model_name: str = DEFAULT_MODEL_NAME, num_threads: int = None) -> HistoryEncoder:
+    """
+    Create a HistoryEncoder for the requested backend.
+
+    Args:
+        backend: One of ENCODER_BACKENDS
+        model_name: Sentence transformer model to load (ignored by the hashing encoder)
+        num_threads: Intra-op thread count (None keeps the runtime default)
+
+    Returns:
+        An object implementing HistoryEncoder
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}'. Expected one of: {', '.join(ENCODER_BACKENDS)}")
+    if backend == "hashing":
+        return HashingEncoder()
+    return SentenceTransformerEncoder(backend, model_name, num_threads)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of the learned (kNN) router against the triage LLM.
+
+Replays stored history in chronological order: each conversation is routed from the
+conversations stored before it only (so the router never sees the answer or the future),
+and its vote is compared with the decision the triage LLM actually made, which is the
+entry's chosen_agent. Reports coverage (share of prompts the router answers), accuracy on
+the prompts it answers and routing latency, for the configured confidence threshold and a
+sweep of thresholds to tune KNN_ROUTER_CONFIDENCE. No OpenAI key is needed unless
+--llm-sample asks for the triage LLM's own latency on some of the replayed prompts.
+
+Usage:
+    python evaluate_router.py                                   # ./vector_db, last 1000 entries
+    python evaluate_router.py --limit 5000 --neighbors 25 --json router_eval.json
+    python evaluate_router.py --llm-sample 20                   # also time the triage LLM
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime
+
+from chat_history_manager import ChatHistoryManager
+from knn_router import (KnnRouter, decision_for_label, DEFAULT_NEIGHBORS, DEFAULT_MIN_CONFIDENCE,
+                        DEFAULT_MIN_SIMILARITY, DEFAULT_MIN_VOTES)
+from perf_metrics import LatencyHistogram
+
+SWEEP_CONFIDENCES = [0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+
+
+def load_replay(store, limit: int):
+    """The `limit` most recent labeled conversations, oldest first."""
+    entries = []
+    for entry in store.iter_history(page_size=500, include_text=True):
+        if decision_for_label(entry["chosen_agent"]) is not None:
+            entries.append(entry)
+            if len(entries) >= limit:
+                break
+    entries.reverse()
+    return entries
+
+
+def replay(router: KnnRouter, entries):
+    """Vote on every entry from its older neighbors: [(expected, decision, confidence, votes)]."""
+    outcomes = []
+    for entry in entries:
+        timestamp = entry["timestamp"]
+        with router.latency.time():
+            result = router.vote(router.nearest(entry["user_prompt"],
+                                                neighbor_filter=lambda metadata: metadata["timestamp"] < timestamp))
+        decision, confidence, votes = result if result is not None else (None, 0.0, 0)
+        outcomes.append((decision_for_label(entry["chosen_agent"]), decision, confidence, votes))
+    return outcomes
+
+
+def score(outcomes, min_confidence: float, min_votes: int):
+    """Coverage and accuracy of the router at one confidence threshold."""
+    routed = [(expected, decision) for expected, decision, confidence, votes in outcomes
+              if decision is not None and confidence >= min_confidence and votes >= min_votes]
+    correct = sum(1 for expected, decision in routed if expected == decision)
+    return {
+        "min_confidence": min_confidence,
+        "routed": len(routed),
+        "coverage": round(len(routed) / len(outcomes), 4) if outcomes else None,
+        "accuracy_routed": round(correct / len(routed), 4) if routed else None,
+        # With the LLM answering the rest, its decisions agree with the logged ones by definition
+        "agreement_with_fallback": round((correct + len(outcomes) - len(routed)) / len(outcomes), 4) if outcomes else None,
+    }
+
+
+async def time_llm(entries, sample: int):
+    """Run the triage LLM (routing cache and router off) on a sample of prompts."""
+    os.environ["ROUTING_CACHE"] = "false"
+    os.environ["KNN_ROUTER"] = "false"
+    from main import AIWorkforceManager
+    manager = AIWorkforceManager()
+    latency = LatencyHistogram()
+    agreed = 0
+    for entry in entries[-sample:]:
+        start = time.perf_counter()
+        decision = await manager.decide_agent(entry["user_prompt"])
+        latency.record((time.perf_counter() - start) * 1000)
+        agreed += decision.split("\n")[0].strip() == decision_for_label(entry["chosen_agent"])
+    manager.history_manager.close()
+    return {"prompts": sample, "agreement_with_log": round(agreed / sample, 4), "latency_ms": latency.summary()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay chat history to evaluate the learned router")
+    parser.add_argument("--db-path", default="./vector_db")
+    parser.add_argument("--collection", default="chat_history")
+    parser.add_argument("--limit", type=int, default=1000, help="Most recent labeled conversations replayed")
+    parser.add_argument("--neighbors", type=int, default=DEFAULT_NEIGHBORS)
+    parser.add_argument("--confidence", type=float, default=DEFAULT_MIN_CONFIDENCE)
+    parser.add_argument("--min-similarity", type=float, default=DEFAULT_MIN_SIMILARITY)
+    parser.add_argument("--min-votes", type=int, default=DEFAULT_MIN_VOTES)
+    parser.add_argument("--llm-sample", type=int, default=0,
+                        help="Also time the triage LLM on this many replayed prompts (needs OPENAI_API_KEY)")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write machine-readable results here")
+    args = parser.parse_args()
+
+    store = ChatHistoryManager(db_path=args.db_path, collection_name=args.collection)
+    try:
+        entries = load_replay(store, args.limit)
+        if not entries:
+            print("❌ No labeled conversations to replay.")
+            return 1
+        router = KnnRouter(store, None, args.neighbors, args.confidence, args.min_similarity, args.min_votes)
+        print(f"🧪 Replaying {len(entries)} conversations through the learned router...")
+        outcomes = replay(router, entries)
+    finally:
+        store.close()
+
+    configured = score(outcomes, args.confidence, args.min_votes)
+    sweep = [score(outcomes, confidence, args.min_votes) for confidence in SWEEP_CONFIDENCES]
+    latency = router.latency.summary()
+    results = {"created": datetime.now().isoformat(), "replayed": len(outcomes), "neighbors": args.neighbors,
+               "min_similarity": args.min_similarity, "min_votes": args.min_votes,
+               "configured": configured, "sweep": sweep, "router_latency_ms": latency}
+
+    print(f"\n📊 Router at confidence {args.confidence}: answers {configured['routed']} of {len(outcomes)} "
+          f"({(configured['coverage'] or 0):.1%}), accuracy {(configured['accuracy_routed'] or 0):.1%} on those")
+    print(f"   Routing latency: p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms")
+    print(f"\n{'confidence':>11}{'coverage':>10}{'accuracy':>10}{'with LLM':>10}")
+    for row in sweep:
+        print(f"{row['min_confidence']:>11}{(row['coverage'] or 0):>10.1%}{(row['accuracy_routed'] or 0):>10.1%}"
+              f"{(row['agreement_with_fallback'] or 0):>10.1%}")
+
+    if args.llm_sample:
+        llm = asyncio.run(time_llm(entries, min(args.llm_sample, len(entries))))
+        results["llm"] = llm
+        print(f"\n🤖 Triage LLM on {llm['prompts']} prompts: p50 {llm['latency_ms']['p50']} ms, "
+              f"p95 {llm['latency_ms']['p95']} ms, agrees with its logged decision {llm['agreement_with_log']:.1%}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import time
 import asyncio
 import gradio as gr
 from datetime import datetime
@@ -8,6 +9,9 @@ from main import AIWorkforceManager
 # Load environment variables
 load_dotenv()
 
+# Minimum time between chat refreshes while agent output streams in
+STREAM_REFRESH_SECONDS = 0.05
+
 class GradioAIWorkforceManager:
     def __init__(self):
         self.manager = None
@@ -25,79 +29,42 @@ class GradioAIWorkforceManager:
         return "✅ AI Workforce Manager already initialized!"
     
     async def process_request(self, user_input, history):
-        """Process user request and return response"""
+        """
+        Process a user request, yielding (history, "") as the response streams in: progress
+        lines right away, then the agent's output as it is generated, then the final response.
+        """
         if not self.is_initialized:
             await self.initialize()
         
         if not user_input.strip():
-            return history, ""
+            yield history, ""
+            return
         
         # Add user message to history
-        history.append([user_input, None])
+        history.append([user_input, ""])
+        yield history, ""
         
+        progress = []
+        output = ""
+        last_yield = time.perf_counter()
         try:
-            # Get agent decision
-            decision_response = await self.manager.decide_agent(user_input)
-            
-            # Parse the decision using the new parser
-            parsed_decision = self.manager.parse_decision_response(decision_response)
-            
-            if parsed_decision["type"] == "single":
-                # Single agent execution
-                agent_name = parsed_decision["agent"]
-                if agent_name not in self.manager.specialized_agents:
-                    bot_response = f"❌ Error: Agent '{agent_name}' not found in available specialists."
+            async for kind, text in self.manager.stream_prompt(user_input):
+                if kind == "status":
+                    progress.append(text)
+                elif kind == "delta":
+                    output += text
                 else:
-                    bot_response = f"🎯 **Assigning to {agent_name}...**\n\n"
-                    
-                    # Get agent response
-                    agent_response = await self.manager.delegate_task(agent_name, user_input)
-                    bot_response += f"**{agent_name} Response:**\n{agent_response}"
-                    
-                    # Log the interaction
-                    self.manager.history_manager.add_entry(user_input, agent_response, agent_name, None)
-                    
-            elif parsed_decision["type"] == "multi":
-                # Multi-agent workflow execution
-                agents = parsed_decision["agents"]
-                workflow_description = parsed_decision["description"]
-                
-                bot_response = f"🔄 **Initiating Multi-Agent Workflow...**\n\n"
-                bot_response += f"**Workflow:** {' → '.join(agents)}\n"
-                bot_response += f"**Plan:** {workflow_description}\n\n"
-                
-                # Validate all agents exist
-                invalid_agents = [agent for agent in agents if agent not in self.manager.specialized_agents]
-                if invalid_agents:
-                    bot_response += f"❌ Error: Invalid agents in workflow: {', '.join(invalid_agents)}"
-                else:
-                    workflow_response = await self.manager.orchestrate_multi_agent_workflow(
-                        agents, workflow_description, user_input
-                    )
-                    bot_response += workflow_response
-                    
-                    # Log the interaction
-                    workflow_log = f"Multi-agent workflow: {' -> '.join(agents)}"
-                    self.manager.history_manager.add_entry(user_input, workflow_response, workflow_log, None)
-                    
-            elif parsed_decision["type"] == "none":
-                # No suitable agent found
-                message = parsed_decision["message"]
-                bot_response = f"🤔 **No suitable agent found for this request.**\n\n{message}"
-                
-            else:
-                # Error in decision parsing
-                error_msg = parsed_decision.get("message", "Unknown error in decision parsing")
-                bot_response = f"❌ **Decision parsing error:** {error_msg}"
-                
-            # Update history with bot response
-            history[-1][1] = bot_response
+                    output = text
+                history[-1][1] = "\n\n".join(progress + [output] if output else progress)
+                # Re-rendering the chat for every token is wasted work; refresh a few times a second
+                if kind != "delta" or time.perf_counter() - last_yield >= STREAM_REFRESH_SECONDS:
+                    last_yield = time.perf_counter()
+                    yield history, ""
             
         except Exception as e:
-            error_response = f"❌ Error processing request: {str(e)}"
-            history[-1][1] = error_response
+            history[-1][1] = f"❌ Error processing request: {str(e)}"
             
-        return history, ""
+        yield history, ""
     
     async def search_history(self, query):
         """Search chat history"""
@@ -122,24 +89,67 @@ class GradioAIWorkforceManager:
         except Exception as e:
             return f"❌ Error searching history: {str(e)}"
     
-    async def get_recent_history(self):
-        """Get recent conversation history"""
+    async def get_recent_history(self, cursor=None, offset=0):
+        """Get one page of conversation history, starting after the given cursor (numbered from offset + 1)"""
         if not self.is_initialized:
             await self.initialize()
             
         try:
-            recent = self.manager.history_manager.get_recent_history(limit=10)
-            if recent:
-                result = "📚 **Recent Conversations:**\n\n"
-                for i, entry in enumerate(recent, 1):
+            page = self.manager.history_manager.get_history_page(page_size=10, after_id=cursor)
+            if page["entries"]:
+                result = "📚 **Recent Conversations:**\n\n" if cursor is None else "📚 **Older Conversations:**\n\n"
+                for i, entry in enumerate(page["entries"], offset + 1):
                     result += f"**{i}. {entry['timestamp'][:19]}**\n"
-                    result += f"👤 User: {entry['user_prompt'][:80]}...\n"
+                    result += f"👤 User: {entry['user_prompt_preview'][:80]}...\n"
                     result += f"🤖 Agent: {entry['chosen_agent']}\n\n"
-                return result
+                if not page["has_more"]:
+                    result += "_End of conversation history._"
+                return result, page["next_cursor"], offset + len(page["entries"])
             else:
+                return "No conversation history found.", None, offset
+        except Exception as e:
+            return f"❌ Error retrieving history: {str(e)}", None, offset
+    
+    async def get_usage_report(self):
+        """Summarize conversations per agent, workflow type and day from the store's rollups"""
+        if not self.is_initialized:
+            await self.initialize()
+            
+        try:
+            rollups = self.manager.history_manager.get_rollups(days=14)
+            if not rollups["total_conversations"]:
                 return "No conversation history found."
+            result = f"📈 **Agent usage across {rollups['total_conversations']} conversations:**\n\n"
+            result += "| Agent | Conversations | Avg prompt | Avg response |\n|---|---|---|---|\n"
+            for agent, totals in sorted(rollups["agents"].items(), key=lambda item: -item[1]["conversations"]):
+                result += (f"| {agent} | {totals['conversations']} | {totals['avg_prompt_length']:.0f} | "
+                           f"{totals['avg_response_length']:.0f} |\n")
+            result += "\n**🔀 Workflow types:** " + ", ".join(f"{kind}: {count}" for kind, count in rollups["workflows"].items())
+            result += "\n\n**📅 Last 14 active days:**\n\n"
+            for day, agents in rollups["days"].items():
+                result += f"- {day}: {sum(agents.values())} conversations\n"
+            if self.manager.routing_cache is not None:
+                cache = self.manager.routing_cache.stats()
+                hit_rate = f"{cache['hit_rate']:.0%}" if cache["hit_rate"] is not None else "n/a"
+                result += (f"\n**🧭 Routing cache:** {cache['hits']} hits / {cache['misses']} misses "
+                           f"(hit rate {hit_rate}), {cache['entries']} cached decisions\n")
+            if self.manager.router is not None:
+                router = self.manager.router.stats()
+                result += (f"\n**🧭 Learned router:** {router['routed']} routed locally, "
+                           f"{router['fallback']} sent to the triage LLM\n")
+            scheduler = self.manager.llm_scheduler.stats()
+            result += (f"\n**🚦 LLM scheduler:** {scheduler['admitted']} calls, {scheduler['queued']} queued "
+                       f"(p95 wait {scheduler['queue_wait_ms']['p95'] or 0:.0f} ms), {scheduler['timeouts']} timed out, "
+                       f"peak {scheduler['peak_in_flight']} of {scheduler['max_concurrency']} in flight\n")
+            resilience = self.manager.resilience.stats()
+            result += (f"\n**🛡️ LLM resilience:** {resilience['retries']} retries, {resilience['hedges']} hedges "
+                       f"({resilience['hedge_wins']} won), {resilience['failures']} failed calls, "
+                       f"{resilience['rejected']} rejected by open circuits\n")
+            if resilience["open_circuits"]:
+                result += f"\n⚠️ Open circuits: {', '.join(resilience['open_circuits'])}\n"
+            return result
         except Exception as e:
-            return f"❌ Error retrieving history: {str(e)}"
+            return f"❌ Error retrieving usage: {str(e)}"
     
     def get_agent_info(self):
         """Get information about available agents"""
@@ -173,8 +183,9 @@ gradio_manager = GradioAIWorkforceManager()
 
 # Async wrapper functions for Gradio
 async def chat_interface(message, history):
-    """Main chat interface"""
-    return await gradio_manager.process_request(message, history)
+    """Main chat interface (streams the response into the chat)"""
+    async for update in gradio_manager.process_request(message, history):
+        yield update
 
 async def search_interface(query):
     """Search interface"""
@@ -184,6 +195,16 @@ async def history_interface():
     """History interface"""
     return await gradio_manager.get_recent_history()
 
+async def older_history_interface(cursor, offset):
+    """Next page of the history interface"""
+    if cursor is None:
+        return "_End of conversation history._", None, offset
+    return await gradio_manager.get_recent_history(cursor, offset)
+
+async def usage_interface():
+    """Usage interface"""
+    return await gradio_manager.get_usage_report()
+
 def agent_info_interface():
     """Agent info interface"""
     return gradio_manager.get_agent_info()
@@ -264,13 +285,19 @@ def create_gradio_app():
             with gr.TabItem("📚 Recent History"):
                 gr.Markdown("### View recent conversations")
                 
-                history_btn = gr.Button("Load Recent History", variant="primary")
+                history_cursor = gr.State(None)
+                history_offset = gr.State(0)
+                with gr.Row():
+                    history_btn = gr.Button("Load Recent History", variant="primary")
+                    older_btn = gr.Button("Load Older", variant="secondary")
                 history_output = gr.Markdown(
                     label="Recent Conversations",
                     height=500
                 )
                 
-                history_btn.click(history_interface, outputs=history_output)
+                history_btn.click(history_interface, outputs=[history_output, history_cursor, history_offset])
+                older_btn.click(older_history_interface, [history_cursor, history_offset],
+                                [history_output, history_cursor, history_offset])
                 
             # Agents Info Tab
             with gr.TabItem("🤖 Available Agents"):
@@ -284,6 +311,18 @@ def create_gradio_app():
                 
                 agents_btn.click(agent_info_interface, outputs=agents_output)
                 
+            # Usage Tab
+            with gr.TabItem("📈 Agent Usage"):
+                gr.Markdown("### Conversations per agent over time")
+                
+                usage_btn = gr.Button("Show Agent Usage", variant="primary")
+                usage_output = gr.Markdown(
+                    label="Agent Usage",
+                    height=500
+                )
+                
+                usage_btn.click(usage_interface, outputs=usage_output)
+                
         # Footer
         gr.Markdown("---")
         gr.Markdown("**💡 Tips:**")
@@ -0,0 +1,196 @@
+import re
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+from token_budget import count_tokens
+
+# Weight of relevance to the request vs centrality in the output, and of salience vs
+# novelty (maximal marginal relevance) when choosing the next sentence
+DEFAULT_RELEVANCE_WEIGHT = 0.5
+DEFAULT_MMR_LAMBDA = 0.7
+# Sentences at least this similar to one already kept are treated as repeats and dropped
+DUPLICATE_SIMILARITY = 0.95
+# A sentence longer than the whole budget is split into pieces of at most this many tokens
+PIECE_TOKENS = 64
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+_CLAUSE_END = re.compile(r"(?<=[,;:])\s+|\s+(?=[-–—]\s)")
+_HEADING = re.compile(r"^\s*#{1,6}\s")
+
+
+def _split_units(text: str) -> List[Tuple[int, str, bool]]:
+    """Split text into (line number, sentence, is heading) units, keeping list items and headings whole."""
+    units = []
+    for line_number, line in enumerate(text.splitlines()):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if _HEADING.match(line):
+            units.append((line_number, stripped, True))
+            continue
+        for sentence in _SENTENCE_END.split(stripped):
+            if sentence.strip():
+                units.append((line_number, sentence.strip(), False))
+    return units
+
+
+def _truncate(text: str, budget: int) -> str:
+    """The longest prefix of `text` within `budget` tokens, cut between words where possible."""
+    if count_tokens(text) <= budget:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    if low:
+        return " ".join(words[:low])
+    # Not even one word fits (e.g. a long URL): cut inside it
+    low, high = 0, len(words[0]) if words else 0
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(words[0][:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return words[0][:low] if words else ""
+
+
+def _split_long(sentence: str, limit: int) -> List[str]:
+    """
+    Break a sentence longer than `limit` tokens into clauses (at commas, semicolons, colons
+    and dashes), and a clause still longer than PIECE_TOKENS into windows of consecutive
+    words, so the pieces are small enough to fill the budget closely.
+    """
+    if count_tokens(sentence) <= limit:
+        return [sentence]
+    window_tokens = min(limit, PIECE_TOKENS)
+    pieces: List[str] = []
+    for clause in _CLAUSE_END.split(sentence):
+        clause = " ".join(clause.split())
+        while count_tokens(clause) > window_tokens:
+            window = _truncate(clause, window_tokens)
+            if not window:
+                break
+            pieces.append(window)
+            clause = clause[len(window):].strip()
+        if clause:
+            pieces.append(clause)
+    return pieces
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def compress_output(text: str, query: str, budget: int, encode: Callable[[Sequence[str]], np.ndarray],
+                    relevance_weight: float = DEFAULT_RELEVANCE_WEIGHT,
+                    mmr_lambda: float = DEFAULT_MMR_LAMBDA) -> Tuple[str, int, int]:
+    """
+    Condense an agent's output to a token budget by extractive sentence selection.
+
+    Every sentence is embedded once (one encoder batch). Its salience blends similarity to
+    the query (what the next step needs) with similarity to the output's centroid (what
+    the output is mostly about). Sentences are then picked by maximal marginal relevance,
+    so near-duplicates of already chosen sentences lose out (repeats are dropped), skipping
+    any that no longer fit the budget. A sentence longer than the whole budget is first split
+    at its clauses (or into word windows), so some of a non-empty output is always kept. The
+    kept sentences are emitted in their original order, under the headings they appeared beneath.
+
+    Args:
+        text: The full output
+        query: What the receiving step is about (e.g. the request and the agent's role)
+        budget: Maximum tokens of the condensed text
+        encode: Embeds a list of texts into a matrix (e.g. the history store's encode_texts)
+        relevance_weight: Share of salience from query similarity (the rest from centrality)
+        mmr_lambda: Share of the pick score from salience (the rest penalizes redundancy)
+
+    Returns:
+        (condensed text, original tokens, condensed tokens); text that already fits is
+        returned unchanged
+    """
+    original_tokens = count_tokens(text)
+    if original_tokens <= budget:
+        return text, original_tokens, original_tokens
+    units = _split_units(text)
+    if not units:
+        return "", original_tokens, 0
+    if all(heading for _, _, heading in units):
+        # Nothing but headings: condense them like sentences
+        units = [(line_number, unit, False) for line_number, unit, _ in units]
+    # A sentence longer than the whole budget could never be kept; split it into pieces that fit
+    if budget > 1:
+        units = [(line_number, piece, heading)
+                 for line_number, unit, heading in units
+                 for piece in ([unit] if heading else _split_long(unit, budget - 1))]
+    sentences = [i for i, (_, _, heading) in enumerate(units) if not heading]
+
+    embeddings = _normalize_rows(np.asarray(encode([query] + [units[i][1] for i in sentences]), dtype=np.float32))
+    query_embedding, sentence_embeddings = embeddings[0], embeddings[1:]
+    centroid = sentence_embeddings.mean(axis=0)
+    centroid /= np.linalg.norm(centroid) or 1.0
+    salience = (relevance_weight * (sentence_embeddings @ query_embedding)
+                + (1 - relevance_weight) * (sentence_embeddings @ centroid))
+    costs = np.array([count_tokens(units[i][1]) + 1 for i in sentences])
+    # A sentence also pays for its section heading until another sentence of that section is kept
+    heading_of = np.full(len(sentences), -1)
+    heading = -1
+    position = 0
+    for index, (_, unit, is_heading) in enumerate(units):
+        if is_heading:
+            heading = index
+        else:
+            heading_of[position] = heading
+            position += 1
+    heading_costs = np.array([count_tokens(units[h][1]) + 1 if h >= 0 else 0 for h in heading_of])
+
+    chosen: List[int] = []
+    redundancy = np.zeros(len(sentences), dtype=np.float32)
+    available = np.ones(len(sentences), dtype=bool)
+    used = 0
+    while True:
+        available &= (costs + heading_costs <= budget - used) & (redundancy < DUPLICATE_SIMILARITY)
+        if not available.any():
+            break
+        scores = np.where(available, mmr_lambda * salience - (1 - mmr_lambda) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        chosen.append(best)
+        used += int(costs[best] + heading_costs[best])
+        available[best] = False
+        if heading_of[best] >= 0:
+            heading_costs[heading_of == heading_of[best]] = 0
+        redundancy = np.maximum(redundancy, sentence_embeddings @ sentence_embeddings[best])
+
+    if not chosen:
+        # Even the best sentence does not fit beside its heading (or the budget is tiny): keep its start
+        best = int(np.argmax(salience))
+        condensed = _truncate(units[sentences[best]][1], budget)
+        return condensed, original_tokens, count_tokens(condensed)
+
+    # Re-assemble in document order, sentences of one line on one line, each under its heading
+    kept = {sentences[i] for i in chosen}
+    lines: List[str] = []
+    last_line = None
+    heading = None
+    for index, (line_number, unit, is_heading) in enumerate(units):
+        if is_heading:
+            heading = unit
+            continue
+        if index not in kept:
+            continue
+        if heading is not None:
+            lines.append(heading)
+            heading = None
+            last_line = None
+        if line_number == last_line:
+            lines[-1] += " " + unit
+        else:
+            lines.append(unit)
+        last_line = line_number
+    condensed = "\n".join(lines)
+    return condensed, original_tokens, count_tokens(condensed)
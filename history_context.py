@@ -0,0 +1,113 @@
+from functools import lru_cache
+from typing import Dict, Tuple
+
+from history_rollups import WORKFLOW_PREFIX, workflow_agents
+from token_budget import count_tokens, pack_to_budget, FALLBACK_CHARS_PER_TOKEN
+
+# Characters of each past prompt/response shown to a specialist
+PROMPT_SNIPPET_CHARS = 300
+RESPONSE_SNIPPET_CHARS = 400
+# Similar entries considered before packing, the score bonus for the specialist's own past work, and
+# the similarity below which an entry is treated as unrelated (cosine scale of the MiniLM encoder)
+DEFAULT_CANDIDATES = 40
+DEFAULT_SAME_AGENT_BONUS = 0.1
+DEFAULT_MIN_SIMILARITY = 0.1
+
+CONTEXT_HEADER = ("=== RELEVANT CHAT HISTORY ===\n"
+                  "The following past conversations are the most relevant to the current request "
+                  "(most relevant first). Use them to maintain consistency, learn from past interactions, "
+                  "and build upon previous work.\n\n")
+CONTEXT_FOOTER = "=== END CHAT HISTORY ===\n"
+
+
+def _snippet(text: str, limit: int) -> str:
+    return text[:limit] + "..." if len(text) > limit else text
+
+
+def render_history_entry(timestamp: str, chosen_agent: str, user_prompt: str, manager_response: str) -> str:
+    """
+    Render one past conversation as it appears in a specialist's context.
+
+    The block depends only on the stored entry, so its token count can be computed once
+    at insert time and reused by every context build.
+    """
+    return (f"--- Conversation ({timestamp[:19]}, {chosen_agent}) ---\n"
+            f"User Request: {_snippet(user_prompt, PROMPT_SNIPPET_CHARS)}\n"
+            f"Response: {_snippet(manager_response, RESPONSE_SNIPPET_CHARS)}\n\n")
+
+
+def history_entry_tokens(timestamp: str, chosen_agent: str, user_prompt: str, manager_response: str) -> int:
+    """Token count of render_history_entry() for one conversation (cached on the stored record)."""
+    return count_tokens(render_history_entry(timestamp, chosen_agent, user_prompt, manager_response))
+
+
+@lru_cache(maxsize=None)
+def _frame_tokens() -> int:
+    return count_tokens(CONTEXT_HEADER) + count_tokens(CONTEXT_FOOTER)
+
+
+def _cached_tokens(metadata: Dict) -> int:
+    """The entry's cached token count; entries stored before counts were cached get a length estimate."""
+    if metadata.get("context_tokens") is not None:
+        return metadata["context_tokens"]
+    chars = (min(metadata["user_prompt_length"], PROMPT_SNIPPET_CHARS)
+             + min(metadata["manager_response_length"], RESPONSE_SNIPPET_CHARS) + 80)
+    return -(-chars // FALLBACK_CHARS_PER_TOKEN)
+
+
+def involves_agent(chosen_agent: str, agent_name: str) -> bool:
+    """True if the entry was handled by `agent_name`, alone or as a step of a multi-agent workflow."""
+    if chosen_agent == agent_name:
+        return True
+    return chosen_agent.startswith(WORKFLOW_PREFIX) and agent_name in workflow_agents(chosen_agent)
+
+
+def build_agent_context(history_store, agent_name: str, request: str, budget: int,
+                        candidates: int = DEFAULT_CANDIDATES, same_agent_bonus: float = DEFAULT_SAME_AGENT_BONUS,
+                        min_similarity: float = DEFAULT_MIN_SIMILARITY) -> Tuple[str, Dict]:
+    """
+    Select the past conversations most relevant to a request and pack them into a token budget.
+
+    Candidates come from a similarity search on the request; entries handled by the same
+    specialist get a score bonus, so its own past work ranks first among similar matches.
+    Packing is greedy in ranked order using each entry's token count cached at insert, so no
+    text is tokenized here and only the kept entries' full texts are read.
+
+    Args:
+        history_store: ChatHistoryManager or HistoryServiceClient
+        agent_name: Specialist that will receive the context
+        request: The current request
+        budget: Maximum tokens for the whole context block
+        candidates: Similar entries considered
+        same_agent_bonus: Added to the similarity of entries involving `agent_name`
+        min_similarity: Entries below this similarity are never included
+
+    Returns:
+        (context text, or "" when nothing relevant fits; stats dict with "candidates",
+        "included", "same_agent" and "tokens")
+    """
+    similar = history_store.search_similar_conversations(request, n_results=candidates, include_text=False)
+    ranked = []
+    for conv in similar:
+        if conv["similarity_score"] < min_similarity:
+            continue
+        metadata = conv["metadata"]
+        same_agent = involves_agent(metadata["chosen_agent"], agent_name)
+        ranked.append((conv["similarity_score"] + (same_agent_bonus if same_agent else 0.0), same_agent, metadata))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+
+    kept, used = pack_to_budget([metadata for _, _, metadata in ranked], budget - _frame_tokens(),
+                                counter=_cached_tokens)
+    stats = {"candidates": len(similar), "included": len(kept),
+             "same_agent": sum(1 for i in kept if ranked[i][1]), "tokens": used}
+    if not kept:
+        return "", stats
+
+    blocks = []
+    for i in kept:
+        entry = history_store.get_entry(ranked[i][2]["id"])
+        if entry is not None:  # Deleted since the search
+            blocks.append(render_history_entry(entry["timestamp"], entry["chosen_agent"],
+                                               entry["user_prompt"], entry["manager_response"]))
+    stats["tokens"] += _frame_tokens()
+    return CONTEXT_HEADER + "".join(blocks) + CONTEXT_FOOTER, stats
@@ -0,0 +1,101 @@
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+# Timestamps are kept as int64 microseconds since 1970-01-01 in the same (naive, local)
+# wall-clock time the ISO strings were written in, so converting back is exact
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def timestamp_to_us(timestamp: str) -> int:
+    """Parse an ISO timestamp into epoch microseconds (aware timestamps are converted to local time)."""
+    parsed = datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return (parsed - _EPOCH) // _MICROSECOND
+
+
+def us_to_timestamp(timestamp_us: int) -> str:
+    """Format epoch microseconds back into the ISO timestamp the record was written with."""
+    return (_EPOCH + _MICROSECOND * timestamp_us).isoformat()
+
+
+class HistoryRecord:
+    """
+    Resident metadata of one stored conversation.
+
+    A slotted object instead of a dict: no per-record key table, an integer timestamp
+    instead of an ISO string, tuple blob references, and agent names interned so every
+    record naming the same agent shares one string. Records are materialized into dicts
+    only at API boundaries (to_dict) and never mutated; updates build a new record.
+    """
+
+    __slots__ = ("id", "timestamp_us", "chosen_agent", "agent_suggestion",
+                 "user_prompt_length", "manager_response_length",
+                 "user_prompt_preview", "manager_response_preview",
+                 "user_prompt_ref", "manager_response_ref", "deleted", "context_tokens")
+
+    def __init__(self, id: str, timestamp_us: int, chosen_agent: str, agent_suggestion: str,
+                 user_prompt_length: int, manager_response_length: int,
+                 user_prompt_preview: str, manager_response_preview: str,
+                 user_prompt_ref: Tuple[int, ...], manager_response_ref: Tuple[int, ...], deleted: bool = False,
+                 context_tokens: Optional[int] = None):
+        self.id = id
+        self.timestamp_us = timestamp_us
+        self.chosen_agent = sys.intern(chosen_agent)
+        self.agent_suggestion = sys.intern(agent_suggestion)
+        self.user_prompt_length = user_prompt_length
+        self.manager_response_length = manager_response_length
+        self.user_prompt_preview = user_prompt_preview
+        self.manager_response_preview = manager_response_preview
+        self.user_prompt_ref = tuple(user_prompt_ref)
+        self.manager_response_ref = tuple(manager_response_ref)
+        self.deleted = deleted
+        # Tokens of this entry's block in specialist context (None for entries stored before it was cached)
+        self.context_tokens = context_tokens
+
+    @property
+    def timestamp(self) -> str:
+        """ISO timestamp, as stored in the metadata file."""
+        return us_to_timestamp(self.timestamp_us)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "HistoryRecord":
+        """Build a record from its metadata-file / write-ahead-log form."""
+        return cls(
+            data["id"], timestamp_to_us(data["timestamp"]), data["chosen_agent"], data["agent_suggestion"],
+            data["user_prompt_length"], data["manager_response_length"],
+            data["user_prompt_preview"], data["manager_response_preview"],
+            data["user_prompt_ref"], data["manager_response_ref"], data.get("deleted", False),
+            data.get("context_tokens")
+        )
+
+    def to_dict(self) -> Dict:
+        """Materialize the metadata-file form (also returned as search result metadata)."""
+        data = {
+            "id": self.id,
+            "timestamp": self.timestamp,
+            "chosen_agent": self.chosen_agent,
+            "agent_suggestion": self.agent_suggestion,
+            "user_prompt_length": self.user_prompt_length,
+            "manager_response_length": self.manager_response_length,
+            "user_prompt_preview": self.user_prompt_preview,
+            "manager_response_preview": self.manager_response_preview,
+            "user_prompt_ref": list(self.user_prompt_ref),
+            "manager_response_ref": list(self.manager_response_ref)
+        }
+        if self.context_tokens is not None:
+            data["context_tokens"] = self.context_tokens
+        if self.deleted:
+            data["deleted"] = True
+        return data
+
+    def replace(self, **changes) -> "HistoryRecord":
+        """Return a copy with some fields changed."""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return HistoryRecord(**fields)
+
+    def __repr__(self) -> str:
+        return f"HistoryRecord(id={self.id!r}, timestamp={self.timestamp!r}, chosen_agent={self.chosen_agent!r})"
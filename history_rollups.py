@@ -0,0 +1,107 @@
+from datetime import date, timedelta
+from typing import Dict, List
+
+from history_record import HistoryRecord
+
+# chosen_agent of entries logged by multi-agent workflows starts with this
+WORKFLOW_PREFIX = "Multi-agent workflow:"
+# Responses starting with these are the error strings logged when an agent or workflow failed
+FAILED_RESPONSE_PREFIXES = ("Error:", "ERROR:", "❌")
+_US_PER_DAY = 86_400 * 1_000_000
+
+
+def workflow_type(chosen_agent: str) -> str:
+    """Classify an entry as single_agent, multi_agent or none (no agent was chosen)."""
+    if chosen_agent.startswith(WORKFLOW_PREFIX):
+        return "multi_agent"
+    if chosen_agent in ("", "None"):
+        return "none"
+    return "single_agent"
+
+
+def workflow_agents(chosen_agent: str) -> List[str]:
+    """Agents of a logged multi-agent workflow ("Multi-agent workflow: A & B -> C" -> [A, B, C])."""
+    steps = chosen_agent[len(WORKFLOW_PREFIX):].replace("&", "->").split("->")
+    return [agent.strip() for agent in steps]
+
+
+class HistoryRollups:
+    """
+    Aggregates over the stored conversations, kept up to date as entries are added,
+    updated and deleted, so dashboards and routing heuristics read them in O(1)
+    instead of rescanning history.
+
+    Tracks conversations per agent (with total prompt/response characters for averages),
+    per day and agent, and per workflow type, plus the characters of text stored. Not thread-safe; the manager updates and
+    reads it under its write lock.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.text_chars = 0
+        # agent -> [conversations, prompt characters, response characters]
+        self._agents: Dict[str, List[int]] = {}
+        # days since 1970-01-01 -> agent -> conversations
+        self._days: Dict[int, Dict[str, int]] = {}
+        self._workflows: Dict[str, int] = {}
+
+    def add(self, record: HistoryRecord, sign: int = 1):
+        """Count a stored entry (sign=-1 takes it back out)."""
+        self.total += sign
+        self.text_chars += sign * (record.user_prompt_length + record.manager_response_length)
+        agent = self._agents.setdefault(record.chosen_agent, [0, 0, 0])
+        agent[0] += sign
+        agent[1] += sign * record.user_prompt_length
+        agent[2] += sign * record.manager_response_length
+        if not agent[0]:
+            del self._agents[record.chosen_agent]
+
+        day = self._days.setdefault(record.timestamp_us // _US_PER_DAY, {})
+        day[record.chosen_agent] = day.get(record.chosen_agent, 0) + sign
+        if not day[record.chosen_agent]:
+            del day[record.chosen_agent]
+            if not day:
+                del self._days[record.timestamp_us // _US_PER_DAY]
+
+        kind = workflow_type(record.chosen_agent)
+        self._workflows[kind] = self._workflows.get(kind, 0) + sign
+        if not self._workflows[kind]:
+            del self._workflows[kind]
+
+    def remove(self, record: HistoryRecord):
+        """Take a deleted (or replaced) entry back out of the aggregates."""
+        self.add(record, sign=-1)
+
+    def agent_counts(self) -> Dict[str, int]:
+        """Conversations per chosen agent."""
+        return {agent: totals[0] for agent, totals in self._agents.items()}
+
+    def summary(self, days: int = None) -> Dict:
+        """
+        Materialize the rollups.
+
+        Args:
+            days: Only include the most recent `days` days that have entries (None for all)
+
+        Returns:
+            Dictionary with "total_conversations", "agents" (conversations and average
+            prompt/response length per agent), "days" (ISO date -> agent -> conversations)
+            and "workflows" (conversations per workflow type)
+        """
+        day_numbers = sorted(self._days)
+        if days is not None:
+            day_numbers = day_numbers[-days:] if days > 0 else []
+        return {
+            "total_conversations": self.total,
+            "agents": {
+                agent: {
+                    "conversations": count,
+                    "avg_prompt_length": round(prompt_chars / count, 1),
+                    "avg_response_length": round(response_chars / count, 1)
+                }
+                for agent, (count, prompt_chars, response_chars) in self._agents.items()
+            },
+            "days": {(date(1970, 1, 1) + timedelta(days=day)).isoformat(): dict(self._days[day])
+                     for day in day_numbers},
+            "workflows": dict(self._workflows)
+        }
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Local chat history service.
+
+One process owns the encoder and the ChatHistoryManager index and serves it over a
+small JSON-over-HTTP API (TCP or a Unix socket), so any number of frontends on the
+node share a single copy instead of each loading their own.
+
+    python history_service.py                                   # http://127.0.0.1:8765
+    python history_service.py --url unix:///tmp/history.sock
+
+Frontends opt in with HISTORY_SERVICE_URL; AIWorkforceManager then talks to the
+service through HistoryServiceClient, which mirrors ChatHistoryManager's API.
+
+Endpoints (parameters as a JSON body, or a query string for reads sent with GET):
+    POST /add      user_prompt, manager_response, chosen_agent, agent_suggestion, entry_id
+    /search        query, n_results, include_text
+    /embed         query, or texts (a list, embedded in one batch)
+    /recent        limit, include_text
+    /page          page_size, after_id, before_ts, include_text
+    /get           entry_id, include_text
+    POST /update   entry_id, user_prompt, manager_response, chosen_agent, agent_suggestion
+    POST /delete   entry_id
+    /rollups       days
+    /stats
+    /health
+    POST /batch    {"requests": [{"op": "add" | "search" | ..., "params": {...}}, ...]}
+"""
+
+import os
+import json
+import uuid
+import signal
+import socket
+import asyncio
+import argparse
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+
+from chat_history_manager import ChatHistoryManager
+
+DEFAULT_SERVICE_URL = "http://127.0.0.1:8765"
+# Largest request body accepted (a batch of long agent reports)
+MAX_BODY_BYTES = 64 * 1024 * 1024
+# Client-side write batching: queued adds are sent together after this many ms or entries
+DEFAULT_BATCH_INTERVAL_MS = 20
+DEFAULT_BATCH_SIZE = 32
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def _flag(value) -> bool:
+    """Parse a boolean parameter from JSON or a query string."""
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def parse_service_url(url: str) -> Tuple[str, str, int]:
+    """
+    Split a service URL into its transport and address.
+
+    Returns:
+        ("unix", socket_path, None) for unix:///path, or ("tcp", host, port) for http://host:port
+    """
+    parts = urlsplit(url)
+    if parts.scheme == "unix":
+        return "unix", parts.path, None
+    if parts.scheme == "http":
+        return "tcp", parts.hostname or "127.0.0.1", parts.port or 80
+    raise ValueError(f"Unsupported history service URL '{url}'. Use http://host:port or unix:///path/to/socket")
+
+
+class HistoryService:
+    """asyncio HTTP front end for one ChatHistoryManager."""
+
+    def __init__(self, manager: ChatHistoryManager, worker_threads: int = 8):
+        """
+        Args:
+            manager: The store this process owns
+            worker_threads: Threads running store calls (encoding and disk reads block)
+        """
+        self.manager = manager
+        self._executor = ThreadPoolExecutor(max_workers=worker_threads, thread_name_prefix="history-service")
+        self.operations = {
+            "add": self._add,
+            "search": self._search,
+            "embed": self._embed,
+            "recent": self._recent,
+            "page": self._page,
+            "get": self._get,
+            "update": self._update,
+            "delete": self._delete,
+            "rollups": self._rollups,
+            "stats": self._stats,
+            "health": self._health,
+        }
+
+    # Store operations (run on the worker threads; the manager is safe for concurrent use)
+
+    def _add(self, params: Dict) -> Dict:
+        entry_id = self.manager.add_entry(params["user_prompt"], params["manager_response"],
+                                          params.get("chosen_agent"), params.get("agent_suggestion"),
+                                          entry_id=params.get("entry_id"))
+        return {"id": entry_id}
+
+    def _search(self, params: Dict) -> List[Dict]:
+        return self.manager.search_similar_conversations(params["query"], int(params.get("n_results", 5)),
+                                                         include_text=_flag(params.get("include_text", True)))
+
+    def _embed(self, params: Dict) -> Dict:
+        if "texts" in params:
+            return {"embeddings": self.manager.encode_texts(list(params["texts"])).tolist()}
+        return {"embedding": self.manager.encode_query(params["query"]).tolist()}
+
+    def _recent(self, params: Dict) -> List[Dict]:
+        return self.manager.get_recent_history(int(params.get("limit", 1000)),
+                                               include_text=_flag(params.get("include_text", True)))
+
+    def _page(self, params: Dict) -> Dict:
+        return self.manager.get_history_page(int(params.get("page_size", 50)), params.get("after_id"),
+                                             params.get("before_ts"), _flag(params.get("include_text", False)))
+
+    def _get(self, params: Dict) -> Dict:
+        return self.manager.get_entry(params["entry_id"], include_text=_flag(params.get("include_text", True)))
+
+    def _update(self, params: Dict) -> Dict:
+        return self.manager.update_entry(params["entry_id"], params.get("user_prompt"), params.get("manager_response"),
+                                         params.get("chosen_agent"), params.get("agent_suggestion"))
+
+    def _delete(self, params: Dict) -> Dict:
+        return {"deleted": self.manager.delete_entry(params["entry_id"])}
+
+    def _rollups(self, params: Dict) -> Dict:
+        days = params.get("days")
+        return self.manager.get_rollups(int(days) if days is not None else None)
+
+    def _stats(self, params: Dict) -> Dict:
+        return self.manager.get_collection_stats()
+
+    def _health(self, params: Dict) -> Dict:
+        return {"status": "ok", "total_conversations": self.manager.get_collection_stats()["total_conversations"]}
+
+    def _run_operation(self, op: str, params: Dict) -> Tuple[int, object]:
+        """Execute one operation, mapping failures to an HTTP status and error payload."""
+        if op not in self.operations:
+            return 404, {"error": f"Unknown operation '{op}'"}
+        try:
+            return 200, self.operations[op](params)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"{type(e).__name__}: {e}"}
+        except Exception as e:
+            return 500, {"error": str(e)}
+
+    def _run_batch(self, requests: List[Dict]) -> Dict:
+        """Execute batched operations in order (adds keep their relative order)."""
+        responses = []
+        for request in requests:
+            status, result = self._run_operation(request.get("op"), request.get("params") or {})
+            responses.append({"status": status, "result": result} if status == 200 else {"status": status, **result})
+        return {"responses": responses}
+
+    # HTTP
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, object]:
+        parts = urlsplit(target)
+        op = parts.path.strip("/")
+        try:
+            params = json.loads(body) if body else dict(parse_qsl(parts.query))
+        except json.JSONDecodeError as e:
+            return 400, {"error": f"Invalid JSON body: {e}"}
+        if op in ("add", "update", "delete", "batch") and method != "POST":
+            return 405, {"error": f"/{op} requires POST"}
+
+        loop = asyncio.get_running_loop()
+        if op == "batch":
+            return 200, await loop.run_in_executor(self._executor, self._run_batch, params.get("requests", []))
+        return await loop.run_in_executor(self._executor, self._run_operation, op, params)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one connection until the client closes it (HTTP/1.1 keep-alive)."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if length > MAX_BODY_BYTES:
+                    status, payload, keep_alive = 413, {"error": f"Body larger than {MAX_BODY_BYTES} bytes"}, False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self._dispatch(method, target, body)
+
+                data = json.dumps(payload).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'Error')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, url: str = DEFAULT_SERVICE_URL):
+        """Listen on `url` until SIGINT/SIGTERM (or cancellation)."""
+        transport, address, port = parse_service_url(url)
+        if transport == "unix":
+            if os.path.exists(address):
+                os.remove(address)  # Stale socket from a previous run
+            server = await asyncio.start_unix_server(self._handle_connection, path=address)
+        else:
+            server = await asyncio.start_server(self._handle_connection, host=address, port=port)
+        stop = asyncio.Event()
+        try:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass  # Windows or not the main thread: stop by cancelling (Ctrl+C raises KeyboardInterrupt)
+        print(f"🛰️ Chat history service listening on {url}")
+        async with server:
+            await stop.wait()
+        print("\n🛑 Stopping chat history service")
+
+    def close(self):
+        """Stop the worker threads and drain the store."""
+        self._executor.shutdown(wait=True)
+        self.manager.close()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket."""
+
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
+
+
+class HistoryServiceClient:
+    """
+    Thin client for HistoryService with the same history API as ChatHistoryManager.
+
+    Every thread keeps one persistent connection. add_entry() queues the entry and
+    returns its id immediately; queued entries are sent as a single /batch request
+    after `batch_interval_ms` or once `batch_size` are waiting, and always before a
+    read, so a client sees its own writes.
+    """
+
+    def __init__(self, url: str = DEFAULT_SERVICE_URL, timeout: float = 30.0,
+                 batch_size: int = DEFAULT_BATCH_SIZE, batch_interval_ms: int = DEFAULT_BATCH_INTERVAL_MS):
+        """
+        Args:
+            url: http://host:port or unix:///path/to/socket
+            timeout: Socket timeout in seconds
+            batch_size: Queued adds that trigger an immediate send
+            batch_interval_ms: Longest time an add waits in the queue
+        """
+        self.url = url
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.batch_interval_ms = batch_interval_ms
+        self._transport, self._address, self._port = parse_service_url(url)
+        self._local = threading.local()
+        self._queue = []
+        self._queue_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._sender = threading.Thread(target=self._send_loop, name="history-client-batcher", daemon=True)
+        self._sender.start()
+
+    # Transport
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            if self._transport == "unix":
+                connection = _UnixHTTPConnection(self._address, self.timeout)
+            else:
+                connection = http.client.HTTPConnection(self._address, self._port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _request(self, method: str, path: str, payload: Dict = None):
+        """Send one request on this thread's connection, reconnecting once if the server dropped it."""
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = json.loads(response.read() or b"null")
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Idle keep-alive connection closed by the server before it read the request
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        if response.status == 400:
+            raise ValueError(data.get("error"))
+        if response.status != 200:
+            raise RuntimeError(f"History service error ({response.status}): {data.get('error')}")
+        return data
+
+    # Write batching
+
+    def _send_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.batch_interval_ms / 1000)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Warning: Failed to send chat history batch: {e}")
+
+    def flush(self):
+        """Send every queued add now."""
+        with self._send_lock:
+            with self._queue_lock:
+                queued, self._queue = self._queue, []
+            if not queued:
+                return
+            try:
+                data = self._request("POST", "/batch", {"requests": [{"op": "add", "params": p} for p in queued]})
+            except Exception:
+                # Put them back in front of anything queued meanwhile, so nothing is lost or reordered
+                with self._queue_lock:
+                    self._queue = queued + self._queue
+                raise
+            for response in data["responses"]:
+                if response["status"] != 200:
+                    print(f"⚠️ Warning: History service rejected an entry: {response.get('error')}")
+
+    def add_entry(self, user_prompt: str, manager_response: str, chosen_agent: str = None, agent_suggestion: str = None,
+                  entry_id: str = None) -> str:
+        """Queue an entry for the next batch and return its id."""
+        entry_id = entry_id or str(uuid.uuid4())
+        with self._queue_lock:
+            self._queue.append({"user_prompt": user_prompt, "manager_response": manager_response,
+                                "chosen_agent": chosen_agent, "agent_suggestion": agent_suggestion,
+                                "entry_id": entry_id})
+            queued = len(self._queue)
+        if queued >= self.batch_size:
+            self._wake.set()
+        return entry_id
+
+    # Reads (pending writes go first)
+
+    def _read(self, method: str, path: str, payload: Dict = None):
+        self.flush()
+        return self._request(method, path, payload)
+
+    def search_similar_conversations(self, query: str, n_results: int = 5, include_text: bool = True) -> List[Dict]:
+        return self._read("POST", "/search", {"query": query, "n_results": n_results, "include_text": include_text})
+
+    def encode_query(self, query: str) -> np.ndarray:
+        return np.asarray(self._read("POST", "/embed", {"query": query})["embedding"], dtype=np.float32)
+
+    def encode_texts(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return np.asarray(self._read("POST", "/embed", {"texts": texts})["embeddings"], dtype=np.float32)
+
+    def get_recent_history(self, limit: int = 1000, include_text: bool = True) -> List[Dict]:
+        return self._read("POST", "/recent", {"limit": limit, "include_text": include_text})
+
+    def get_history_page(self, page_size: int = 50, after_id: str = None, before_ts: str = None,
+                         include_text: bool = False) -> Dict:
+        return self._read("POST", "/page", {"page_size": page_size, "after_id": after_id,
+                                            "before_ts": before_ts, "include_text": include_text})
+
+    def iter_history(self, page_size: int = 100, after_id: str = None, before_ts: str = None,
+                     include_text: bool = False) -> Iterator[Dict]:
+        cursor = after_id
+        while True:
+            page = self.get_history_page(page_size, cursor, before_ts, include_text)
+            yield from page["entries"]
+            if not page["has_more"]:
+                return
+            cursor = page["next_cursor"]
+            before_ts = None
+
+    def get_history(self) -> List[Dict]:
+        return self.get_recent_history(limit=1000)
+
+    def get_entry(self, entry_id: str, include_text: bool = True) -> Optional[Dict]:
+        return self._read("POST", "/get", {"entry_id": entry_id, "include_text": include_text})
+
+    def update_entry(self, entry_id: str, user_prompt: str = None, manager_response: str = None,
+                     chosen_agent: str = None, agent_suggestion: str = None) -> Optional[Dict]:
+        return self._read("POST", "/update", {"entry_id": entry_id, "user_prompt": user_prompt,
+                                              "manager_response": manager_response, "chosen_agent": chosen_agent,
+                                              "agent_suggestion": agent_suggestion})
+
+    def delete_entry(self, entry_id: str) -> bool:
+        return self._read("POST", "/delete", {"entry_id": entry_id})["deleted"]
+
+    def get_rollups(self, days: int = None) -> Dict:
+        return self._read("POST", "/rollups", {"days": days})
+
+    def get_agent_counts(self) -> Dict[str, int]:
+        return {agent: totals["conversations"] for agent, totals in self.get_rollups(days=0)["agents"].items()}
+
+    def get_collection_stats(self) -> Dict:
+        return self._read("GET", "/stats")
+
+    def health(self) -> Dict:
+        return self._request("GET", "/health")
+
+    def execute_batch(self, requests: List[Tuple[str, Dict]]) -> List[Dict]:
+        """
+        Run several operations in one round trip.
+
+        Args:
+            requests: (op, params) pairs, e.g. [("search", {"query": "logo"}), ("recent", {"limit": 5})]
+
+        Returns:
+            One {"status", "result"} or {"status", "error"} dict per request, in order
+        """
+        data = self._read("POST", "/batch", {"requests": [{"op": op, "params": params} for op, params in requests]})
+        return data["responses"]
+
+    def close(self):
+        """Send queued adds and stop the batching thread."""
+        self._stop.set()
+        self._wake.set()
+        self._sender.join()
+        self.flush()
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+
+
+def create_history_store():
+    """
+    Open the chat history store for a frontend: a client for the shared service when
+    HISTORY_SERVICE_URL is set, otherwise an in-process ChatHistoryManager.
+    """
+    url = os.getenv("HISTORY_SERVICE_URL")
+    if not url:
+        return ChatHistoryManager()
+    client = HistoryServiceClient(url)
+    try:
+        stats = client.health()
+    except Exception as e:
+        client.close()
+        raise RuntimeError(f"History service at {url} is not reachable: {e}")
+    print(f"🛰️ Using shared chat history service at {url} ({stats['total_conversations']} conversations)")
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve one chat history store to every frontend on this node")
+    parser.add_argument("--url", default=os.getenv("HISTORY_SERVICE_URL", DEFAULT_SERVICE_URL),
+                        help="http://host:port or unix:///path/to/socket")
+    parser.add_argument("--db-path", default="./vector_db")
+    parser.add_argument("--collection", default="chat_history")
+    parser.add_argument("--workers", type=int, default=8, help="Threads running store operations")
+    args = parser.parse_args()
+
+    service = HistoryService(ChatHistoryManager(db_path=args.db_path, collection_name=args.collection),
+                             worker_threads=args.workers)
+    try:
+        asyncio.run(service.serve(args.url))
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping chat history service")
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
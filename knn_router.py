@@ -0,0 +1,142 @@
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from history_rollups import WORKFLOW_PREFIX, FAILED_RESPONSE_PREFIXES, workflow_type, workflow_agents
+from perf_metrics import LatencyHistogram
+
+# Neighbors that vote, the share of the (similarity-weighted) vote the winning decision
+# needs, the similarity below which a neighbor does not vote (cosine scale of the MiniLM
+# encoder) and how many neighbors must vote before the router answers at all
+DEFAULT_NEIGHBORS = 15
+DEFAULT_MIN_CONFIDENCE = 0.8
+DEFAULT_MIN_SIMILARITY = 0.6
+DEFAULT_MIN_VOTES = 5
+
+
+def decision_for_label(chosen_agent: str, agent_names: Iterable[str] = None) -> Optional[str]:
+    """
+    Turn a stored chosen_agent into the triage decision that produced it.
+
+    Args:
+        chosen_agent: "Agent Name" or "Multi-agent workflow: A & B -> C"
+        agent_names: Current roster; labels naming agents outside it give None
+
+    Returns:
+        "SINGLE: Agent Name" / "MULTI: A & B -> C", or None for entries where no agent was chosen
+    """
+    kind = workflow_type(chosen_agent or "")
+    if kind == "none":
+        return None
+    agents = workflow_agents(chosen_agent) if kind == "multi_agent" else [chosen_agent]
+    if agent_names is not None and not all(agent in agent_names for agent in agents):
+        return None
+    return f"MULTI: {chosen_agent[len(WORKFLOW_PREFIX):].strip()}" if kind == "multi_agent" else f"SINGLE: {chosen_agent}"
+
+
+class KnnRouter:
+    """
+    Local triage fast path: a similarity-weighted k-nearest-neighbor vote over past
+    routing decisions.
+
+    Every stored conversation is a labeled example (prompt embedding -> chosen agent), and
+    the neighbors come from the history store's own vector search, so the router learns
+    incrementally as entries are added, with no separate training step or model file.
+    Conversations that ended in an error do not vote. The router answers only when enough
+    close neighbors agree; otherwise the caller falls back to the triage LLM.
+    """
+
+    def __init__(self, history_store, agent_names: Iterable[str], neighbors: int = DEFAULT_NEIGHBORS,
+                 min_confidence: float = DEFAULT_MIN_CONFIDENCE, min_similarity: float = DEFAULT_MIN_SIMILARITY,
+                 min_votes: int = DEFAULT_MIN_VOTES):
+        """
+        Args:
+            history_store: ChatHistoryManager or HistoryServiceClient
+            agent_names: Agents a routed decision may name (None accepts any stored label)
+            neighbors: Nearest past conversations consulted
+            min_confidence: Share of the vote the winning decision needs
+            min_similarity: Neighbors below this similarity do not vote
+            min_votes: Voting neighbors needed before answering
+        """
+        self.history_store = history_store
+        self.agent_names = set(agent_names) if agent_names is not None else None
+        self.neighbors = neighbors
+        self.min_confidence = min_confidence
+        self.min_similarity = min_similarity
+        self.min_votes = min_votes
+        self.latency = LatencyHistogram()
+        self.counters = {"routed": 0, "fallback": 0}
+
+    def vote(self, neighbors: List[Dict]) -> Optional[Tuple[str, float, int]]:
+        """
+        Tally a similarity-weighted vote over search results.
+
+        Args:
+            neighbors: search_similar_conversations() results, best match first
+
+        Returns:
+            (winning decision, its share of the vote, voting neighbors), or None if none voted
+        """
+        weights: Dict[str, float] = {}
+        votes = 0
+        for conv in neighbors:
+            score = conv["similarity_score"]
+            metadata = conv["metadata"]
+            if score < self.min_similarity:
+                continue
+            if metadata.get("manager_response_preview", "").startswith(FAILED_RESPONSE_PREFIXES):
+                continue
+            decision = decision_for_label(metadata.get("chosen_agent"), self.agent_names)
+            if decision is None:
+                continue
+            weights[decision] = weights.get(decision, 0.0) + score
+            votes += 1
+        if not votes:
+            return None
+        decision = max(weights, key=weights.get)
+        return decision, weights[decision] / sum(weights.values()), votes
+
+    def nearest(self, prompt: str, neighbor_filter: Callable[[Dict], bool] = None) -> List[Dict]:
+        """
+        Find the past conversations that vote on a prompt.
+
+        Args:
+            prompt: The request being routed
+            neighbor_filter: Keeps only neighbors whose metadata passes (e.g. entries older than
+                the one being replayed in an offline evaluation)
+
+        Returns:
+            Up to `neighbors` search results (metadata only), best match first
+        """
+        n_results = self.neighbors * 3 if neighbor_filter else self.neighbors
+        neighbors = self.history_store.search_similar_conversations(prompt, n_results=n_results, include_text=False)
+        if neighbor_filter:
+            neighbors = [conv for conv in neighbors if neighbor_filter(conv["metadata"])]
+        return neighbors[:self.neighbors]
+
+    def route(self, prompt: str) -> Optional[Tuple[str, float]]:
+        """
+        Route a prompt from its nearest past conversations.
+
+        Args:
+            prompt: The request being routed
+
+        Returns:
+            (decision, confidence) when the vote is confident enough, else None (use the LLM)
+        """
+        start = time.perf_counter()
+        try:
+            result = self.vote(self.nearest(prompt))
+            if result is None or result[1] < self.min_confidence or result[2] < self.min_votes:
+                self.counters["fallback"] += 1
+                return None
+            self.counters["routed"] += 1
+            return result[0], result[1]
+        finally:
+            self.latency.record((time.perf_counter() - start) * 1000)
+
+    def stats(self) -> Dict:
+        """Routed/fallback counts and routing latency."""
+        answered = self.counters["routed"] + self.counters["fallback"]
+        return {**self.counters,
+                "coverage": round(self.counters["routed"] / answered, 4) if answered else None,
+                "latency_ms": self.latency.summary()}
@@ -0,0 +1,248 @@
+import time
+import random
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+from deadlines import Deadline, DeadlineExceeded
+from llm_scheduler import AdmissionTimeout
+from perf_metrics import LatencyHistogram
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_BASE_SECONDS = 1.0
+DEFAULT_RETRY_MAX_SECONDS = 20.0
+# A hedge waits for this many successful calls of the same agent before trusting its p95
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+DEFAULT_BREAKER_FAILURES = 5
+DEFAULT_BREAKER_COOLDOWN_SECONDS = 30.0
+
+# HTTP statuses worth retrying: timeout, conflict, rate limit and server-side failures
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Provider errors named by class, so the openai package is not imported here
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Classify a failed LLM call: transient failures (network, timeouts, rate limits, 5xx)
+    are worth retrying; bad requests, auth errors and agent errors (e.g. too many turns)
+    would fail the same way again. A call that timed out waiting for admission is not
+    retried either, since a retry would only add to the overload, and neither is one
+    stopped by its request's deadline.
+    """
+    if isinstance(error, (AdmissionTimeout, DeadlineExceeded)):
+        return False
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def retry_delay(attempt: int, base: float, cap: float, error: BaseException = None) -> float:
+    """
+    Seconds to wait before retry number `attempt` (1 = first retry): exponential backoff
+    with full jitter, or the server's Retry-After when it sent one.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is not None:
+        try:
+            return min(cap, float(headers.get("retry-after")))
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Stops calling an agent that keeps failing. After `failure_threshold` consecutive failed
+    calls the circuit opens and calls fail immediately for `cooldown` seconds; then a single
+    probe call is let through (half-open), which closes the circuit if it succeeds and
+    reopens it if it fails.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_BREAKER_FAILURES,
+                 cooldown: float = DEFAULT_BREAKER_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now (claims the probe when half-open)."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        # A failed probe reopens the circuit; in closed state it opens at the threshold
+        if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.trips += 1
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def retry_in(self) -> float:
+        """Seconds until the circuit lets a probe through."""
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at)) if self.opened_at is not None else 0.0
+
+
+class LlmResilience:
+    """
+    Retries, hedging and circuit breaking for LLM calls, tracked per agent.
+
+    A call is made by an `attempt` coroutine function (one complete LLM call). Transient
+    failures are retried with backoff; when hedging, a duplicate attempt starts if the first
+    has not finished within the agent's p95 latency and whichever finishes first wins (the
+    other is cancelled), so one slow response no longer sets the request's latency.
+    """
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, retry_base: float = DEFAULT_RETRY_BASE_SECONDS,
+                 retry_max: float = DEFAULT_RETRY_MAX_SECONDS, breaker_failures: int = DEFAULT_BREAKER_FAILURES,
+                 breaker_cooldown: float = DEFAULT_BREAKER_COOLDOWN_SECONDS,
+                 hedge_min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES):
+        """
+        Args:
+            max_attempts: Attempts per call, including the first
+            retry_base: Backoff before the first retry (doubling for each further one), in seconds
+            retry_max: Longest backoff, in seconds
+            breaker_failures: Consecutive failed calls that open an agent's circuit
+            breaker_cooldown: Seconds an open circuit fails calls before probing again
+            hedge_min_samples: Successful calls of an agent needed before hedging it
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.hedge_min_samples = hedge_min_samples
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.counters = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0, "rejected": 0}
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        if key not in self.breakers:
+            self.breakers[key] = CircuitBreaker(self.breaker_failures, self.breaker_cooldown)
+        return self.breakers[key]
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """Seconds after which a call of `key` is hedged (its p95 latency), or None until enough samples."""
+        histogram = self.latency.get(key)
+        if histogram is None or histogram.count < self.hedge_min_samples:
+            return None
+        return histogram.percentile(95) / 1000
+
+    async def _timed(self, key: str, attempt: Callable[[], Awaitable]):
+        start = time.perf_counter()
+        result = await attempt()
+        self.latency.setdefault(key, LatencyHistogram()).record((time.perf_counter() - start) * 1000)
+        return result
+
+    async def _hedged(self, key: str, attempt: Callable[[], Awaitable], delay: float):
+        """Run an attempt, adding a duplicate after `delay` seconds; the first success wins."""
+        first = asyncio.ensure_future(self._timed(key, attempt))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                self.counters["hedges"] += 1
+                pending.add(asyncio.ensure_future(self._timed(key, attempt)))
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                if not pending:
+                    raise next(iter(done)).exception()
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, key: str, attempt: Callable[[], Awaitable], hedge: bool = False,
+                   can_retry: Callable[[], bool] = None, deadline: Deadline = None):
+        """
+        Make an LLM call with retries, optional hedging and the agent's circuit breaker.
+
+        Args:
+            key: Agent name (breakers and latency are per agent)
+            attempt: Coroutine function making one complete call
+            hedge: Start a duplicate attempt once the first runs past the agent's p95
+            can_retry: Checked before retrying (e.g. False once streamed output was shown)
+            deadline: The request's deadline; no retry starts that could not finish its backoff before it
+
+        Returns:
+            The attempt's result
+
+        Raises:
+            RuntimeError: The agent's circuit is open
+            Exception: The last attempt's error, when it is not retryable or attempts ran out
+        """
+        breaker = self.breaker(key)
+        self.counters["calls"] += 1
+        if not breaker.allow():
+            self.counters["rejected"] += 1
+            raise RuntimeError(f"{key} is temporarily unavailable after {breaker.failures} consecutive failures "
+                               f"(retrying in {breaker.retry_in():.0f}s)")
+        attempt_number = 1
+        while True:
+            try:
+                delay = self.hedge_delay(key) if hedge else None
+                result = await (self._hedged(key, attempt, delay) if delay is not None else self._timed(key, attempt))
+            except asyncio.CancelledError:
+                # Not the agent's fault; let the next caller probe again
+                breaker.probing = False
+                raise
+            except Exception as e:
+                wait = retry_delay(attempt_number, self.retry_base, self.retry_max, e)
+                remaining = deadline.remaining() if deadline is not None else None
+                retry = (is_retryable(e) and attempt_number < self.max_attempts
+                         and (can_retry is None or can_retry()) and (remaining is None or remaining > wait))
+                if not retry:
+                    # Overload and expired requests say nothing about the agent's health
+                    if isinstance(e, (AdmissionTimeout, DeadlineExceeded)):
+                        breaker.probing = False
+                    else:
+                        breaker.record_failure()
+                    self.counters["failures"] += 1
+                    raise
+                print(f"⚠️ {key}: attempt {attempt_number} failed ({type(e).__name__}: {e}); retrying in {wait:.1f}s")
+                self.counters["retries"] += 1
+                attempt_number += 1
+                await asyncio.sleep(wait)
+                continue
+            breaker.record_success()
+            return result
+
+    def stats(self) -> Dict:
+        """Call counts, and per agent the circuit state and latency percentiles."""
+        return {**self.counters,
+                "agents": {key: {"circuit": self.breaker(key).state, "trips": self.breaker(key).trips,
+                                 "latency_ms": histogram.summary()}
+                           for key, histogram in self.latency.items()},
+                "open_circuits": [key for key, breaker in self.breakers.items() if breaker.state != "closed"]}
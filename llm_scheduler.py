@@ -0,0 +1,233 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from perf_metrics import LatencyHistogram
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 200000
+DEFAULT_QUEUE_TIMEOUT_SECONDS = 120.0
+# Output tokens assumed for a caller with no completed calls yet, and how fast the
+# per-caller estimate follows observed output sizes
+DEFAULT_OUTPUT_TOKENS = 1000
+ESTIMATE_SMOOTHING = 0.2
+
+
+class AdmissionTimeout(TimeoutError):
+    """An LLM call waited for admission longer than its queue timeout (the process is overloaded)."""
+
+
+class TokenBucket:
+    """
+    Per-minute budget refilled continuously, starting full. The level may go negative
+    when a call turns out to use more than it reserved; later calls then wait for the debt.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        self._refill()
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def give(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Reservation:
+    """Capacity held by one admitted LLM call; settle() with the actual usage once known."""
+
+    def __init__(self, scheduler: "LlmScheduler", key: str, tokens: int):
+        self.scheduler = scheduler
+        self.key = key
+        self.tokens = tokens
+        self.settled = False
+
+    def settle(self, total_tokens: int, output_tokens: Optional[int] = None):
+        """
+        Reconcile the token bucket with what the call actually used.
+
+        Args:
+            total_tokens: Prompt plus output tokens of the call
+            output_tokens: Output tokens alone (refines the estimate for the next call of this key)
+        """
+        if self.settled:
+            return
+        self.settled = True
+        self.scheduler._settle(self, total_tokens, output_tokens)
+
+
+class LlmScheduler:
+    """
+    Admission control for every LLM call of the process.
+
+    A call reserves one request and its estimated tokens (prompt plus the output usually
+    produced by that caller) and is admitted once fewer than `max_concurrency` calls are in
+    flight and the request-per-minute and token-per-minute buckets cover it. Otherwise it
+    waits in a FIFO queue (so a large call is not starved by smaller ones behind it) until it
+    fits or `queue_timeout` passes. After the call the reservation is reconciled with the
+    tokens actually used. All state lives on the event loop; limits apply per process.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+                 queue_timeout: float = DEFAULT_QUEUE_TIMEOUT_SECONDS):
+        """
+        Args:
+            max_concurrency: Calls in flight at once (0 = unlimited)
+            requests_per_minute: Calls started per minute (0 = unlimited)
+            tokens_per_minute: Tokens (prompt plus output) per minute (0 = unlimited)
+            queue_timeout: Default longest wait for admission, in seconds
+        """
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.output_estimates: Dict[str, float] = {}
+        self.queue_wait = LatencyHistogram()
+        self.counters = {"admitted": 0, "queued": 0, "timeouts": 0, "reserved_tokens": 0, "used_tokens": 0}
+        self._queue = deque()
+        self._changed = asyncio.Event()
+
+    def estimate(self, key: str, prompt_tokens: int) -> int:
+        """Tokens to reserve for a call: the prompt plus the output this caller usually produces."""
+        tokens = prompt_tokens + int(self.output_estimates.get(key, DEFAULT_OUTPUT_TOKENS))
+        # A call larger than the whole bucket could never be admitted; let it drain the bucket instead
+        return min(tokens, int(self.tokens.capacity)) if self.tokens else tokens
+
+    def _admission_delay(self, tokens: int) -> Optional[float]:
+        """Seconds until a call of `tokens` fits the buckets, or None while no slot is free."""
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            return None
+        return max(self.requests.wait_time(1) if self.requests else 0.0,
+                   self.tokens.wait_time(tokens) if self.tokens else 0.0)
+
+    def _notify(self):
+        """Wake every waiter to re-check the queue head (a slot or the head changed)."""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def acquire(self, key: str, prompt_tokens: int, timeout: float = None) -> Reservation:
+        """
+        Wait until a call may start and reserve its capacity.
+
+        Args:
+            key: Who is calling (e.g. the agent name); output sizes are learned per key
+            prompt_tokens: Tokens in the prompt
+            timeout: Longest wait in seconds (default `queue_timeout`)
+
+        Returns:
+            The reservation; pass it to release() when the call ends
+
+        Raises:
+            AdmissionTimeout: The call was not admitted in time
+        """
+        tokens = self.estimate(key, prompt_tokens)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + (self.queue_timeout if timeout is None else timeout)
+        ticket = object()
+        self._queue.append(ticket)
+        waited = False
+        try:
+            while True:
+                delay = self._admission_delay(tokens) if self._queue[0] is ticket else None
+                if delay == 0:
+                    break
+                if not waited:
+                    waited = True
+                    self.counters["queued"] += 1
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.counters["timeouts"] += 1
+                    raise AdmissionTimeout(f"LLM call for {key} was not admitted within "
+                                       f"{loop.time() - start:.1f}s ({self.in_flight} in flight, "
+                                       f"{len(self._queue) - 1} queued)")
+                try:
+                    await asyncio.wait_for(self._changed.wait(), remaining if delay is None else min(delay, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._queue.remove(ticket)
+            self._notify()
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+        self.counters["admitted"] += 1
+        self.counters["reserved_tokens"] += tokens
+        self.queue_wait.record((loop.time() - start) * 1000)
+        return Reservation(self, key, tokens)
+
+    def release(self, reservation: Reservation):
+        """Free the call's slot (its tokens stay spent as reserved unless settled)."""
+        if not reservation.settled:
+            reservation.settled = True
+            self.counters["used_tokens"] += reservation.tokens
+        self.in_flight -= 1
+        self._notify()
+
+    def _settle(self, reservation: Reservation, total_tokens: int, output_tokens: Optional[int]):
+        if self.tokens:
+            # Refund an over-estimate; charge an under-estimate (the bucket may go into debt)
+            difference = reservation.tokens - total_tokens
+            if difference > 0:
+                self.tokens.give(difference)
+            else:
+                self.tokens.take(-difference)
+        self.counters["used_tokens"] += total_tokens
+        if output_tokens is not None:
+            previous = self.output_estimates.get(reservation.key, DEFAULT_OUTPUT_TOKENS)
+            self.output_estimates[reservation.key] = previous + ESTIMATE_SMOOTHING * (output_tokens - previous)
+        self._notify()
+
+    @asynccontextmanager
+    async def reserve(self, key: str, prompt_tokens: int, timeout: float = None):
+        """
+        Hold an admitted slot for the duration of a call:
+
+            async with scheduler.reserve("Content Writer", prompt_tokens) as reservation:
+                result = await run(...)
+                reservation.settle(total_tokens, output_tokens)
+        """
+        reservation = await self.acquire(key, prompt_tokens, timeout)
+        try:
+            yield reservation
+        finally:
+            self.release(reservation)
+
+    def stats(self) -> Dict:
+        """Limits, current load, queueing delay and token accounting."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "waiting": len(self._queue),
+            "requests_available": round(self.requests.level, 1) if self.requests else None,
+            "tokens_available": round(self.tokens.level) if self.tokens else None,
+            "queue_wait_ms": self.queue_wait.summary(),
+            **self.counters,
+        }
@@ -1,14 +1,112 @@
 # main.py
 import os
+import time
+import uuid
 import asyncio
+from collections import OrderedDict
 from dotenv import load_dotenv
 from agents import Agent, Runner
-from chat_history_manager import ChatHistoryManager
+from history_service import create_history_store
+from token_budget import count_tokens, pack_to_budget
+from history_context import build_agent_context, DEFAULT_MIN_SIMILARITY
+from routing_cache import RoutingCache, roster_fingerprint
+from result_cache import ResultCache, content_key, normalize_prompt
+from workflow_engine import WorkflowPlan, run_plan
+from handoff_compression import compress_output
+from knn_router import KnnRouter, DEFAULT_NEIGHBORS, DEFAULT_MIN_CONFIDENCE, DEFAULT_MIN_SIMILARITY, DEFAULT_MIN_VOTES
+from history_rollups import FAILED_RESPONSE_PREFIXES
+from llm_scheduler import (LlmScheduler, DEFAULT_MAX_CONCURRENCY, DEFAULT_REQUESTS_PER_MINUTE,
+                           DEFAULT_TOKENS_PER_MINUTE, DEFAULT_QUEUE_TIMEOUT_SECONDS)
+from deadlines import Deadline
+from llm_resilience import (LlmResilience, DEFAULT_MAX_ATTEMPTS, DEFAULT_RETRY_BASE_SECONDS, DEFAULT_RETRY_MAX_SECONDS,
+                            DEFAULT_BREAKER_FAILURES, DEFAULT_BREAKER_COOLDOWN_SECONDS)
 from pdf_agent_tools import create_pdf_document, create_report_document
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Triage context: similar past decisions plus a recency window, capped at a token budget
+DECISION_CONTEXT_TOKENS = int(os.getenv("DECISION_CONTEXT_TOKENS", 1500))
+DECISION_SIMILAR_RESULTS = int(os.getenv("DECISION_SIMILAR_RESULTS", 8))
+DECISION_RECENT_RESULTS = int(os.getenv("DECISION_RECENT_RESULTS", 5))
+
+# Specialist context: relevant past conversations packed into a per-agent token budget
+AGENT_CONTEXT_TOKENS = int(os.getenv("AGENT_CONTEXT_TOKENS", 2000))
+AGENT_CONTEXT_MIN_SIMILARITY = float(os.getenv("AGENT_CONTEXT_MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY))
+AGENT_CONTEXT_BUDGETS = {
+    # Writing and analysis agents build on past content; production agents mostly need the request
+    "Content Writer": 3000,
+    "Market Research Analyst": 3000,
+    "Business Environment Analyst": 3000,
+    "Data Analyst": 2500,
+    "Web Scraper": 1000,
+    "Video Editor": 1000,
+}
+
+# Semantic routing cache: reuse the triage decision of a near-identical, successfully handled prompt
+ROUTING_CACHE = os.getenv("ROUTING_CACHE", "true").lower() != "false"
+ROUTING_CACHE_PATH = os.getenv("ROUTING_CACHE_PATH", "./vector_db/routing_cache.npz")
+ROUTING_CACHE_THRESHOLD = float(os.getenv("ROUTING_CACHE_THRESHOLD", 0.9))
+ROUTING_CACHE_TTL_HOURS = float(os.getenv("ROUTING_CACHE_TTL_HOURS", 24))
+ROUTING_CACHE_SIZE = int(os.getenv("ROUTING_CACHE_SIZE", 2000))
+
+# Result cache: finished requests (keyed on the normalized prompt) and workflow steps (keyed on the
+# agent, its instructions and the step input); RESULT_CACHE=false or bypass_cache=True skips it
+RESULT_CACHE = os.getenv("RESULT_CACHE", "true").lower() != "false"
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "./vector_db/result_cache")
+RESULT_CACHE_TTL_HOURS = float(os.getenv("RESULT_CACHE_TTL_HOURS", 24))
+RESULT_CACHE_STEP_TTL_HOURS = float(os.getenv("RESULT_CACHE_STEP_TTL_HOURS", 24))
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", 256))
+# Agents whose work has side effects beyond their text response (files written), so it is never replayed
+UNCACHEABLE_AGENTS = {"PDF Producer"}
+
+# Workflow handoffs: outputs forwarded to a step are condensed to its most salient sentences within
+# this many tokens (shared by its dependencies; 0 forwards full outputs). The final report keeps them whole.
+HANDOFF_CONTEXT_TOKENS = int(os.getenv("HANDOFF_CONTEXT_TOKENS", 1500))
+# Agents that render previous outputs verbatim (into a document) rather than read them
+FULL_HANDOFF_AGENTS = {"PDF Producer"}
+
+# Learned router: answer triage locally from a vote of the nearest past decisions when it is confident
+KNN_ROUTER = os.getenv("KNN_ROUTER", "true").lower() != "false"
+KNN_ROUTER_NEIGHBORS = int(os.getenv("KNN_ROUTER_NEIGHBORS", DEFAULT_NEIGHBORS))
+KNN_ROUTER_CONFIDENCE = float(os.getenv("KNN_ROUTER_CONFIDENCE", DEFAULT_MIN_CONFIDENCE))
+KNN_ROUTER_MIN_SIMILARITY = float(os.getenv("KNN_ROUTER_MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY))
+KNN_ROUTER_MIN_VOTES = int(os.getenv("KNN_ROUTER_MIN_VOTES", DEFAULT_MIN_VOTES))
+
+# LLM scheduler: every agent call waits for a free slot and room in the per-minute request and token
+# budgets (set below the account's provider limits; 0 = unlimited), queueing up to LLM_QUEUE_TIMEOUT seconds
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT_SECONDS))
+
+# Resilience: transient LLM failures are retried with jittered exponential backoff, calls of HEDGED_AGENTS
+# get a duplicate request once they run past their p95 latency, and an agent failing LLM_BREAKER_FAILURES
+# calls in a row is not called for LLM_BREAKER_COOLDOWN seconds
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", DEFAULT_RETRY_BASE_SECONDS))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", DEFAULT_RETRY_MAX_SECONDS))
+LLM_HEDGING = os.getenv("LLM_HEDGING", "true").lower() != "false"
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", DEFAULT_BREAKER_FAILURES))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", DEFAULT_BREAKER_COOLDOWN_SECONDS))
+# Short calls whose latency the whole request waits on; long generations are not worth paying twice for
+HEDGED_AGENTS = {"AI Workforce Manager"}
+
+# Time limits: a request must finish within REQUEST_TIMEOUT_SECONDS (0 = no limit), and each agent call within
+# its own timeout (retried while the request still has time); workflows then report the steps that finished
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", 600))
+AGENT_TIMEOUT_SECONDS = float(os.getenv("AGENT_TIMEOUT_SECONDS", 180))
+AGENT_TIMEOUTS = {
+    # Routing is a one-line answer; long-form writing legitimately takes minutes
+    "AI Workforce Manager": 60,
+    "Content Writer": 300,
+    "Market Research Analyst": 240,
+    "Business Environment Analyst": 240,
+}
+
+# Streaming: print agent output in the CLI as it is generated instead of when the agent finishes
+STREAM_OUTPUT = os.getenv("STREAM_OUTPUT", "true").lower() != "false"
+
 # --- Agent Definitions using OpenAI Agents SDK ---
 def create_specialized_agents():
     """Create all specialized AI agents using the OpenAI Agents SDK"""
@@ -251,7 +349,8 @@ class AIWorkforceManager:
     def __init__(self):
         try:
             self.specialized_agents = create_specialized_agents()
-            self.history_manager = ChatHistoryManager()
+            # In-process store, or the shared history service when HISTORY_SERVICE_URL is set
+            self.history_manager = create_history_store()
             
             # Create the triage agent that will decide which specialist to use
             self.triage_agent = Agent(
@@ -271,6 +370,11 @@ class AIWorkforceManager:
                 MULTI: [Agent1] -> [Agent2] -> [Agent3] (in execution order)
                 WORKFLOW: Brief description of how agents will work together
                 
+                Agents that do not need each other's output can run at the same time: join them
+                with & inside one step, e.g. MULTI: [Agent1] & [Agent2] -> [Agent3]
+                (Agent3 receives the outputs of both Agent1 and Agent2). Prefer this whenever
+                steps are independent, because parallel steps finish sooner.
+                
                 For NO SUITABLE AGENT, respond with:
                 NONE: Brief explanation of what's needed
                 
@@ -295,6 +399,8 @@ class AIWorkforceManager:
                   → MULTI: Social Media Manager -> Social Media Video Creator -> Graphic Designer
                 - "Analyze a company and create a business presentation"
                   → MULTI: Web Scraper -> Business Environment Analyst -> PowerPoint Producer
+                - "Research competitors and our market, then write a blog post"
+                  → MULTI: Web Scraper & Market Research Analyst -> Content Writer
                 
                 Always prioritize delivering the most complete and valuable output to the user.""",
                 handoffs=list(self.specialized_agents.values())
@@ -314,6 +420,42 @@ class AIWorkforceManager:
             print(f"  • Collection name: {stats['collection_name']}")
             print(f"  • Embedding dimension: {stats['embedding_dimension']}")
             
+            # Shared by concurrent requests (Gradio sessions) and parallel workflow steps
+            self.llm_scheduler = LlmScheduler(LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE,
+                                              LLM_TOKENS_PER_MINUTE, LLM_QUEUE_TIMEOUT)
+            self.resilience = LlmResilience(LLM_MAX_ATTEMPTS, LLM_RETRY_BASE_SECONDS, LLM_RETRY_MAX_SECONDS,
+                                            LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+            
+            self.router = None
+            if KNN_ROUTER:
+                self.router = KnnRouter(self.history_manager, self.specialized_agents, KNN_ROUTER_NEIGHBORS,
+                                        KNN_ROUTER_CONFIDENCE, KNN_ROUTER_MIN_SIMILARITY, KNN_ROUTER_MIN_VOTES)
+            
+            # Triage decisions awaiting their outcome: request id -> (embedding, decision, source)
+            self._pending_routes = OrderedDict()
+            self.routing_cache = None
+            if ROUTING_CACHE:
+                fingerprint = roster_fingerprint(self.specialized_agents, self.triage_agent.instructions,
+                                                 stats.get("encoder_identity", ""))
+                self.routing_cache = RoutingCache(fingerprint, ROUTING_CACHE_PATH, ROUTING_CACHE_THRESHOLD,
+                                                  ROUTING_CACHE_TTL_HOURS * 3600, ROUTING_CACHE_SIZE)
+                print(f"  • Routing cache: {self.routing_cache.stats()['entries']} cached decisions")
+            
+            # Whole-request results depend on every agent and the triage instructions; step results
+            # only on the agent that produced them
+            self.request_cache = self.step_cache = None
+            if RESULT_CACHE:
+                self._roster_key = roster_fingerprint(self.specialized_agents, self.triage_agent.instructions)
+                self._agent_keys = {name: roster_fingerprint({name: agent})
+                                    for name, agent in self.specialized_agents.items()}
+                max_bytes = int(RESULT_CACHE_MAX_MB * 1024 * 1024) // 2
+                self.request_cache = ResultCache(os.path.join(RESULT_CACHE_DIR, "requests"),
+                                                 RESULT_CACHE_TTL_HOURS * 3600, max_bytes)
+                self.step_cache = ResultCache(os.path.join(RESULT_CACHE_DIR, "steps"),
+                                              RESULT_CACHE_STEP_TTL_HOURS * 3600, max_bytes)
+                print(f"  • Result cache: {self.request_cache.stats()['entries']} requests, "
+                      f"{self.step_cache.stats()['entries']} workflow steps")
+            
             print(f"\n🚀 Multi-Agent Workflow Examples:")
             print(f"  • 'Create a comprehensive marketing strategy with visuals and PDF'")
             print(f"  • 'Build a social media campaign with video content'")
@@ -322,37 +464,53 @@ class AIWorkforceManager:
             
             print("\n--- Enter 'quit' to exit ---")
             print("--- Enter 'search <query>' to search similar conversations ---")
-            print("--- Enter 'history' to view recent conversations ---\n")
+            print("--- Enter 'history' to view recent conversations ---")
+            print("--- Enter 'usage' to view conversations per agent ---")
+            print("--- Enter 'fresh <prompt>' to run a prompt without the result cache ---\n")
             
         except Exception as e:
             print(f"❌ Failed to initialize AI Workforce Manager: {e}")
             print("Please ensure sentence-transformers and scikit-learn are properly installed.")
             raise
 
-    async def decide_agent(self, user_prompt):
+    async def decide_agent(self, user_prompt, deadline=None, request_id=None):
         """
-        Uses the triage agent to decide which specialist agent should handle the task
+        Uses the triage agent to decide which specialist agent should handle the task.
+        A near-identical prompt whose decision was handled successfully reuses that decision
+        from the routing cache; otherwise the local kNN router answers when its nearest past
+        decisions agree, and only low-confidence prompts reach the triage LLM. Report the
+        outcome with record_routing_outcome().
+        
+        Args:
+            user_prompt: The user's request
+            deadline: The request's Deadline (the triage call is stopped when it passes)
+            request_id: Id the outcome will be reported under (the request's history entry id);
+                without one the decision does not feed the routing cache
         """
         try:
-            # Retrieve complete chat history for better decision making
-            print(f"[DEBUG] Retrieving complete chat history for agent selection...")
-            chat_history = self.history_manager.get_recent_history(limit=1000)  # Get last 20 conversations for decision making
+            route_embedding = self._route_embedding(user_prompt)
+            if route_embedding is not None:
+                cached = self.routing_cache.lookup(route_embedding)
+                if cached is not None:
+                    decision, similarity = cached
+                    print(f"[DEBUG] Routing cache hit (similarity {similarity:.3f}): {decision}")
+                    self._remember_route(request_id, route_embedding, decision, "cache")
+                    return decision
             
-            # Format chat history for decision making
-            decision_context = ""
-            if chat_history:
-                decision_context = "\n\nCOMPLETE CHAT HISTORY FOR REFERENCE:\n"
-                decision_context += f"Here are the last {len(chat_history)} conversations to help you make consistent decisions:\n\n"
-                
-                for i, conv in enumerate(chat_history, 1):
-                    timestamp = conv.get('timestamp', 'Unknown')[:19]
-                    chosen_agent = conv.get('chosen_agent', 'Unknown')
-                    user_request = conv.get('user_prompt', '')[:150]
-                    
-                    decision_context += f"{i}. [{timestamp}] \"{user_request}{'...' if len(conv.get('user_prompt', '')) > 150 else ''}\"\n"
-                    decision_context += f"   → Agent chosen: {chosen_agent}\n\n"
-                
-                decision_context += "Consider this complete history when making your current choice. Look for patterns, maintain consistency with similar past requests, but adapt based on the specific requirements of the new request."
+            if self.router is not None:
+                try:
+                    routed = self.router.route(user_prompt)
+                except Exception as e:
+                    print(f"⚠️ Warning: Learned router skipped: {e}")
+                    routed = None
+                if routed is not None:
+                    decision, confidence = routed
+                    print(f"[DEBUG] Learned router decided (confidence {confidence:.2f}): {decision}")
+                    self._remember_route(request_id, route_embedding, decision, "router")
+                    return decision
+            
+            print(f"[DEBUG] Retrieving similar and recent decisions for agent selection...")
+            decision_context = self._build_decision_context(user_prompt)
             
             decision_prompt = f"""Analyze this user request and determine the optimal approach to complete it: '{user_prompt}'
             
@@ -363,18 +521,118 @@ class AIWorkforceManager:
             
             For MULTI responses, also include a WORKFLOW line explaining how the agents will collaborate.{decision_context}"""
 
-            print(f"[DEBUG] Sending decision request to AI Workforce Manager with complete history...")
+            print(f"[DEBUG] Sending decision request to AI Workforce Manager ({count_tokens(decision_prompt)} prompt tokens)...")
             
-            result = await Runner.run(self.triage_agent, decision_prompt)
-            chosen_agent_response = result.final_output.strip()
+            chosen_agent_response = (await self._run_agent(self.triage_agent, decision_prompt,
+                                                           deadline=deadline)).strip()
             
             print(f"[DEBUG] AI Workforce Manager decided: {chosen_agent_response}")
+            if route_embedding is not None:
+                self._remember_route(request_id, route_embedding, chosen_agent_response, "llm")
             return chosen_agent_response
             
         except Exception as e:
             print(f"Error in agent decision: {e}")
             return f"Error: Could not decide agent - {str(e)}"
 
+    def _route_embedding(self, user_prompt: str):
+        """Embedding used as the routing cache key (None when the cache is off or the encoder fails)."""
+        if self.routing_cache is None:
+            return None
+        try:
+            return self.history_manager.encode_query(user_prompt)
+        except Exception as e:
+            print(f"⚠️ Warning: Routing cache skipped: {e}")
+            return None
+
+    def _remember_route(self, request_id: str, embedding, decision: str, source: str):
+        if embedding is None or request_id is None:
+            return
+        self._pending_routes[request_id] = (embedding, decision, source)
+        while len(self._pending_routes) > 64:  # Outcomes that were never reported
+            self._pending_routes.popitem(last=False)
+
+    def record_routing_outcome(self, request_id: str, succeeded: bool):
+        """
+        Report whether the decision returned by decide_agent() for a request was carried out
+        successfully. Successful triage decisions are cached for similar prompts; a cached
+        decision that failed is dropped from the cache.
+        
+        Args:
+            request_id: The request_id passed to decide_agent()
+            succeeded: True if the chosen agent(s) completed the task, None if the request was
+                stopped (deadline or cancellation) before that was known
+        """
+        pending = self._pending_routes.pop(request_id, None)
+        if pending is None or succeeded is None:
+            return
+        embedding, decision, source = pending
+        if not decision.startswith(("SINGLE:", "MULTI:")):
+            return
+        # Router decisions are not cached: the router answers them again just as cheaply
+        if succeeded and source == "llm":
+            self.routing_cache.store(embedding, decision)
+        elif not succeeded and source == "cache":
+            print("[DEBUG] Cached routing decision failed; removing it from the routing cache")
+            self.routing_cache.forget(embedding)
+
+    @staticmethod
+    def response_succeeded(response: str) -> bool:
+        """Whether an agent or workflow response completed (failures are returned as error strings)."""
+        if response.startswith(FAILED_RESPONSE_PREFIXES):
+            return False
+        # A workflow step that failed shows up as an error line under its step heading
+        return not any(f"\n{prefix}" in response for prefix in FAILED_RESPONSE_PREFIXES[:2])
+
+    def _build_decision_context(self, user_prompt: str) -> str:
+        """
+        Build the triage agent's history context from the most similar past decisions plus
+        a small recency window, packed greedily (similar first) into DECISION_CONTEXT_TOKENS
+        real tokens, so the prompt stays roughly the same size however much history exists.
+        
+        Args:
+            user_prompt: The request being routed
+            
+        Returns:
+            Context to append to the decision prompt ("" when there is no history)
+        """
+        similar = self.history_manager.search_similar_conversations(
+            user_prompt, n_results=DECISION_SIMILAR_RESULTS, include_text=False)
+        recent = self.history_manager.get_recent_history(limit=DECISION_RECENT_RESULTS, include_text=False)
+        
+        def decision_line(entry, label):
+            preview = entry.get('user_prompt_preview', '')
+            ellipsis = '...' if entry.get('user_prompt_length', 0) > len(preview) else ''
+            return f"- [{label}] \"{preview}{ellipsis}\"\n   → Agent chosen: {entry.get('chosen_agent', 'Unknown')}\n"
+        
+        # Priority order: similar decisions (best match first), then the newest ones not already included
+        candidates = [("similar", decision_line(conv["metadata"], f"similarity {conv['similarity_score']:.2f}"))
+                      for conv in similar]
+        similar_ids = {conv["metadata"]["id"] for conv in similar}
+        candidates += [("recent", decision_line(entry, entry.get('timestamp', 'Unknown')[:19]))
+                       for entry in recent if entry["id"] not in similar_ids]
+        if not candidates:
+            return ""
+        
+        header = ("\n\nRELEVANT PAST DECISIONS FOR REFERENCE:\n"
+                  "Similar past requests and the most recent ones, to help you make consistent decisions:\n\n")
+        footer = ("\nLook for patterns and stay consistent with similar past requests, "
+                  "but adapt based on the specific requirements of the new request.")
+        budget = DECISION_CONTEXT_TOKENS - count_tokens(header) - count_tokens(footer)
+        kept, used = pack_to_budget([line for _, line in candidates], budget)
+        if not kept:
+            return ""
+        
+        sections = {"similar": "Most similar past requests:\n", "recent": "Most recent requests:\n"}
+        context = header
+        for kind, title in sections.items():
+            lines = [candidates[i][1] for i in kept if candidates[i][0] == kind]
+            if lines:
+                context += title + "".join(lines) + "\n"
+        print(f"[DEBUG] Decision context: {len(kept)} of {len(candidates)} past decisions, "
+              f"{used} of {budget} history tokens")
+        return context + footer
+
     def _extract_and_format_content_from_workflow(self, user_prompt: str) -> str:
         """
         Extract and format content from multi-agent workflow for PDF generation.
@@ -653,139 +911,132 @@ class AIWorkforceManager:
         
         return content_instruction
 
-    def format_historical_context(self, chat_history: list, agent_name: str) -> str:
+    def build_agent_context(self, agent_name: str, user_prompt: str) -> str:
         """
-        Format the entire chat history for injection into agent prompts.
+        Build a specialist's history context: past conversations ranked by similarity to the
+        request (the agent's own past work first) and packed into its token budget.
         
         Args:
-            chat_history: List of all past conversations
-            agent_name: Name of the current agent being called
+            agent_name: Name of the agent being called
+            user_prompt: The request it will receive
             
         Returns:
-            Formatted context string for the agent
+            Context string for the agent
         """
-        if not chat_history:
-            return "No chat history available."
-        
-        context_parts = []
-        context_parts.append("=== COMPLETE CHAT HISTORY ===")
-        context_parts.append(f"The following is the complete chat history ({len(chat_history)} conversations) for your reference:")
-        context_parts.append("Use this history to maintain consistency, learn from past interactions, and build upon previous work.")
-        context_parts.append("")
-        
-        # Sort by timestamp (most recent first)
-        sorted_history = sorted(chat_history, key=lambda x: x.get('timestamp', ''), reverse=True)
-        
-        for i, conv in enumerate(sorted_history, 1):
-            timestamp = conv.get('timestamp', 'Unknown')[:19]
-            chosen_agent = conv.get('chosen_agent', 'Unknown')
-            user_prompt = conv.get('user_prompt', '')
-            manager_response = conv.get('manager_response', '')
-            
-            # Limit length for very long conversations to avoid token limits
-            user_prompt_display = user_prompt[:300] + "..." if len(user_prompt) > 300 else user_prompt
-            manager_response_display = manager_response[:400] + "..." if len(manager_response) > 400 else manager_response
-            
-            context_parts.append(f"--- Conversation {i} ---")
-            context_parts.append(f"Date: {timestamp}")
-            context_parts.append(f"Agent Used: {chosen_agent}")
-            context_parts.append(f"User Request: {user_prompt_display}")
-            context_parts.append(f"Response: {manager_response_display}")
-            context_parts.append("")
-        
-        context_parts.append("=== END CHAT HISTORY ===")
-        context_parts.append("")
-        context_parts.append("Please use this complete chat history to inform your response. Maintain consistency with past approaches, learn from previous successes and challenges, and build upon the established context.")
-        context_parts.append("")
-        
-        return "\n".join(context_parts)
+        budget = AGENT_CONTEXT_BUDGETS.get(agent_name, AGENT_CONTEXT_TOKENS)
+        context, stats = build_agent_context(self.history_manager, agent_name, user_prompt, budget,
+                                             min_similarity=AGENT_CONTEXT_MIN_SIMILARITY)
+        print(f"[DEBUG] Context for {agent_name}: {stats['included']} of {stats['candidates']} similar conversations "
+              f"({stats['same_agent']} by this agent), {stats['tokens']} of {budget} tokens")
+        return context or "No relevant chat history available."
 
-    async def orchestrate_multi_agent_workflow(self, workflow_agents, workflow_description, user_prompt):
+    async def orchestrate_multi_agent_workflow(self, workflow_agents, workflow_description, user_prompt,
+                                               bypass_cache=False, on_event=None, deadline=None):
         """
         Orchestrates multiple agents to work together on a complex task.
         
+        Steps run as a dependency graph: each starts as soon as the steps it depends on have
+        finished, independent steps run concurrently, and each agent receives only the outputs
+        of its own dependencies. End-to-end time is therefore bounded by the critical path
+        rather than the sum of all steps.
+        
+        A step whose agent and input are unchanged since a successful earlier run (e.g. when
+        a workflow is retried) reuses that run's output from the step cache.
+        
         Args:
-            workflow_agents: List of agent names in execution order
+            workflow_agents: WorkflowPlan, or a list of agent names to run one after another
             workflow_description: Description of how agents will work together
             user_prompt: Original user request
+            bypass_cache: Re-execute every step and do not read the step cache
+            on_event: Called with ("status", text) as steps start and finish, and with
+                ("delta", text) for the output of a final step that runs alone (the one the
+                report ends with) as it is generated
+            deadline: The request's Deadline. When it passes (or the request is cancelled) running
+                steps are stopped and later ones not started; the report then holds the steps
+                that finished
             
         Returns:
             Final aggregated response from all agents
         """
-        print(f"[DEBUG] Starting multi-agent workflow: {' -> '.join(workflow_agents)}")
-        print(f"[DEBUG] Workflow description: {workflow_description}")
-        
-        # Track all agent outputs
-        agent_outputs = {}
-        cumulative_context = f"ORIGINAL USER REQUEST: {user_prompt}\n\nWORKFLOW PLAN: {workflow_description}\n\n"
-        
         try:
-            for i, agent_name in enumerate(workflow_agents):
+            plan = (workflow_agents if isinstance(workflow_agents, WorkflowPlan)
+                    else WorkflowPlan.sequential(workflow_agents, workflow_description))
+            print(f"[DEBUG] Starting multi-agent workflow: {plan.workflow}")
+            print(f"[DEBUG] Workflow description: {workflow_description}")
+            emit = on_event or (lambda kind, text: None)
+            final_stage = plan.stages()[-1]
+            # Concurrent steps would interleave their text, so only a lone final step streams tokens
+            streamed_step = final_stage[0] if on_event is not None and len(final_stage) == 1 else None
+            deadline = deadline or Deadline()
+            
+            async def run_step(workflow_step, dependency_outputs):
+                agent_name = plan.agents[workflow_step]
                 if agent_name not in self.specialized_agents:
                     error_msg = f"Agent '{agent_name}' not found in available specialists."
                     print(f"❌ {error_msg}")
-                    agent_outputs[agent_name] = f"ERROR: {error_msg}"
-                    continue
-                
-                print(f"[DEBUG] Step {i+1}/{len(workflow_agents)}: Executing {agent_name}...")
+                    return f"ERROR: {error_msg}"
                 
-                # Build context for current agent
-                if i == 0:
-                    # First agent gets the original prompt with workflow context
-                    agent_prompt = f"""You are the first agent in a multi-agent workflow.
-                    
-WORKFLOW OVERVIEW: {workflow_description}
-YOUR ROLE: You are step {i+1} of {len(workflow_agents)} in this workflow.
-NEXT AGENTS: {' -> '.join(workflow_agents[i+1:]) if i+1 < len(workflow_agents) else 'None (you are the final agent)'}
-
-ORIGINAL USER REQUEST: {user_prompt}
-
-Please complete your part of the workflow. Your output will be used by subsequent agents."""
-                else:
-                    # Subsequent agents get context from previous agents
-                    agent_prompt = f"""You are part of a multi-agent workflow.
-                    
-WORKFLOW OVERVIEW: {workflow_description}
-YOUR ROLE: You are step {i+1} of {len(workflow_agents)} in this workflow.
-PREVIOUS AGENTS: {' -> '.join(workflow_agents[:i])}
-NEXT AGENTS: {' -> '.join(workflow_agents[i+1:]) if i+1 < len(workflow_agents) else 'None (you are the final agent)'}
-
-ORIGINAL USER REQUEST: {user_prompt}
-
-PREVIOUS AGENT OUTPUTS:
-{cumulative_context}
-
-Please build upon the previous work and complete your part of the workflow."""
+                step = f"Step {plan.steps.index(workflow_step) + 1}/{len(plan.steps)}"
+                if deadline.expired():
+                    emit("status", f"⏹️ {step}: {agent_name} not started")
+                    return f"ERROR: {agent_name} was not started: {deadline.reason()}"
+                print(f"[DEBUG] {step}: Executing {agent_name}...")
+                emit("status", f"▶️ {step}: {agent_name} started")
+                step_start = time.perf_counter()
+                dependency_outputs = await self._condense_handoffs(agent_name, user_prompt, dependency_outputs)
+                agent_prompt = self._workflow_step_prompt(plan, workflow_step, workflow_description, user_prompt,
+                                                          dependency_outputs)
                 
-                # Execute the agent
+                # Execute the agent (or reuse its output for this exact input)
+                step_key = None
+                cached = None
+                if self.step_cache is not None and agent_name not in UNCACHEABLE_AGENTS:
+                    step_key = content_key(self._agent_keys[agent_name], agent_prompt)
+                    cached = None if bypass_cache else self.step_cache.get(step_key)
+                if cached is not None:
+                    print(f"♻️ {agent_name}: reusing cached output for an unchanged step input")
+                    emit("status", f"♻️ {step}: {agent_name} reused its cached output")
+                    return cached["response"]
+                on_delta = (lambda text: emit("delta", text)) if workflow_step == streamed_step else None
                 try:
-                    agent_response = await self.delegate_task(agent_name, agent_prompt)
-                    agent_outputs[agent_name] = agent_response
-                    
-                    # Add to cumulative context for next agent
-                    cumulative_context += f"\n=== {agent_name.upper()} OUTPUT ===\n{agent_response}\n"
-                    
-                    print(f"✅ {agent_name} completed successfully")
-                    
+                    agent_response = await self.delegate_task(agent_name, agent_prompt, on_delta, deadline)
                 except Exception as e:
-                    error_msg = f"Error executing {agent_name}: {str(e)}"
-                    print(f"❌ {error_msg}")
-                    agent_outputs[agent_name] = f"ERROR: {error_msg}"
-                    # Continue with workflow even if one agent fails
-                    cumulative_context += f"\n=== {agent_name.upper()} OUTPUT (ERROR) ===\nAgent failed with error: {str(e)}\n"
+                    # run_plan records the failure as this step's ERROR: output; the other steps carry on
+                    print(f"❌ Error executing {agent_name}: {str(e)}")
+                    emit("status", f"❌ {step}: {agent_name} failed")
+                    raise
+                if not self.response_succeeded(agent_response):
+                    emit("status", f"❌ {step}: {agent_name} failed")
+                    return agent_response
+                if step_key is not None:
+                    self.step_cache.put(step_key, {"agent": agent_name, "response": agent_response})
+                print(f"✅ {agent_name} completed successfully")
+                emit("status", f"✅ {step}: {agent_name} finished in {time.perf_counter() - step_start:.1f}s")
+                return agent_response
+            
+            start = time.perf_counter()
+            agent_outputs, durations = await run_plan(plan, run_step)
+            elapsed = time.perf_counter() - start
+            critical_path, critical_seconds = plan.critical_path(durations)
             
             # Compile final response
             final_response = f"🤖 **Multi-Agent Workflow Completed**\n\n"
-            final_response += f"**Workflow:** {' → '.join(workflow_agents)}\n"
+            final_response += f"**Workflow:** {plan.workflow.replace('->', '→')}\n"
             final_response += f"**Description:** {workflow_description}\n\n"
             
-            for i, agent_name in enumerate(workflow_agents):
-                final_response += f"## Step {i+1}: {agent_name}\n"
-                final_response += f"{agent_outputs.get(agent_name, 'No output')}\n\n"
+            for i, workflow_step in enumerate(plan.steps):
+                final_response += f"## Step {i+1}: {plan.agents[workflow_step]}\n"
+                final_response += f"{agent_outputs.get(workflow_step, 'No output')}\n\n"
             
-            final_response += "---\n**Workflow Status:** ✅ Complete"
+            if deadline.expired():
+                completed = sum(self.response_succeeded(agent_outputs[workflow_step]) for workflow_step in plan.steps)
+                final_response += (f"---\n**Workflow Status:** ⏱️ Partial ({completed} of {len(plan.steps)} steps "
+                                   f"completed; {deadline.reason()})")
+            else:
+                final_response += "---\n**Workflow Status:** ✅ Complete"
             
-            print(f"[DEBUG] Multi-agent workflow completed successfully")
+            print(f"[DEBUG] Multi-agent workflow completed in {elapsed:.1f}s (critical path "
+                  f"{' -> '.join(critical_path)}: {critical_seconds:.1f}s; sum of steps {sum(durations.values()):.1f}s)")
             return final_response
             
         except Exception as e:
@@ -793,9 +1044,147 @@ Please build upon the previous work and complete your part of the workflow."""
             print(f"❌ {error_msg}")
             return f"❌ Multi-agent workflow failed: {error_msg}"
 
-    async def delegate_task(self, agent_name, user_prompt):
+    async def _condense_handoffs(self, agent_name, user_prompt, dependency_outputs):
+        """
+        Condense the outputs a workflow step receives to HANDOFF_CONTEXT_TOKENS, so prompt size
+        stays bounded however long earlier steps wrote. The budget is shared by the step's
+        dependencies (room left by short outputs goes to the longer ones), and each long output
+        keeps its sentences most relevant to the request and this agent's role.
+        
+        Args:
+            agent_name: The receiving agent
+            user_prompt: Original user request
+            dependency_outputs: Full outputs of the steps it depends on
+            
+        Returns:
+            Outputs to forward, by dependency
+        """
+        if not dependency_outputs or HANDOFF_CONTEXT_TOKENS <= 0 or agent_name in FULL_HANDOFF_AGENTS:
+            return dependency_outputs
+        query = f"{user_prompt}\n{self.specialized_agents[agent_name].handoff_description}"
+        sizes = {dependency: count_tokens(output) for dependency, output in dependency_outputs.items()}
+        remaining = HANDOFF_CONTEXT_TOKENS
+        condensed = {}
+        for position, dependency in enumerate(sorted(sizes, key=sizes.get)):
+            budget = remaining // (len(sizes) - position)
+            output = dependency_outputs[dependency]
+            if sizes[dependency] > budget:
+                try:
+                    text, before, after = await asyncio.to_thread(
+                        compress_output, output, query, budget, self.history_manager.encode_texts)
+                    print(f"[DEBUG] Handoff {dependency} -> {agent_name}: condensed {before} to {after} tokens")
+                    output = (f"{text}\n[Condensed from {before} to {after} tokens; "
+                              f"the full output is in the final report]")
+                except Exception as e:
+                    print(f"⚠️ Warning: Could not condense {dependency} output, forwarding it whole: {e}")
+            remaining -= min(sizes[dependency], budget)
+            condensed[dependency] = output
+        return {dependency: condensed[dependency] for dependency in dependency_outputs}
+
+    def _workflow_step_prompt(self, plan, workflow_step, workflow_description, user_prompt, dependency_outputs):
+        """
+        Build the prompt for one workflow step: the workflow overview, the step's place in
+        the graph and the outputs of the steps it depends on (and nothing else).
+        """
+        step = plan.steps.index(workflow_step) + 1
+        dependents = plan.dependents[workflow_step]
+        parallel = [other for other in plan.stages()[plan.levels[workflow_step]] if other != workflow_step]
+        next_agents = ', '.join(dependents) if dependents else 'None (you are a final agent)'
+        if not dependency_outputs:
+            # Steps without dependencies get the original prompt with workflow context
+            return f"""You are {'the first agent' if len(plan.stages()[0]) == 1 else 'one of the first agents'} in a multi-agent workflow.
+                    
+WORKFLOW OVERVIEW: {workflow_description}
+WORKFLOW: {plan.workflow}
+YOUR ROLE: You are step {step} of {len(plan.steps)} in this workflow.
+RUNNING IN PARALLEL: {', '.join(parallel) if parallel else 'None'}
+NEXT AGENTS: {next_agents}
+
+ORIGINAL USER REQUEST: {user_prompt}
+
+Please complete your part of the workflow. Your output will be used by subsequent agents."""
+        
+        previous_outputs = f"ORIGINAL USER REQUEST: {user_prompt}\n\nWORKFLOW PLAN: {workflow_description}\n\n"
+        for dependency, output in dependency_outputs.items():
+            previous_outputs += f"\n=== {dependency.upper()} OUTPUT ===\n{output}\n"
+        return f"""You are part of a multi-agent workflow.
+                    
+WORKFLOW OVERVIEW: {workflow_description}
+WORKFLOW: {plan.workflow}
+YOUR ROLE: You are step {step} of {len(plan.steps)} in this workflow.
+PREVIOUS AGENTS: {', '.join(dependency_outputs)}
+RUNNING IN PARALLEL: {', '.join(parallel) if parallel else 'None'}
+NEXT AGENTS: {next_agents}
+
+ORIGINAL USER REQUEST: {user_prompt}
+
+PREVIOUS AGENT OUTPUTS:
+{previous_outputs}
+
+Please build upon the previous work and complete your part of the workflow."""
+
+    async def _run_agent(self, agent, prompt, on_delta=None, deadline=None):
+        """
+        Run an agent and return its final output. Every LLM call goes through here, so the
+        scheduler admits it only when a slot and the per-minute budgets allow (queueing
+        otherwise) and afterwards reconciles its token reservation with the actual usage.
+        Transient failures are retried, HEDGED_AGENTS are hedged, and an agent whose circuit
+        is open fails at once instead of waiting on a failing provider. Each attempt is
+        limited to the agent's timeout (AGENT_TIMEOUTS) and the whole call to the deadline.
+        
+        Args:
+            agent: The agent to run
+            prompt: Its input
+            on_delta: Called with each fragment of output text as the model generates it; the
+                agent then runs through the SDK's streaming runner
+            deadline: The request's Deadline; the call is interrupted when it passes or the
+                request is cancelled (raising DeadlineExceeded)
+        """
+        prompt_tokens = count_tokens(prompt)
+        deadline = deadline or Deadline()
+        timeout = AGENT_TIMEOUTS.get(agent.name, AGENT_TIMEOUT_SECONDS) or None
+        streamed = False
+        
+        async def run_once():
+            nonlocal streamed
+            async with self.llm_scheduler.reserve(agent.name, prompt_tokens) as reservation:
+                if on_delta is None:
+                    result = await Runner.run(agent, prompt)
+                else:
+                    result = Runner.run_streamed(agent, prompt)
+                    async for event in result.stream_events():
+                        if event.type == "raw_response_event" and getattr(event.data, "type", None) == "response.output_text.delta":
+                            streamed = True
+                            on_delta(event.data.delta)
+                reservation.settle(*self._token_usage(result, prompt_tokens))
+            return result.final_output
+        
+        async def attempt():
+            return await deadline.run(run_once(), timeout)
+        
+        # Output already shown to the user cannot be taken back, so a stream is only retried before its first delta
+        return await self.resilience.call(agent.name, attempt,
+                                          hedge=LLM_HEDGING and on_delta is None and agent.name in HEDGED_AGENTS,
+                                          can_retry=lambda: not streamed, deadline=deadline)
+
+    @staticmethod
+    def _token_usage(result, prompt_tokens):
+        """(total, output) tokens of a run: the SDK's usage when reported, else counted locally."""
+        usage = getattr(getattr(result, "context_wrapper", None), "usage", None)
+        if usage is not None and getattr(usage, "total_tokens", 0):
+            return usage.total_tokens, usage.output_tokens
+        output_tokens = count_tokens(str(result.final_output or ""))
+        return prompt_tokens + output_tokens, output_tokens
+
+    async def delegate_task(self, agent_name, user_prompt, on_delta=None, deadline=None):
         """
         Delegates the task to the chosen specialist agent with complete chat history.
+        
+        Args:
+            agent_name: The specialist to run
+            user_prompt: The task
+            on_delta: Receives the agent's output text as it is generated (see _run_agent)
+            deadline: The request's Deadline (see _run_agent)
         """
         if agent_name not in self.specialized_agents:
             error_message = f"Agent '{agent_name}' not found in available specialists."
@@ -831,10 +1220,8 @@ Please build upon the previous work and complete your part of the workflow."""
                     
                     # Step 2: Generate content from the cleaned request using Content Writer agent
                     content_writer_agent = self.specialized_agents["Content Writer"]
-                    generated_result = await Runner.run(content_writer_agent, content_prompt)
-
-                    # Extract the generated content as a string
-                    generated_content = generated_result.final_output.strip()
+                    generated_content = (await self._run_agent(content_writer_agent, content_prompt, on_delta,
+                                                                 deadline)).strip()
 
                     # Step 3: Format and use the generated content to create the PDF
                     formatted_content = self._format_content_for_pdf(generated_content, "Generated Content")
@@ -844,40 +1231,26 @@ Please build upon the previous work and complete your part of the workflow."""
                 return pdf_result
 
             # Regular handling for other agents
-            # Retrieve the entire chat history from vector database
-            print(f"[DEBUG] Retrieving complete chat history for {agent_name}...")
-            chat_history = self.history_manager.get_recent_history(limit=50)  # Get last 50 conversations
-            
-            # Format the complete chat history
-            historical_context = self.format_historical_context(chat_history, agent_name)
+            # Retrieve the past conversations most relevant to this request from the vector database
+            print(f"[DEBUG] Retrieving relevant chat history for {agent_name}...")
+            historical_context = self.build_agent_context(agent_name, user_prompt)
             
-            # Create enhanced prompt with complete chat history
+            # Create enhanced prompt with the relevant chat history
             enhanced_prompt = f"""{historical_context}
 
 === CURRENT REQUEST ===
 {user_prompt}
 
-Please respond to the current request above, taking into account the complete chat history provided. Maintain consistency with past approaches, learn from previous interactions, and build upon the established context and relationships."""
+Please respond to the current request above, taking into account the relevant chat history provided. Maintain consistency with past approaches, learn from previous interactions, and build upon the established context and relationships."""
 
             specialist_agent = self.specialized_agents[agent_name]
-            print(f"[DEBUG] Delegating task to {agent_name} with complete chat history...")
-            
-            # Log the context retrieval
-            if chat_history:
-                print(f"[DEBUG] Providing {len(chat_history)} conversations from vector database")
-                # Show breakdown by agent
-                agent_counts = {}
-                for conv in chat_history:
-                    agent = conv.get('chosen_agent', 'Unknown')
-                    agent_counts[agent] = agent_counts.get(agent, 0) + 1
-                print(f"[DEBUG] History breakdown by agent: {agent_counts}")
-            else:
-                print(f"[DEBUG] No chat history available in vector database")
+            print(f"[DEBUG] Delegating task to {agent_name} with relevant chat history...")
+            # Show breakdown by agent (read from the store's rollups instead of recounting)
+            print(f"[DEBUG] History breakdown by agent: {self.history_manager.get_agent_counts()}")
             
-            result = await Runner.run(specialist_agent, enhanced_prompt)
-            agent_response = result.final_output
+            agent_response = await self._run_agent(specialist_agent, enhanced_prompt, on_delta, deadline)
             
-            print(f"[DEBUG] {agent_name} completed the task with complete chat history context from vector database.")
+            print(f"[DEBUG] {agent_name} completed the task with relevant chat history context from vector database.")
             return agent_response
             
         except Exception as e:
@@ -918,13 +1291,20 @@ Please respond to the current request above, taking into account the complete ch
                     description_line = line[9:].strip()
             
             if workflow_line:
-                # Parse agent sequence: "Agent1 -> Agent2 -> Agent3"
-                agents = [agent.strip() for agent in workflow_line.split("->")]
+                # Parse the agent graph: "Agent1 -> Agent2 -> Agent3", with "Agent1 & Agent2" for parallel steps
+                try:
+                    plan = WorkflowPlan.parse(workflow_line, description_line or "Multi-agent workflow")
+                except ValueError as e:
+                    return {
+                        "type": "error",
+                        "message": f"Invalid MULTI format - {e}"
+                    }
                 return {
                     "type": "multi",
-                    "agents": agents,
-                    "workflow": workflow_line,
-                    "description": description_line or "Multi-agent workflow"
+                    "agents": [plan.agents[step] for step in plan.steps],
+                    "workflow": plan.workflow,
+                    "plan": plan,
+                    "description": plan.description
                 }
             else:
                 return {
@@ -954,15 +1334,48 @@ Please respond to the current request above, taking into account the complete ch
                     "message": f"Unrecognized decision format: {decision_response}"
                 }
 
-    async def handle_prompt(self, user_prompt):
+    async def handle_prompt(self, user_prompt, bypass_cache=False, on_event=None, deadline=None):
+        """
+        Route a request, run it and log it. An identical earlier request (ignoring case and
+        whitespace) that succeeded is answered from the request cache instead.
+        
+        Args:
+            user_prompt: The user's request
+            bypass_cache: Run the full pipeline and do not read the result caches
+            on_event: Called with ("status", text) as the request progresses and ("delta", text)
+                as agent output is generated (see stream_prompt)
+            deadline: Deadline for the whole request (default REQUEST_TIMEOUT_SECONDS from now),
+                passed down to triage, the agents and every workflow step. Whatever finished
+                before it passed is still returned and logged
+            
+        Returns:
+            The response shown to the user
+        """
+        emit = on_event or (lambda kind, text: None)
+        deadline = deadline or Deadline(REQUEST_TIMEOUT_SECONDS)
         manager_response = ""
         chosen_agent_log = None
         workflow_log = None
+        routed = False
+        agents_used = []
+        request_key = None
+        # Also the id of the history entry; concurrent identical prompts keep separate routing outcomes
+        entry_id = str(uuid.uuid4())
+        if self.request_cache is not None:
+            request_key = content_key(self._roster_key, normalize_prompt(user_prompt))
+            cached = None if bypass_cache else self.request_cache.get(request_key)
+            if cached is not None:
+                print("♻️ AI Workforce Manager: Answering from the result cache (identical earlier request)")
+                print(f"\n{cached['manager_response']}")
+                emit("status", "♻️ Answered from the result cache (identical earlier request)")
+                self.history_manager.add_entry(user_prompt, cached["manager_response"], cached["chosen_agent"], None)
+                return cached["manager_response"]
 
         try:
             # 1. Get the decision from the triage agent
             print(f"🤖 AI Workforce Manager: Analyzing request and determining optimal approach...")
-            decision_response = await self.decide_agent(user_prompt)
+            emit("status", "🤖 Analyzing request...")
+            decision_response = await self.decide_agent(user_prompt, deadline, entry_id)
 
             # 2. Parse the decision
             parsed_decision = self.parse_decision_response(decision_response)
@@ -977,21 +1390,37 @@ Please respond to the current request above, taking into account the complete ch
                 else:
                     chosen_agent_log = agent_name
                     print(f"AI Workforce Manager: 🎯 Assigning task to {agent_name}")
+                    emit("status", f"🎯 **Assigning to {agent_name}...**")
+                    
+                    streamed = []
                     
-                    agent_response = await self.delegate_task(agent_name, user_prompt)
+                    def on_delta(text):
+                        streamed.append(text)
+                        emit("delta", text)
+                    
+                    agent_response = await self.delegate_task(agent_name, user_prompt,
+                                                              on_delta if on_event is not None else None, deadline)
                     manager_response = agent_response  # Just return the agent response, no wrapper
+                    if streamed and not self.response_succeeded(agent_response):
+                        # Stopped mid-answer: keep what was already generated, followed by the error
+                        manager_response = f"{''.join(streamed)}\n\n{agent_response}"
+                    agents_used = [agent_name]
+                    routed = self.response_succeeded(agent_response)
                     print(f"\n✅ Task completed by {agent_name}")
-                    print(f"\n{agent_response}")
+                    # Streamed text was shown as it arrived (a PDF Producer streams its content, not its result)
+                    if agent_response != "".join(streamed):
+                        print(f"\n{agent_response}")
             
             elif parsed_decision["type"] == "multi":
                 # Multi-agent workflow execution
                 agents = parsed_decision["agents"]
                 workflow_description = parsed_decision["description"]
-                workflow_log = f"Multi-agent workflow: {' -> '.join(agents)}"
+                workflow_log = f"Multi-agent workflow: {parsed_decision['workflow']}"
                 
                 print(f"AI Workforce Manager: 🔄 Initiating multi-agent workflow")
-                print(f"📋 Workflow: {' → '.join(agents)}")
+                print(f"📋 Workflow: {parsed_decision['workflow'].replace('->', '→')}")
                 print(f"📝 Plan: {workflow_description}")
+                emit("status", f"🔄 **Initiating Multi-Agent Workflow:** {parsed_decision['workflow'].replace('->', '→')}")
                 
                 # Validate all agents exist
                 invalid_agents = [agent for agent in agents if agent not in self.specialized_agents]
@@ -1000,8 +1429,10 @@ Please respond to the current request above, taking into account the complete ch
                     print(f"AI Workforce Manager: {manager_response}")
                 else:
                     manager_response = await self.orchestrate_multi_agent_workflow(
-                        agents, workflow_description, user_prompt
+                        parsed_decision["plan"], workflow_description, user_prompt, bypass_cache, on_event, deadline
                     )
+                    routed = self.response_succeeded(manager_response)
+                    agents_used = agents
                     print(f"\n✅ Multi-agent workflow completed")
                     print(f"\n{manager_response}")
             
@@ -1017,22 +1448,87 @@ Please respond to the current request above, taking into account the complete ch
                 manager_response = f"❌ Decision parsing error: {error_msg}"
                 print(f"AI Workforce Manager: {manager_response}")
 
+            # A request cut short by its deadline says nothing about whether the route was right
+            self.record_routing_outcome(entry_id, routed if routed or not deadline.expired() else None)
+            
             # 4. Log the interaction to vector database
             agent_for_log = chosen_agent_log or workflow_log or "None"
-            self.history_manager.add_entry(user_prompt, manager_response, agent_for_log, None)
+            self.history_manager.add_entry(user_prompt, manager_response, agent_for_log, None, entry_id)
+            
+            if request_key is not None and routed and not UNCACHEABLE_AGENTS.intersection(agents_used):
+                self.request_cache.put(request_key, {"manager_response": manager_response,
+                                                     "chosen_agent": agent_for_log})
             
         except Exception as e:
             error_message = f"❌ Error processing request: {str(e)}"
             print(f"AI Workforce Manager: {error_message}")
             manager_response = error_message
+            self.record_routing_outcome(entry_id, False)
             
             # Still try to log the error
             try:
                 self.history_manager.add_entry(user_prompt, error_message, None, None)
             except:
                 print("❌ Failed to log error to vector database")
+        
+        return manager_response
+
+    async def stream_prompt(self, user_prompt, bypass_cache=False):
+        """
+        Handle a request (see handle_prompt), yielding its progress while it runs so the
+        caller can show something within moments instead of after the last agent finishes.
+        
+        Args:
+            user_prompt: The user's request
+            bypass_cache: Run the full pipeline and do not read the result caches
+            
+        Yields:
+            (kind, text): "status" for progress (routing, assignment, workflow steps), "delta"
+            for a fragment of agent output as it is generated, and finally one "final" with
+            the complete response (which may differ from the deltas, e.g. a workflow report)
+        """
+        events = asyncio.Queue()
+        deadline = Deadline(REQUEST_TIMEOUT_SECONDS)
+        task = asyncio.ensure_future(self.handle_prompt(
+            user_prompt, bypass_cache, on_event=lambda kind, text: events.put_nowait((kind, text)), deadline=deadline))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            yield "final", await task
+        finally:
+            # The consumer went away (e.g. the browser tab closed): stop the agents, and let the
+            # request log whatever it had finished
+            if not task.done():
+                deadline.cancel()
+                await task
+
+    async def _answer(self, user_prompt, bypass_cache=False):
+        """Handle a prompt from the command line, printing agent output as it streams in."""
+        if not STREAM_OUTPUT:
+            await self.handle_prompt(user_prompt, bypass_cache)
+            return
+        streaming = False
+        async for kind, text in self.stream_prompt(user_prompt, bypass_cache):
+            # Status updates and the final response are printed by handle_prompt itself
+            if kind == "delta":
+                if not streaming:
+                    print()
+                    streaming = True
+                print(text, end="", flush=True)
 
     async def run(self):
+        try:
+            await self._run_loop()
+        finally:
+            if self.routing_cache is not None:
+                self.routing_cache.save()
+            # Drain entries still waiting for a group commit
+            print("💾 Flushing chat history to disk...")
+            self.history_manager.close()
+
+    async def _run_loop(self):
+        history_cursor, history_offset = None, 0
         while True:
             try:
                 user_input = input("\nUser Prompt: ").strip()
@@ -1061,20 +1557,68 @@ Please respond to the current request above, taking into account the complete ch
                         print("Please provide a search query. Example: search web scraping")
                     continue
                 
-                elif user_input.lower() == 'history':
+                elif user_input.lower() in ('history', 'history more'):
+                    if user_input.lower() == 'history':
+                        history_cursor, history_offset = None, 0
+                    elif history_cursor is None:
+                        print("No more conversation history. Enter 'history' to start from the most recent.")
+                        continue
                     print("📚 Recent conversation history from vector database:")
-                    recent = self.history_manager.get_recent_history(limit=10)
-                    if recent:
-                        for i, entry in enumerate(recent, 1):
+                    page = self.history_manager.get_history_page(page_size=10, after_id=history_cursor)
+                    if page["entries"]:
+                        for i, entry in enumerate(page["entries"], history_offset + 1):
                             print(f"\n{i}. {entry['timestamp'][:19]}")
-                            print(f"   User: {entry['user_prompt'][:60]}...")
+                            print(f"   User: {entry['user_prompt_preview'][:60]}...")
                             print(f"   Agent: {entry['chosen_agent']}")
+                        history_cursor = page["next_cursor"]
+                        history_offset += len(page["entries"])
+                        if page["has_more"]:
+                            print("\n--- Enter 'history more' to see older conversations ---")
                     else:
                         print("No conversation history found in vector database.")
                     continue
                 
-                # Handle regular prompts
-                await self.handle_prompt(user_input)
+                elif user_input.lower() == 'usage':
+                    rollups = self.history_manager.get_rollups(days=7)
+                    print(f"📈 Agent usage across {rollups['total_conversations']} conversations:")
+                    for agent, totals in sorted(rollups["agents"].items(), key=lambda item: -item[1]["conversations"]):
+                        print(f"   {agent}: {totals['conversations']} "
+                              f"(avg response {totals['avg_response_length']:.0f} chars)")
+                    print(f"   Workflow types: {rollups['workflows']}")
+                    for day, agents in rollups["days"].items():
+                        print(f"   {day}: {sum(agents.values())} conversations")
+                    if self.routing_cache is not None:
+                        cache = self.routing_cache.stats()
+                        hit_rate = f"{cache['hit_rate']:.0%}" if cache["hit_rate"] is not None else "n/a"
+                        print(f"🧭 Routing cache: {cache['hits']} hits / {cache['misses']} misses "
+                              f"(hit rate {hit_rate}), {cache['entries']} cached decisions")
+                    if self.router is not None:
+                        router = self.router.stats()
+                        print(f"🧭 Learned router: {router['routed']} routed locally, {router['fallback']} sent to "
+                              f"the triage LLM (p95 {router['latency_ms']['p95'] or 0:.1f} ms)")
+                    if self.request_cache is not None:
+                        for label, cache in (("requests", self.request_cache), ("workflow steps", self.step_cache)):
+                            cache = cache.stats()
+                            print(f"♻️ Result cache ({label}): {cache['hits']} hits / {cache['misses']} misses, "
+                                  f"{cache['entries']} entries, {cache['bytes'] / 1e6:.1f} MB")
+                    scheduler = self.llm_scheduler.stats()
+                    print(f"🚦 LLM scheduler: {scheduler['admitted']} calls, {scheduler['queued']} queued "
+                          f"(p95 wait {scheduler['queue_wait_ms']['p95'] or 0:.0f} ms), {scheduler['timeouts']} timed out, "
+                          f"peak {scheduler['peak_in_flight']} in flight, {scheduler['used_tokens']} tokens used")
+                    resilience = self.resilience.stats()
+                    print(f"🛡️ LLM resilience: {resilience['retries']} retries, {resilience['hedges']} hedges "
+                          f"({resilience['hedge_wins']} won), {resilience['failures']} failed calls, "
+                          f"{resilience['rejected']} rejected by open circuits")
+                    if resilience["open_circuits"]:
+                        print(f"   ⚠️ Open circuits: {', '.join(resilience['open_circuits'])}")
+                    continue
+                
+                # Handle regular prompts ('fresh ' re-runs the whole pipeline, skipping cached results)
+                if user_input.lower().startswith('fresh ') and user_input[6:].strip():
+                    await self._answer(user_input[6:].strip(), bypass_cache=True)
+                    print("----")
+                    continue
+                await self._answer(user_input)
                 print("----")
                 
             except KeyboardInterrupt:
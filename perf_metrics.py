@@ -0,0 +1,108 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+
+class LatencyHistogram:
+    """
+    Fixed-memory latency histogram with geometric buckets.
+
+    Recording is O(1) and memory does not grow with the number of samples, so it can
+    stay attached to hot paths for the lifetime of the process. Percentiles are
+    accurate to one bucket width (~10%).
+    """
+
+    def __init__(self, min_ms: float = 0.001, max_ms: float = 120000.0, growth: float = 1.1):
+        """
+        Args:
+            min_ms: Upper bound of the first bucket
+            max_ms: Values above this land in the overflow bucket
+            growth: Ratio between consecutive bucket bounds
+        """
+        self._min_ms = min_ms
+        self._log_growth = math.log(growth)
+        bucket_count = int(math.ceil(math.log(max_ms / min_ms) / self._log_growth)) + 1
+        self._bounds = [min_ms * growth ** i for i in range(bucket_count)]
+        self._counts = [0] * (bucket_count + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, value_ms: float):
+        """Add one latency sample in milliseconds."""
+        if value_ms <= self._min_ms:
+            index = 0
+        else:
+            index = min(int(math.ceil(math.log(value_ms / self._min_ms) / self._log_growth)), len(self._bounds))
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total_ms += value_ms
+            if value_ms > self.max_ms:
+                self.max_ms = value_ms
+
+    @contextmanager
+    def time(self):
+        """Context manager that records the duration of its block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record((time.perf_counter() - start) * 1000)
+
+    def percentile(self, pct: float) -> float:
+        """Return the upper bound of the bucket holding the given percentile (0-100)."""
+        with self._lock:
+            if self.count == 0:
+                return None
+            target = max(1, int(math.ceil(self.count * pct / 100.0)))
+            seen = 0
+            for index, bucket_count in enumerate(self._counts):
+                seen += bucket_count
+                if seen >= target:
+                    if index >= len(self._bounds):
+                        return self.max_ms
+                    return min(self._bounds[index], self.max_ms)
+            return self.max_ms
+
+    def summary(self) -> Dict:
+        """Count, mean, p50/p95/p99 and max in milliseconds."""
+        if self.count == 0:
+            return {"count": 0, "avg": None, "p50": None, "p95": None, "p99": None, "max": None}
+        return {
+            "count": self.count,
+            "avg": round(self.total_ms / self.count, 4),
+            "p50": round(self.percentile(50), 4),
+            "p95": round(self.percentile(95), 4),
+            "p99": round(self.percentile(99), 4),
+            "max": round(self.max_ms, 4)
+        }
+
+
+class HitRateCounter:
+    """Hit/miss counter for a cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def summary(self) -> Dict:
+        """Hits, misses and hit rate (None before the first lookup)."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
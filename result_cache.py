@@ -0,0 +1,162 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from perf_metrics import HitRateCounter
+
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case- and whitespace-insensitive form of a prompt, so trivially different retries share a key."""
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+
+def content_key(*parts: str) -> str:
+    """Content address of a sequence of strings (SHA-256, parts separated so they cannot run together)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Size-bounded, content-addressed disk cache of finished results.
+
+    Each value is a small JSON document stored under the SHA-256 key of its inputs
+    (content_key()), fanned out into 256 subdirectories. Entries older than `ttl_seconds`
+    are treated as missing and removed when next looked up; once the files exceed
+    `max_bytes` the least recently used are deleted. The index (key -> size, creation time)
+    is rebuilt from file metadata on startup, without reading the files. Safe for
+    concurrent use within one process.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory: Where the cache files live (created if missing)
+            ttl_seconds: Age after which an entry is no longer served
+            max_bytes: Total file size kept before least recently used entries are evicted
+        """
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = HitRateCounter()
+        self.counters = {"stored": 0, "expired": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        # key -> (bytes, created), least recently used first
+        self._index: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+        except Exception as e:
+            raise RuntimeError(f"Failed to open result cache {directory}: {e}")
+
+    def _scan(self):
+        """Rebuild the index from the files on disk (oldest first, so they are evicted first)."""
+        found = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        for created, key, size in sorted(found):
+            self._index[key] = (size, created)
+            self._bytes += size
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def _remove(self, key: str):
+        """Drop an entry from the index and disk. Call under the lock."""
+        size, _ = self._index.pop(key)
+        self._bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._index:
+            self._remove(next(iter(self._index)))
+            self.counters["evicted"] += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a result.
+
+        Args:
+            key: content_key() of the inputs
+
+        Returns:
+            The stored value, or None when missing or expired
+        """
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None and entry[1] < time.time() - self.ttl_seconds:
+                self._remove(key)
+                self.counters["expired"] += 1
+                entry = None
+            if entry is None:
+                self.hits.miss()
+                return None
+            self._index.move_to_end(key)
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            # Removed or damaged behind our back; treat as a miss
+            with self._lock:
+                if key in self._index:
+                    self._remove(key)
+            self.hits.miss()
+            return None
+        self.hits.hit()
+        return value
+
+    def put(self, key: str, value: Dict):
+        """Store a result (JSON-serializable dict) under its key, evicting old entries past max_bytes."""
+        path = self._path(key)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠️ Warning: Could not write result cache entry: {e}")
+            return
+        with self._lock:
+            if key in self._index:
+                self._bytes -= self._index.pop(key)[0]
+            self._index[key] = (len(data), time.time())
+            self._bytes += len(data)
+            self.counters["stored"] += 1
+            self._evict()
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+
+    def stats(self) -> Dict:
+        """Hit rate, entries and bytes on disk."""
+        with self._lock:
+            return {"entries": len(self._index), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "ttl_seconds": self.ttl_seconds, **self.hits.summary(), **self.counters}
@@ -0,0 +1,225 @@
+import os
+import time
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from perf_metrics import HitRateCounter
+
+# Cosine similarity a new prompt needs to a cached one to reuse its decision
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 2000
+# Minimum seconds between automatic saves (close() always saves)
+SAVE_INTERVAL_SECONDS = 60
+
+
+def roster_fingerprint(agents: Dict, *extra: str) -> str:
+    """
+    Hash the agent roster the triage agent routes over.
+
+    Covers each agent's name, handoff description and instructions, plus any extra strings
+    (triage instructions, encoder identity), so editing create_specialized_agents() or
+    switching the embedding space yields a different fingerprint.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(agents):
+        agent = agents[name]
+        for part in (name, getattr(agent, "handoff_description", None) or "", str(getattr(agent, "instructions", ""))):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+    for part in extra:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class RoutingCache:
+    """
+    Semantic cache of triage decisions.
+
+    Maps prompt embeddings to the SINGLE:/MULTI: decision the triage agent returned for them.
+    A new prompt whose cosine similarity to a cached prompt reaches `threshold` reuses that
+    decision instead of another triage LLM round trip. Entries expire after `ttl_seconds`;
+    the oldest entry is evicted once `max_entries` are cached. The cache is tied to a roster
+    fingerprint: a file saved under a different fingerprint is discarded on load.
+
+    Only decisions whose execution succeeded should be stored; callers report failures of
+    cached decisions through forget(). Safe for concurrent use.
+    """
+
+    def __init__(self, fingerprint: str, path: str = None, threshold: float = DEFAULT_THRESHOLD,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            fingerprint: roster_fingerprint() of the current agents
+            path: .npz file the cache persists to across restarts (None keeps it in memory)
+            threshold: Minimum cosine similarity for a hit
+            ttl_seconds: Age after which an entry is no longer used
+            max_entries: Entries kept before the oldest is evicted
+        """
+        self.fingerprint = fingerprint
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = HitRateCounter()
+        self.counters = {"stored": 0, "expired": 0, "evicted": 0, "forgotten": 0, "invalidated": 0}
+        self._lock = threading.Lock()
+        self._embeddings = None  # (max_entries, dim) unit vectors, allocated on first store
+        self._decisions = [None] * max_entries
+        self._created = np.full(max_entries, -np.inf)  # -inf marks a free slot
+        self._last_save = time.time()
+        self._dirty = False
+        if path:
+            self._load()
+
+    def _load(self):
+        """Load the persisted cache, discarding it if the roster has changed since it was saved."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data["fingerprint"]) != self.fingerprint:
+                    self.counters["invalidated"] += 1
+                    print("🔄 Agent roster changed; discarding the routing cache")
+                    return
+                embeddings, decisions, created = data["embeddings"], data["decisions"], data["created"]
+            rows = min(len(decisions), self.max_entries)
+            if rows:
+                self._embeddings = np.zeros((self.max_entries, embeddings.shape[1]), dtype=np.float32)
+                self._embeddings[:rows] = embeddings[-rows:]
+                self._decisions[:rows] = [str(decision) for decision in decisions[-rows:]]
+                self._created[:rows] = created[-rows:]
+        except Exception as e:
+            print(f"⚠️ Warning: Could not load routing cache {self.path}: {e}")
+
+    def save(self):
+        """Write the live entries to `path` (atomically; no-op without a path or changes)."""
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            live = np.flatnonzero(self._created > -np.inf)
+            dim = self._embeddings.shape[1] if self._embeddings is not None else 0
+            embeddings = self._embeddings[live] if dim else np.zeros((0, 0), dtype=np.float32)
+            decisions = np.array([self._decisions[i] for i in live], dtype=str)
+            created = self._created[live]
+            self._dirty = False
+            self._last_save = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "wb") as f:
+                np.savez(f, fingerprint=np.array(self.fingerprint), embeddings=embeddings,
+                         decisions=decisions, created=created)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Warning: Could not save routing cache {self.path}: {e}")
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> Optional[np.ndarray]:
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else None
+
+    def _match(self, query: np.ndarray, now: float) -> Tuple[int, float]:
+        """Best live slot for a unit query vector (-1 when none reaches the threshold). Call under the lock."""
+        if self._embeddings is None or self._embeddings.shape[1] != len(query):
+            return -1, 0.0
+        expired = (self._created > -np.inf) & (self._created < now - self.ttl_seconds)
+        if expired.any():
+            self.counters["expired"] += int(expired.sum())
+            for slot in np.flatnonzero(expired):
+                self._decisions[slot] = None
+            self._created[expired] = -np.inf
+            self._dirty = True
+        similarities = self._embeddings @ query
+        similarities[self._created == -np.inf] = -np.inf
+        best = int(np.argmax(similarities))
+        score = float(similarities[best])
+        return (best, score) if score >= self.threshold else (-1, score)
+
+    def lookup(self, embedding: np.ndarray) -> Optional[Tuple[str, float]]:
+        """
+        Find a cached decision for a prompt.
+
+        Args:
+            embedding: The prompt's embedding
+
+        Returns:
+            (decision, similarity) of the closest live entry at or above the threshold, else None
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            slot, score = self._match(query, time.time()) if query is not None else (-1, 0.0)
+            if slot < 0:
+                self.hits.miss()
+                return None
+            self.hits.hit()
+            return self._decisions[slot], score
+
+    def store(self, embedding: np.ndarray, decision: str):
+        """
+        Cache a decision that was executed successfully.
+
+        A near-duplicate already cached (at or above the threshold) is replaced, so repeated
+        prompts do not fill the cache with copies.
+        """
+        query = self._normalize(embedding)
+        if query is None:
+            return
+        now = time.time()
+        with self._lock:
+            if self._embeddings is None or self._embeddings.shape[1] != len(query):
+                # First entry, or the embedding space changed under us
+                self._embeddings = np.zeros((self.max_entries, len(query)), dtype=np.float32)
+                self._decisions = [None] * self.max_entries
+                self._created[:] = -np.inf
+            slot, _ = self._match(query, now)
+            if slot < 0:
+                slot = int(np.argmin(self._created))
+                if self._created[slot] > -np.inf:
+                    self.counters["evicted"] += 1
+            self._embeddings[slot] = query
+            self._decisions[slot] = decision
+            self._created[slot] = now
+            self.counters["stored"] += 1
+            self._dirty = True
+            save_due = self.path and now - self._last_save >= SAVE_INTERVAL_SECONDS
+        if save_due:
+            self.save()
+
+    def forget(self, embedding: np.ndarray):
+        """Drop the cached decisions that matched a prompt (e.g. after a cached decision failed)."""
+        query = self._normalize(embedding)
+        if query is None:
+            return
+        with self._lock:
+            if self._embeddings is None or self._embeddings.shape[1] != len(query):
+                return
+            matches = (self._embeddings @ query >= self.threshold) & (self._created > -np.inf)
+            for slot in np.flatnonzero(matches):
+                self._decisions[slot] = None
+            self._created[matches] = -np.inf
+            self.counters["forgotten"] += int(matches.sum())
+            self._dirty = self._dirty or bool(matches.any())
+
+    def invalidate(self, fingerprint: str = None):
+        """Empty the cache (e.g. when the roster changes at runtime) and adopt a new fingerprint."""
+        with self._lock:
+            if fingerprint is not None:
+                self.fingerprint = fingerprint
+            self._decisions = [None] * self.max_entries
+            self._created[:] = -np.inf
+            self.counters["invalidated"] += 1
+            self._dirty = True
+
+    def stats(self) -> Dict:
+        """Hit-rate and size metrics."""
+        with self._lock:
+            entries = int((self._created > -np.inf).sum())
+            counters = dict(self.counters)
+        return {"entries": entries, "max_entries": self.max_entries, "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds, **self.hits.summary(), **counters}
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Offline tests for request deadlines and cancellation.
+
+The work is simulated with short sleeps, so these run in about a second without an
+OpenAI key.
+"""
+
+import time
+import asyncio
+
+import pytest
+
+from deadlines import Deadline, DeadlineExceeded
+
+
+async def _slow(seconds, cleanup_seconds=0.0, log=None):
+    """Sleep, then (even when cancelled) spend cleanup_seconds cleaning up."""
+    try:
+        await asyncio.sleep(seconds)
+        return "finished"
+    finally:
+        await asyncio.sleep(cleanup_seconds)
+        if log is not None:
+            log.append("cleaned up")
+
+
+def test_result_within_deadline():
+    """Work that finishes in time returns its result; work that raises re-raises"""
+    async def failing():
+        raise ValueError("bad")
+
+    async def scenario():
+        assert await Deadline(1.0).run(_slow(0.01)) == "finished"
+        assert await Deadline().run(_slow(0.01), limit=1.0) == "finished"
+        with pytest.raises(ValueError):
+            await Deadline(1.0).run(failing())
+
+    asyncio.run(scenario())
+    return True
+
+
+def test_deadline_expiry():
+    """Work still running at the deadline is interrupted, cleaned up, and DeadlineExceeded raised"""
+    log = []
+
+    async def scenario():
+        deadline = Deadline(0.1)
+        start = time.perf_counter()
+        with pytest.raises(DeadlineExceeded, match="time limit of 0.1s"):
+            await deadline.run(_slow(5, log=log))
+        assert time.perf_counter() - start < 0.5
+        assert deadline.expired() and deadline.remaining() == 0.0
+        # Nothing new starts once the deadline has passed
+        with pytest.raises(DeadlineExceeded):
+            await deadline.run(_slow(0.01))
+
+    asyncio.run(scenario())
+    assert log == ["cleaned up"]
+    return True
+
+
+def test_limit_without_deadline():
+    """An agent's own limit raises a plain timeout while the request still has time"""
+    async def scenario():
+        deadline = Deadline(5.0)
+        with pytest.raises(asyncio.TimeoutError, match="no response within 0.05s") as raised:
+            await deadline.run(_slow(5), limit=0.05)
+        assert not isinstance(raised.value, DeadlineExceeded)
+        return deadline
+
+    assert not asyncio.run(scenario()).expired()
+    return True
+
+
+def test_request_cancellation():
+    """Cancelling the deadline interrupts the running work straight away"""
+    async def scenario():
+        deadline = Deadline(10.0)
+        asyncio.get_running_loop().call_later(0.05, deadline.cancel)
+        start = time.perf_counter()
+        with pytest.raises(DeadlineExceeded, match="^the request was cancelled$"):
+            await deadline.run(_slow(5))
+        return time.perf_counter() - start
+
+    assert asyncio.run(scenario()) < 0.5
+    return True
+
+
+def test_outer_cancellation_propagates():
+    """Cancelling the calling task while the interrupted work cleans up is not swallowed"""
+    async def scenario():
+        deadline = Deadline(0.05)
+        caller = asyncio.ensure_future(deadline.run(_slow(5, cleanup_seconds=0.3)))
+        await asyncio.sleep(0.15)  # past the deadline, while the work is cleaning up
+        caller.cancel()
+        # DeadlineExceeded here would mean the cancellation was swallowed
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+
+    asyncio.run(scenario())
+    return True
+
+
+def test_outer_cancellation_while_waiting():
+    """Cancelling the calling task while it waits cancels the work too"""
+    log = []
+
+    async def scenario():
+        caller = asyncio.ensure_future(Deadline(10.0).run(_slow(5, log=log)))
+        await asyncio.sleep(0.05)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert log == ["cleaned up"]
+    return True
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Running offline deadline tests")
+    print("=" * 50)
+
+    tests = [
+        ("Result within deadline", test_result_within_deadline),
+        ("Deadline expiry", test_deadline_expiry),
+        ("Limit without deadline", test_limit_without_deadline),
+        ("Request cancellation", test_request_cancellation),
+        ("Outer cancellation propagates", test_outer_cancellation_propagates),
+        ("Outer cancellation while waiting", test_outer_cancellation_while_waiting),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} failed with exception: {e}")
+            result = False
+        results.append((test_name, result))
+
+    print("\n📊 TEST SUMMARY")
+    print("=" * 30)
+    for test_name, result in results:
+        print(f"{test_name}: {'✅ PASS' if result else '❌ FAIL'}")
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\nOverall: {passed}/{len(results)} tests passed")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    main()
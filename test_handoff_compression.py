@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Offline tests for condensing workflow handoffs to a token budget.
+
+Uses the model-free hashing encoder, so these run in seconds without an OpenAI
+key, sentence-transformers or a model download.
+"""
+
+from encoders import HashingEncoder
+from handoff_compression import compress_output
+from token_budget import count_tokens
+
+ENCODER = HashingEncoder()
+
+
+def _encode(texts):
+    return ENCODER.encode_batch(list(texts))
+
+
+def _report(sections=6, sentences=8):
+    parts = []
+    for s in range(sections):
+        parts.append(f"## Section {s}")
+        parts.append(" ".join(f"Finding {s}.{i}: the electric vehicle market in region {s * 10 + i} grew by {i + 3}% "
+                              f"while battery costs fell by {i + 1}%." for i in range(sentences)))
+    return "\n".join(parts)
+
+
+def test_short_output_is_unchanged():
+    """Text that already fits is returned as it is"""
+    text = "A short answer. It fits easily."
+    condensed, before, after = compress_output(text, "answer", 100, _encode)
+    assert condensed == text
+    assert before == after == count_tokens(text)
+    return True
+
+
+def test_budget_is_respected():
+    """A long report is condensed to at most the budget, keeping headings above their sentences"""
+    text = _report()
+    for budget in (40, 120, 300):
+        condensed, before, after = compress_output(text, "battery costs", budget, _encode)
+        assert before == count_tokens(text) > budget
+        assert 0 < after <= budget, (budget, after)
+        assert after == count_tokens(condensed)
+        # A kept sentence is never shown without its section heading
+        assert condensed.startswith("## Section"), condensed[:40]
+    return True
+
+
+def test_run_on_paragraph_is_not_dropped():
+    """One sentence longer than the whole budget is split, so most of the budget is still used"""
+    text = "the market " + ", and then the competitors ".join(f"segment {i} grows fast" for i in range(300))
+    condensed, before, after = compress_output(text, "market growth", 575, _encode)
+    assert before > 575
+    assert 0.5 * 575 < after <= 575, after
+    return True
+
+
+def test_unbreakable_text_is_truncated():
+    """Text without spaces or punctuation is cut to the budget rather than dropped"""
+    condensed, _, after = compress_output("x" * 20000, "anything", 50, _encode)
+    assert 40 <= after <= 50, after
+    assert condensed == "x" * len(condensed)
+    return True
+
+
+def test_headings_only_output_fits_budget():
+    """Output made only of headings is condensed like sentences instead of passed through"""
+    text = "\n".join(f"# Heading number {i} about the market" for i in range(100))
+    _, before, after = compress_output(text, "market", 30, _encode)
+    assert before > 30
+    assert 0 < after <= 30, after
+    return True
+
+
+def test_repeats_are_dropped():
+    """Duplicate sentences are kept once"""
+    text = " ".join(["Battery costs fell sharply last year."] * 50 + ["Charging networks doubled in size."] * 50)
+    condensed, _, _ = compress_output(text, "batteries and charging", 100, _encode)
+    assert condensed.count("Battery costs fell sharply last year.") == 1
+    assert condensed.count("Charging networks doubled in size.") == 1
+    return True
+
+
+def test_edge_budgets():
+    """Whitespace-only text and a zero budget give empty output instead of failing"""
+    assert compress_output(" " * 400, "x", 10, _encode) == ("", count_tokens(" " * 400), 0)
+    assert compress_output("Some text here.", "x", 0, _encode)[0] == ""
+    return True
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Running offline handoff compression tests")
+    print("=" * 50)
+
+    tests = [
+        ("Short output is unchanged", test_short_output_is_unchanged),
+        ("Budget is respected", test_budget_is_respected),
+        ("Run-on paragraph is not dropped", test_run_on_paragraph_is_not_dropped),
+        ("Unbreakable text is truncated", test_unbreakable_text_is_truncated),
+        ("Headings-only output fits budget", test_headings_only_output_fits_budget),
+        ("Repeats are dropped", test_repeats_are_dropped),
+        ("Edge budgets", test_edge_budgets),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} failed with exception: {e}")
+            result = False
+        results.append((test_name, result))
+
+    print("\n📊 TEST SUMMARY")
+    print("=" * 30)
+    for test_name, result in results:
+        print(f"{test_name}: {'✅ PASS' if result else '❌ FAIL'}")
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\nOverall: {passed}/{len(results)} tests passed")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -107,7 +107,7 @@ async def test_complete_history_integration():
         print("\n5. Testing complete history formatting...")
         
         complete_history = manager.history_manager.get_recent_history(limit=10)
-        formatted_context = manager.format_historical_context(complete_history, decision)
+        formatted_context = manager.build_agent_context(decision, test_prompt)
         
         print(f"✅ Complete history formatting test completed")
         print(f"📊 Total conversations in history: {len(complete_history)}")
@@ -190,7 +190,7 @@ def test_complete_history_formatting():
         
         # Get history from ChromaDB and format it
         chat_history = manager.history_manager.get_recent_history(limit=10)
-        formatted_context = manager.format_historical_context(chat_history, "Social Media Manager")
+        formatted_context = manager.build_agent_context("Social Media Manager", "Create a marketing plan for the tech startup")
         
         print("✅ Complete history formatting successful")
         print(f"📝 Formatted context preview:")
@@ -200,13 +200,12 @@ def test_complete_history_formatting():
         
         # Verify key components are present
         required_components = [
-            "COMPLETE CHAT HISTORY",
-            "conversations) for your reference",
-            "Conversation 1",
-            "Date:",
-            "Agent Used:",
+            "RELEVANT CHAT HISTORY",
+            "most relevant to the current request",
+            "--- Conversation (",
             "User Request:",
-            "Response:"
+            "Response:",
+            "END CHAT HISTORY"
         ]
         
         missing_components = []
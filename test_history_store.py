@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the chat history vector store.
+
+Uses the model-free hashing encoder and a temporary directory, so these run in
+seconds without an OpenAI key, sentence-transformers or a model download.
+"""
+
+import gc
+import os
+import shutil
+import asyncio
+import weakref
+import tempfile
+import threading
+
+import pytest
+
+from chat_history_manager import ChatHistoryManager
+from encoders import HashingEncoder
+from history_service import HistoryService, HistoryServiceClient
+
+SAMPLE_CONVERSATIONS = [
+    ("Scrape competitor websites for pricing data", "Extracted pricing tables from three competitor sites.", "Web Scraper"),
+    ("Write a blog post about AI trends", "# AI Trends\n\nGenerative models are reshaping content work.", "Content Writer"),
+    ("Create a marketing report for a tech startup", "## Market Overview\n\nThe SaaS market keeps growing.", "Market Research Analyst"),
+    ("Design a logo for our bakery", "Proposed three logo concepts with warm colours.", "Graphic Designer"),
+    ("Analyze our business environment", "Key threats: rising costs. Key opportunities: online sales.", "Business Environment Analyst"),
+]
+
+
+def _new_manager(db_path, **kwargs):
+    return ChatHistoryManager(db_path=db_path, encoder_backend="hashing", **kwargs)
+
+
+def _populate(manager):
+    for user_prompt, response, agent in SAMPLE_CONVERSATIONS:
+        manager.add_entry(user_prompt, response, chosen_agent=agent)
+
+
+def test_add_search_and_reload():
+    """Entries survive a reload, similar prompts rank first, and a closed manager can be freed"""
+    db_path = tempfile.mkdtemp()
+    try:
+        manager = _new_manager(db_path)
+        _populate(manager)
+
+        results = manager.search_similar_conversations("blog post about artificial intelligence", n_results=2)
+        assert results[0]["metadata"]["chosen_agent"] == "Content Writer"
+        assert results[0]["manager_response"].startswith("# AI Trends")
+
+        reloaded = ChatHistoryManager(db_path=db_path)  # backend comes from the collection
+        assert reloaded.encoder_backend == "hashing"
+        assert len(reloaded.metadata) == len(SAMPLE_CONVERSATIONS)
+        assert reloaded.get_recent_history(limit=1)[0]["user_prompt"] == SAMPLE_CONVERSATIONS[-1][0]
+        manager.close()
+        reloaded.close()
+        # Nothing (such as the exit hook) keeps a closed manager alive
+        closed = weakref.ref(manager)
+        del manager
+        gc.collect()
+        assert closed() is None
+        return True
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def test_compaction_preserves_text():
+    """Recompressing cold records keeps every stored text intact and leaves published snapshots alone"""
+    db_path = tempfile.mkdtemp()
+    try:
+        # No background checkpoint (and so no automatic compaction) before the one below
+        manager = _new_manager(db_path, hot_records=1, flush_interval_ms=60000, flush_records=1000)
+        for i in range(10):
+            _populate(manager)
+        before = [(e["user_prompt"], e["manager_response"]) for e in manager.get_recent_history(limit=100)]
+        snapshot = manager._snapshot
+        records = list(snapshot.metadata[:snapshot.rows])
+        result = manager.compact_storage()
+        after = [(e["user_prompt"], e["manager_response"]) for e in manager.get_recent_history(limit=100)]
+        assert before == after
+        # A reader still holding the earlier snapshot keeps seeing the records it started with
+        assert all(old is new for old, new in zip(records, snapshot.metadata[:snapshot.rows]))
+        assert result["dictionary_version"] == 1
+        assert manager.get_collection_stats()["last_compaction"] is not None
+        manager.close()
+        return True
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def test_compaction_is_incremental():
+    """Later compactions recompress only newly cold records and reclaim the copies they replace"""
+    db_path = tempfile.mkdtemp()
+    try:
+        manager = _new_manager(db_path, hot_records=5)
+        for i in range(4):
+            _populate(manager)
+        first = manager.compact_storage()
+        assert first["recompressed_records"] == 15
+        # Every replaced hot copy is dead, which outweighs the live text: the file is rewritten
+        assert first["reclaimed"] and first["blob_bytes_after"] < first["blob_bytes_before"]
+        assert manager.compact_storage()["recompressed_records"] == 0
+        manager.delete_entry(manager.get_recent_history(limit=100)[-1]["id"])
+        for i in range(4):
+            _populate(manager)
+        before = [(e["user_prompt"], e["manager_response"]) for e in manager.get_recent_history(limit=100)]
+        second = manager.compact_storage()
+        assert second["recompressed_records"] == 20 and second["cold_records"] == 35
+        assert [(e["user_prompt"], e["manager_response"]) for e in manager.get_recent_history(limit=100)] == before
+        manager.close()
+
+        reloaded = _new_manager(db_path, hot_records=5)
+        assert [(e["user_prompt"], e["manager_response"]) for e in reloaded.get_recent_history(limit=100)] == before
+        reloaded.close()
+        return True
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def test_cursor_pagination():
+    """Pages walk the history newest first without gaps or repeats"""
+    db_path = tempfile.mkdtemp()
+    try:
+        manager = _new_manager(db_path)
+        _populate(manager)
+        _populate(manager)
+
+        seen = []
+        cursor = None
+        while True:
+            page = manager.get_history_page(page_size=3, after_id=cursor)
+            seen.extend(entry["id"] for entry in page["entries"])
+            if not page["has_more"]:
+                break
+            cursor = page["next_cursor"]
+        assert seen == [entry["id"] for entry in manager.get_recent_history(limit=100, include_text=False)]
+        assert [e["id"] for e in manager.iter_history(page_size=4)] == seen
+        manager.close()
+        return True
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def test_batch_timestamps_must_not_go_backwards():
+    """A batch whose timestamps go backwards is rejected whole, so timestamp pagination stays exact"""
+    db_path = tempfile.mkdtemp()
+    try:
+        manager = _new_manager(db_path)
+        batch = [{"user_prompt": prompt, "manager_response": response, "chosen_agent": agent,
+                  "timestamp": f"2025-01-0{i + 1}T12:00:00"}
+                 for i, (prompt, response, agent) in enumerate(SAMPLE_CONVERSATIONS)]
+        manager.add_entries(batch)
+        for entries in ([batch[1], batch[0]], [dict(batch[0])]):
+            with pytest.raises(RuntimeError, match="earlier than the entry before it"):
+                manager.add_entries(entries)
+        assert manager.get_collection_stats()["total_conversations"] == len(batch)
+
+        # Entries without a timestamp never sort before the ones already stored
+        manager.add_entries([{"user_prompt": "Later", "manager_response": "Now", "timestamp": "2999-01-01T00:00:00"}])
+        manager.add_entry("Clock went back?", "Still in order", chosen_agent="Content Writer")
+        assert manager.get_recent_history(limit=1)[0]["timestamp"] == "2999-01-01T00:00:00"
+        page = manager.get_history_page(page_size=10, before_ts="2999-01-01T00:00:00")
+        assert len(page["entries"]) == len(batch)
+        manager.close()
+        return True
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def test_encoder_identity_is_enforced():
+    """A collection cannot be reopened with an encoder from a different embedding space"""
+    db_path = tempfile.mkdtemp()
+    try:
+        manager = _new_manager(db_path)
+        _populate(manager)
+        manager.close()
+        try:
+            ChatHistoryManager(db_path=db_path, encoder=HashingEncoder(dim=128))
+        except RuntimeError:
+            return True
+        raise AssertionError("Opening a hashing:dim384 collection with dim128 should fail")
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def test_entry_update_and_delete():
+    """Point lookup, update and delete by id, surviving both a checkpoint and a log replay"""
+    db_path = tempfile.mkdtemp()
+    crashed = None
+    try:
+        manager = _new_manager(db_path)
+        _populate(manager)
+        ids = [e["id"] for e in manager.get_recent_history(limit=100, include_text=False)]
+        logo_id, blog_id = ids[1], ids[3]
+        assert manager.get_entry(logo_id)["user_prompt"] == "Design a logo for our bakery"
+        assert manager.get_entry("missing") is None
+
+        # Agent-only edits keep the embedding; text edits re-embed
+        encodes = manager.latency["encode"].count
+        assert manager.update_entry(logo_id, chosen_agent="Brand Designer")["chosen_agent"] == "Brand Designer"
+        assert manager.latency["encode"].count == encodes
+        manager.update_entry(blog_id, user_prompt="Plan a vegetable garden for spring")
+        assert manager.latency["encode"].count == encodes + 1
+        assert manager.search_similar_conversations("vegetable garden", n_results=1)[0]["metadata"]["id"] == blog_id
+
+        assert manager.delete_entry(logo_id) and not manager.delete_entry(logo_id)
+        assert manager.get_entry(logo_id) is None
+        assert logo_id not in [r["metadata"]["id"] for r in manager.search_similar_conversations("bakery logo", n_results=10)]
+        assert len(manager.search_similar_conversations("bakery logo", n_results=10)) == len(SAMPLE_CONVERSATIONS) - 1
+        page = manager.get_history_page(page_size=2)
+        assert [e["id"] for e in page["entries"]] == [ids[0], ids[2]] and page["has_more"]
+        manager.close()
+
+        # Changes that never reached a checkpoint are replayed from the log
+        crashed = _new_manager(db_path, flush_interval_ms=60000, flush_records=1000)
+        crashed.update_entry(ids[0], manager_response="Moved to a new section")
+        crashed.delete_entry(ids[2])
+        for reopened in (ChatHistoryManager(db_path=db_path), ChatHistoryManager(db_path=db_path, out_of_core=True)):
+            assert reopened.get_entry(logo_id) is None and reopened.get_entry(ids[2]) is None
+            assert reopened.get_entry(ids[0])["manager_response"] == "Moved to a new section"
+            assert reopened.get_entry(blog_id)["user_prompt"] == "Plan a vegetable garden for spring"
+            assert reopened.get_collection_stats()["total_conversations"] == len(SAMPLE_CONVERSATIONS) - 2
+            reopened.close()
+        return True
+    finally:
+        if crashed is not None:
+            crashed.close()
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def test_rollups_track_writes():
+    """Per-agent rollups follow adds, updates and deletes and are rebuilt on reload"""
+    db_path = tempfile.mkdtemp()
+    try:
+        manager = _new_manager(db_path)
+        _populate(manager)
+        ids = manager.add_entries([
+            {"user_prompt": "Report with visuals", "manager_response": "Done.",
+             "chosen_agent": "Multi-agent workflow: Market Research Analyst -> Graphic Designer"},
+            {"user_prompt": "Hello", "manager_response": "No agent needed."},
+        ])
+        manager.update_entry(ids[1], chosen_agent="Content Writer")
+        manager.delete_entry(manager.get_recent_history(limit=100)[-1]["id"])  # the Web Scraper entry
+
+        expected = {}
+        for entry in manager.get_recent_history(limit=100, include_text=False):
+            expected[entry["chosen_agent"]] = expected.get(entry["chosen_agent"], 0) + 1
+        assert manager.get_agent_counts() == expected and "Web Scraper" not in expected
+        rollups = manager.get_rollups()
+        assert rollups["total_conversations"] == len(SAMPLE_CONVERSATIONS) + 1
+        assert rollups["workflows"] == {"single_agent": len(SAMPLE_CONVERSATIONS), "multi_agent": 1}
+        assert rollups["agents"]["Content Writer"]["avg_prompt_length"] == (len("Write a blog post about AI trends") + len("Hello")) / 2
+        assert sum(sum(agents.values()) for agents in rollups["days"].values()) == rollups["total_conversations"]
+        text_chars = sum(len(entry["user_prompt"]) + len(entry["manager_response"])
+                         for entry in manager.get_recent_history(limit=100))
+        assert manager.rollups.text_chars == text_chars
+        manager.close()
+
+        reloaded = ChatHistoryManager(db_path=db_path)
+        assert reloaded.get_rollups() == rollups
+        assert reloaded.rollups.text_chars == text_chars
+        reloaded.close()
+        return True
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def test_wal_recovers_unflushed_entries():
+    """Entries that never reached a group commit are replayed from the write-ahead log"""
+    db_path = tempfile.mkdtemp()
+    crashed = None
+    try:
+        # A long interval keeps everything in the log, like a process killed before its next commit
+        crashed = _new_manager(db_path, flush_interval_ms=60000, flush_records=1000)
+        _populate(crashed)
+        assert crashed.get_collection_stats()["write_behind"]["pending_records"] == len(SAMPLE_CONVERSATIONS)
+
+        recovered = ChatHistoryManager(db_path=db_path)
+        assert [e["id"] for e in recovered.get_recent_history(limit=100, include_text=False)] == \
+            [e["id"] for e in crashed.get_recent_history(limit=100, include_text=False)]
+        assert recovered.search_similar_conversations("logo for a bakery", n_results=1)[0]["metadata"]["chosen_agent"] == "Graphic Designer"
+        recovered.close()
+        assert not recovered.wal.files()
+        return True
+    finally:
+        if crashed is not None:
+            crashed.close()
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def test_out_of_core_search_matches_in_memory():
+    """Streaming search over the on-disk matrix ranks exactly like the in-memory scan"""
+    db_path = tempfile.mkdtemp()
+    try:
+        manager = _new_manager(db_path)
+        _populate(manager)
+        manager.close()
+
+        in_memory = _new_manager(db_path)
+        out_of_core = _new_manager(db_path, out_of_core=True, search_block_rows=2, search_threads=2)
+        assert out_of_core.get_collection_stats()["resident_embedding_bytes"] == 0
+        for query in ("pricing data from websites", "bakery logo", "blog about AI"):
+            expected = [r["metadata"]["id"] for r in in_memory.search_similar_conversations(query, n_results=3)]
+            assert [r["metadata"]["id"] for r in in_memory.search_similar_conversations(query, n_results=3, streaming=True)] == expected
+            assert [r["metadata"]["id"] for r in out_of_core.search_similar_conversations(query, n_results=3)] == expected
+        in_memory.close()
+        out_of_core.close()
+        return True
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def test_rebuild_index_switches_encoder():
+    """A rebuild re-embeds the collection and publishes it as a new generation"""
+    db_path = tempfile.mkdtemp()
+    try:
+        manager = _new_manager(db_path)
+        _populate(manager)
+        before = manager.get_collection_stats()["index"]["generation"]
+        old_snapshot = manager._snapshot
+
+        result = manager.rebuild_index(encoder=HashingEncoder(dim=128))
+        assert result["rows"] == len(SAMPLE_CONVERSATIONS) and result["generation"] > before
+        assert old_snapshot.embeddings.shape == (len(SAMPLE_CONVERSATIONS), 384)  # untouched for old readers
+        assert manager.search_similar_conversations("bakery logo", n_results=1)[0]["metadata"]["chosen_agent"] == "Graphic Designer"
+        manager.close()
+
+        reopened = ChatHistoryManager(db_path=db_path, encoder=HashingEncoder(dim=128))
+        assert reopened.get_collection_stats()["embedding_dimension"] == 128
+        reopened.close()
+        return True
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def test_history_service_round_trip():
+    """A client's batched writes and reads go through one shared service"""
+    db_path = tempfile.mkdtemp()
+    url = f"unix://{os.path.join(db_path, 'history.sock')}"
+    service = HistoryService(_new_manager(db_path))
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    serving = asyncio.run_coroutine_threadsafe(service.serve(url), loop)
+    try:
+        client = None
+        for _ in range(50):
+            try:
+                client = HistoryServiceClient(url)
+                client.health()
+                break
+            except OSError:
+                client.close()
+                threading.Event().wait(0.05)
+        ids = [client.add_entry(prompt, response, agent) for prompt, response, agent in SAMPLE_CONVERSATIONS]
+        # Reads flush queued writes first
+        assert [e["id"] for e in client.get_recent_history(limit=10, include_text=False)] == ids[::-1]
+        assert client.search_similar_conversations("bakery logo", n_results=1)[0]["metadata"]["chosen_agent"] == "Graphic Designer"
+        responses = client.execute_batch([("stats", {}), ("page", {"page_size": 2})])
+        assert responses[0]["result"]["total_conversations"] == len(SAMPLE_CONVERSATIONS)
+        assert responses[1]["result"]["has_more"]
+        client.close()
+        return True
+    finally:
+        loop.call_soon_threadsafe(serving.cancel)
+        service.close()
+        loop.call_soon_threadsafe(loop.stop)
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Running offline chat history store tests")
+    print("=" * 50)
+
+    tests = [
+        ("Add, search and reload", test_add_search_and_reload),
+        ("Compaction preserves text", test_compaction_preserves_text),
+        ("Compaction is incremental", test_compaction_is_incremental),
+        ("Cursor pagination", test_cursor_pagination),
+        ("Batch timestamps must not go backwards", test_batch_timestamps_must_not_go_backwards),
+        ("Encoder identity is enforced", test_encoder_identity_is_enforced),
+        ("Entry update and delete", test_entry_update_and_delete),
+        ("Rollups track writes", test_rollups_track_writes),
+        ("WAL recovers unflushed entries", test_wal_recovers_unflushed_entries),
+        ("Out-of-core search matches in-memory", test_out_of_core_search_matches_in_memory),
+        ("Rebuild index switches encoder", test_rebuild_index_switches_encoder),
+        ("History service round trip", test_history_service_round_trip),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} failed with exception: {e}")
+            result = False
+        results.append((test_name, result))
+
+    print("\n📊 TEST SUMMARY")
+    print("=" * 30)
+    for test_name, result in results:
+        print(f"{test_name}: {'✅ PASS' if result else '❌ FAIL'}")
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\nOverall: {passed}/{len(results)} tests passed")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the kNN triage router.
+
+The neighbors come from a real history store with the model-free hashing encoder in a
+temporary directory, so these run in seconds without an OpenAI key.
+"""
+
+import shutil
+import tempfile
+
+from chat_history_manager import ChatHistoryManager
+from knn_router import KnnRouter, decision_for_label
+
+AGENTS = ["Web Scraper", "Content Writer", "Data Analyst"]
+
+
+def _neighbor(score, chosen_agent, response="Done."):
+    return {"similarity_score": score,
+            "metadata": {"chosen_agent": chosen_agent, "manager_response_preview": response}}
+
+
+def test_decision_for_label():
+    """Stored labels map back to triage decisions; unknown agents and no-agent entries give None"""
+    assert decision_for_label("Web Scraper") == "SINGLE: Web Scraper"
+    assert decision_for_label("Multi-agent workflow: Web Scraper & Data Analyst -> Content Writer", AGENTS) == \
+        "MULTI: Web Scraper & Data Analyst -> Content Writer"
+    assert decision_for_label("Retired Agent", AGENTS) is None
+    assert decision_for_label("Multi-agent workflow: Web Scraper -> Retired Agent", AGENTS) is None
+    assert decision_for_label("None") is None and decision_for_label("") is None
+    return True
+
+
+def test_vote_weights_and_filters():
+    """The vote is similarity-weighted; far, failed and unknown neighbors do not vote"""
+    router = KnnRouter(None, AGENTS, min_similarity=0.5)
+    decision, share, votes = router.vote([
+        _neighbor(0.9, "Web Scraper"),
+        _neighbor(0.8, "Web Scraper"),
+        _neighbor(0.6, "Content Writer"),
+        _neighbor(0.95, "Data Analyst", "Error: Agent Data Analyst failed"),
+        _neighbor(0.9, "Retired Agent"),
+        _neighbor(0.3, "Content Writer"),
+    ])
+    assert decision == "SINGLE: Web Scraper"
+    assert votes == 3
+    assert abs(share - 1.7 / 2.3) < 1e-9
+    assert router.vote([_neighbor(0.2, "Web Scraper")]) is None
+    return True
+
+
+def test_route_falls_back_unless_confident():
+    """The router answers only with enough agreeing neighbors, and learns as entries are added"""
+    db_path = tempfile.mkdtemp()
+    store = ChatHistoryManager(db_path=db_path, encoder_backend="hashing")
+    try:
+        router = KnnRouter(store, AGENTS, neighbors=8, min_confidence=0.8, min_similarity=0.3, min_votes=3)
+        prompt = "Scrape the pricing tables from competitor websites"
+        assert router.route(prompt) is None
+
+        for i in range(4):
+            store.add_entry(f"Scrape the pricing tables from competitor websites {i}", "Scraped.",
+                            chosen_agent="Web Scraper")
+        store.add_entry("Write a blog post about electric vehicles", "Wrote it.", chosen_agent="Content Writer")
+        decision, confidence = router.route(prompt)
+        assert decision == "SINGLE: Web Scraper" and confidence >= 0.8
+
+        # A split vote is not confident enough
+        for i in range(4):
+            store.add_entry(f"Scrape the pricing tables from competitor websites {i}", "Charted.",
+                            chosen_agent="Data Analyst")
+        assert router.route(prompt) is None
+        stats = router.stats()
+        assert stats["routed"] == 1 and stats["fallback"] == 2
+        return True
+    finally:
+        store.close()
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Running offline kNN router tests")
+    print("=" * 50)
+
+    tests = [
+        ("Decision for label", test_decision_for_label),
+        ("Vote weights and filters", test_vote_weights_and_filters),
+        ("Route falls back unless confident", test_route_falls_back_unless_confident),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} failed with exception: {e}")
+            result = False
+        results.append((test_name, result))
+
+    print("\n📊 TEST SUMMARY")
+    print("=" * 30)
+    for test_name, result in results:
+        print(f"{test_name}: {'✅ PASS' if result else '❌ FAIL'}")
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\nOverall: {passed}/{len(results)} tests passed")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    main()
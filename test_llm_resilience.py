@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Offline tests for LLM call retries, hedging and circuit breaking.
+
+Attempts are simulated with coroutines that fail or sleep on cue, and backoffs and
+cooldowns are shortened to milliseconds, so these run without an OpenAI key.
+"""
+
+import time
+import asyncio
+
+import pytest
+
+from deadlines import Deadline, DeadlineExceeded
+from llm_resilience import LlmResilience, CircuitBreaker, is_retryable, retry_delay
+from llm_scheduler import AdmissionTimeout
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"status_code": status_code, "headers": headers or {}})()
+
+
+class RateLimitError(Exception):
+    """Named like the provider's error, which is classified by class name"""
+
+
+def _attempts(outcomes):
+    """An attempt function returning or raising the next outcome on each call."""
+    calls = []
+
+    async def attempt():
+        outcome = outcomes[min(len(calls), len(outcomes) - 1)]
+        calls.append(outcome)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    return attempt, calls
+
+
+def test_retry_classification():
+    """Transient failures are retryable; bad requests, overload and deadlines are not"""
+    assert is_retryable(ConnectionError("reset"))
+    assert is_retryable(asyncio.TimeoutError())
+    assert is_retryable(_StatusError(429)) and is_retryable(_StatusError(503))
+    assert is_retryable(RateLimitError("slow down"))
+    assert not is_retryable(_StatusError(400)) and not is_retryable(_StatusError(401))
+    assert not is_retryable(ValueError("bad input"))
+    assert not is_retryable(AdmissionTimeout("queued too long"))
+    assert not is_retryable(DeadlineExceeded("out of time"))
+    return True
+
+
+def test_retry_delay():
+    """Backoff is jittered under an exponential cap, and Retry-After wins when sent"""
+    assert all(0 <= retry_delay(3, 1.0, 20.0) <= 4.0 for _ in range(100))
+    assert all(retry_delay(10, 1.0, 20.0) <= 20.0 for _ in range(100))
+    assert retry_delay(1, 1.0, 20.0, _StatusError(429, {"retry-after": "7"})) == 7.0
+    assert retry_delay(1, 1.0, 5.0, _StatusError(429, {"retry-after": "60"})) == 5.0
+    return True
+
+
+def test_transient_failures_are_retried():
+    """A call succeeds after transient failures, within max_attempts"""
+    resilience = LlmResilience(max_attempts=3, retry_base=0.01, retry_max=0.01)
+    attempt, calls = _attempts([ConnectionError("reset"), _StatusError(503), "done"])
+    assert asyncio.run(resilience.call("Web Scraper", attempt)) == "done"
+    assert len(calls) == 3
+    assert resilience.counters["retries"] == 2
+
+    attempt, calls = _attempts([_StatusError(400), "never"])
+    with pytest.raises(_StatusError):
+        asyncio.run(resilience.call("Web Scraper", attempt))
+    assert len(calls) == 1
+
+    # No retry once the caller says its output was already shown
+    attempt, calls = _attempts([ConnectionError("reset"), "never"])
+    with pytest.raises(ConnectionError):
+        asyncio.run(resilience.call("Content Writer", attempt, can_retry=lambda: False))
+    assert len(calls) == 1
+    return True
+
+
+def test_no_retry_past_the_deadline():
+    """A retry whose backoff would outlast the request's deadline is not started"""
+    resilience = LlmResilience(max_attempts=3, retry_base=5.0, retry_max=5.0)
+    attempt, calls = _attempts([_StatusError(429, {"retry-after": "5"}), "never"])
+
+    async def scenario():
+        await resilience.call("Data Analyst", attempt, deadline=Deadline(1.0))
+
+    start = time.perf_counter()
+    with pytest.raises(_StatusError):
+        asyncio.run(scenario())
+    assert len(calls) == 1
+    assert time.perf_counter() - start < 0.5
+    return True
+
+
+def test_circuit_breaker_states():
+    """The circuit opens at the threshold, lets one probe through after the cooldown, and closes on success"""
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.1)
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    assert 0 < breaker.retry_in() <= 0.1
+
+    time.sleep(0.12)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.trips == 2
+
+    time.sleep(0.12)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+    return True
+
+
+def test_open_circuit_rejects_calls():
+    """After repeated failures an agent's calls fail fast until the cooldown passes"""
+    resilience = LlmResilience(max_attempts=1, breaker_failures=2, breaker_cooldown=0.1)
+    attempt, calls = _attempts([_StatusError(500)])
+    for _ in range(2):
+        with pytest.raises(_StatusError):
+            asyncio.run(resilience.call("Graphic Designer", attempt))
+    with pytest.raises(RuntimeError, match="temporarily unavailable"):
+        asyncio.run(resilience.call("Graphic Designer", attempt))
+    assert len(calls) == 2
+    assert resilience.stats()["open_circuits"] == ["Graphic Designer"]
+
+    # Overload says nothing about the agent's health
+    attempt, _ = _attempts([AdmissionTimeout("queued too long")])
+    for _ in range(3):
+        with pytest.raises(AdmissionTimeout):
+            asyncio.run(resilience.call("Content Writer", attempt))
+    assert resilience.breaker("Content Writer").state == "closed"
+    return True
+
+
+def test_slow_call_is_hedged():
+    """Once an agent has a latency history, a call running past its p95 gets a duplicate that can win"""
+    resilience = LlmResilience(hedge_min_samples=5)
+    delays = [0.01] * 5 + [2.0, 0.01]
+
+    async def attempt():
+        await asyncio.sleep(delays.pop(0))
+        return "ok"
+
+    async def scenario():
+        for _ in range(5):
+            await resilience.call("Web Scraper", attempt, hedge=True)
+        start = time.perf_counter()
+        result = await resilience.call("Web Scraper", attempt, hedge=True)
+        return result, time.perf_counter() - start
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == "ok"
+    assert elapsed < 0.5, elapsed
+    assert resilience.counters["hedges"] == 1 and resilience.counters["hedge_wins"] == 1
+    return True
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Running offline LLM resilience tests")
+    print("=" * 50)
+
+    tests = [
+        ("Retry classification", test_retry_classification),
+        ("Retry delay", test_retry_delay),
+        ("Transient failures are retried", test_transient_failures_are_retried),
+        ("No retry past the deadline", test_no_retry_past_the_deadline),
+        ("Circuit breaker states", test_circuit_breaker_states),
+        ("Open circuit rejects calls", test_open_circuit_rejects_calls),
+        ("Slow call is hedged", test_slow_call_is_hedged),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} failed with exception: {e}")
+            result = False
+        results.append((test_name, result))
+
+    print("\n📊 TEST SUMMARY")
+    print("=" * 30)
+    for test_name, result in results:
+        print(f"{test_name}: {'✅ PASS' if result else '❌ FAIL'}")
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\nOverall: {passed}/{len(results)} tests passed")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    main()
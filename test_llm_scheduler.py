@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the shared LLM call scheduler.
+
+Calls are simulated with short sleeps and the limits are set small enough to hit
+within a second, so these run without an OpenAI key or network access.
+"""
+
+import asyncio
+
+from llm_scheduler import LlmScheduler, AdmissionTimeout
+
+
+async def _timed_out(scheduler, key, prompt_tokens, timeout):
+    try:
+        reservation = await scheduler.acquire(key, prompt_tokens, timeout)
+    except AdmissionTimeout:
+        return True
+    scheduler.release(reservation)
+    return False
+
+
+def test_concurrency_cap():
+    """No more than max_concurrency calls are in flight; the rest queue and all finish"""
+    scheduler = LlmScheduler(max_concurrency=2, requests_per_minute=0, tokens_per_minute=0)
+    finished = []
+
+    async def call(i):
+        async with scheduler.reserve("Content Writer", 100):
+            await asyncio.sleep(0.05)
+            finished.append(i)
+
+    async def scenario():
+        await asyncio.gather(*(call(i) for i in range(6)))
+
+    asyncio.run(scenario())
+    stats = scheduler.stats()
+    assert sorted(finished) == list(range(6))
+    assert stats["peak_in_flight"] == 2
+    assert stats["in_flight"] == 0 and stats["waiting"] == 0
+    assert stats["queued"] == 4
+    return True
+
+
+def test_requests_per_minute_cap():
+    """Calls beyond the per-minute request budget wait and time out"""
+    scheduler = LlmScheduler(max_concurrency=0, requests_per_minute=3, tokens_per_minute=0)
+
+    async def scenario():
+        for _ in range(3):
+            scheduler.release(await scheduler.acquire("Web Scraper", 10, timeout=0.1))
+        return await _timed_out(scheduler, "Web Scraper", 10, 0.2)
+
+    assert asyncio.run(scenario())
+    assert scheduler.counters["admitted"] == 3
+    assert scheduler.counters["timeouts"] == 1
+    return True
+
+
+def test_tokens_per_minute_cap_and_settle_refund():
+    """A call waits for token budget, and settling an over-estimate lets it in"""
+    scheduler = LlmScheduler(max_concurrency=0, requests_per_minute=0, tokens_per_minute=2000)
+
+    async def scenario():
+        first = await scheduler.acquire("Data Analyst", 1500, timeout=0.1)
+        # The estimate (prompt plus the default output) is capped at the whole bucket
+        assert first.tokens == 2000
+        assert await _timed_out(scheduler, "Data Analyst", 50, 0.1)
+
+        waiter = asyncio.ensure_future(scheduler.acquire("Data Analyst", 50, timeout=2))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        first.settle(total_tokens=600, output_tokens=100)
+        scheduler.release(first)
+        second = await asyncio.wait_for(waiter, 1)
+        scheduler.release(second)
+        return second
+
+    second = asyncio.run(scenario())
+    assert second.tokens == 50 + 1000
+    # The learned output size shrinks the next estimate
+    assert scheduler.estimate("Data Analyst", 50) < second.tokens
+    return True
+
+
+def test_queue_is_first_in_first_out():
+    """A large call at the head of the queue is not overtaken by smaller ones behind it"""
+    scheduler = LlmScheduler(max_concurrency=0, requests_per_minute=0, tokens_per_minute=2000)
+
+    async def scenario():
+        holder = await scheduler.acquire("A", 0)                       # 1000 of 2000 tokens
+        big = asyncio.ensure_future(scheduler.acquire("Big", 1000, timeout=2))
+        await asyncio.sleep(0.02)
+        small = asyncio.ensure_future(scheduler.acquire("Small", 0, timeout=2))
+        await asyncio.sleep(0.05)
+        # The small call would fit the bucket, but the big one is ahead of it
+        assert not big.done() and not small.done()
+        holder.settle(total_tokens=0)
+        scheduler.release(holder)
+        admitted = await asyncio.wait_for(big, 1)
+        assert not small.done()
+        small.cancel()
+        scheduler.release(admitted)
+        return admitted
+
+    assert asyncio.run(scenario()).tokens == 2000
+    return True
+
+
+def test_cancelled_waiter_leaves_queue():
+    """A waiter cancelled while queued gives up its place and does not block the next call"""
+    scheduler = LlmScheduler(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0)
+
+    async def scenario():
+        holder = await scheduler.acquire("A", 10)
+        waiter = asyncio.ensure_future(scheduler.acquire("B", 10, timeout=5))
+        await asyncio.sleep(0.02)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        scheduler.release(holder)
+        scheduler.release(await scheduler.acquire("C", 10, timeout=0.5))
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["waiting"] == 0 and stats["in_flight"] == 0
+    return True
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Running offline LLM scheduler tests")
+    print("=" * 50)
+
+    tests = [
+        ("Concurrency cap", test_concurrency_cap),
+        ("Requests-per-minute cap", test_requests_per_minute_cap),
+        ("Tokens-per-minute cap and settle refund", test_tokens_per_minute_cap_and_settle_refund),
+        ("Queue is first in, first out", test_queue_is_first_in_first_out),
+        ("Cancelled waiter leaves queue", test_cancelled_waiter_leaves_queue),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} failed with exception: {e}")
+            result = False
+        results.append((test_name, result))
+
+    print("\n📊 TEST SUMMARY")
+    print("=" * 30)
+    for test_name, result in results:
+        print(f"{test_name}: {'✅ PASS' if result else '❌ FAIL'}")
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\nOverall: {passed}/{len(results)} tests passed")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    main()
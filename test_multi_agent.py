@@ -61,6 +61,7 @@ async def test_multi_agent_functionality():
         test_cases = [
             "SINGLE: Content Writer",
             "MULTI: Market Research Analyst -> Content Writer -> PDF Producer\nWORKFLOW: Research, then write, then create PDF",
+            "MULTI: Web Scraper & Market Research Analyst -> Content Writer\nWORKFLOW: Research in parallel, then write",
             "NONE: No suitable agent for this quantum physics calculation",
             "Content Writer"  # Legacy format
         ]
@@ -73,6 +74,7 @@ async def test_multi_agent_functionality():
                 print(f"   → Agent: {parsed['agent']}")
             elif parsed["type"] == "multi":
                 print(f"   → Agents: {parsed['agents']}")
+                print(f"   → Stages: {parsed['plan'].stages()}")
             elif parsed["type"] == "none":
                 print(f"   → Message: {parsed['message']}")
         
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the content-addressed result cache.
+
+Uses a temporary directory, so these run instantly without an OpenAI key.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+
+from result_cache import ResultCache, content_key, normalize_prompt
+
+
+def _with_cache(test, **kwargs):
+    directory = tempfile.mkdtemp()
+    try:
+        return test(directory, ResultCache(directory, **kwargs))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def test_keys():
+    """Trivially different prompts share a key; parts cannot run together"""
+    assert normalize_prompt("  Write a   Blog post\n") == "write a blog post"
+    assert content_key("ab", "c") != content_key("a", "bc")
+    assert content_key("fingerprint", normalize_prompt("Write a blog post")) == \
+        content_key("fingerprint", normalize_prompt("write a  BLOG post "))
+    return True
+
+
+def test_round_trip_and_reopen():
+    """A stored result is served, survives reopening the directory, and misses are counted"""
+    def test(directory, cache):
+        key = content_key("roster", "write a blog post")
+        assert cache.get(key) is None
+        cache.put(key, {"response": "Here is the post.", "agent": "Content Writer"})
+        assert cache.get(key)["response"] == "Here is the post."
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+        reopened = ResultCache(directory)
+        assert reopened.stats()["entries"] == 1
+        assert reopened.get(key) == {"response": "Here is the post.", "agent": "Content Writer"}
+        return True
+
+    return _with_cache(test)
+
+
+def test_ttl_expiry():
+    """Entries older than the TTL are treated as missing and removed"""
+    def test(directory, cache):
+        key = content_key("old request")
+        cache.put(key, {"response": "stale"})
+        time.sleep(0.1)
+        assert cache.get(key) is None
+        assert cache.stats()["expired"] == 1 and cache.stats()["entries"] == 0
+        assert not os.path.exists(cache._path(key))
+        return True
+
+    return _with_cache(test, ttl_seconds=0.05)
+
+
+def test_lru_eviction():
+    """Past max_bytes the least recently used entry is evicted"""
+    def test(directory, cache):
+        keys = [content_key(str(i)) for i in range(3)]
+        cache.put(keys[0], {"response": "x" * 100})
+        cache.put(keys[1], {"response": "y" * 100})
+        cache.get(keys[0])  # now the most recently used
+        cache.put(keys[2], {"response": "z" * 100})
+        assert cache.stats()["evicted"] == 1
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+        return True
+
+    return _with_cache(test, max_bytes=300)
+
+
+def test_damaged_file_is_a_miss():
+    """A file removed or corrupted behind the cache's back is a miss, not an error"""
+    def test(directory, cache):
+        key = content_key("request")
+        cache.put(key, {"response": "ok"})
+        with open(cache._path(key), "w") as f:
+            f.write("{not json")
+        assert cache.get(key) is None
+        assert cache.stats()["entries"] == 0
+        return True
+
+    return _with_cache(test)
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Running offline result cache tests")
+    print("=" * 50)
+
+    tests = [
+        ("Keys", test_keys),
+        ("Round trip and reopen", test_round_trip_and_reopen),
+        ("TTL expiry", test_ttl_expiry),
+        ("LRU eviction", test_lru_eviction),
+        ("Damaged file is a miss", test_damaged_file_is_a_miss),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} failed with exception: {e}")
+            result = False
+        results.append((test_name, result))
+
+    print("\n📊 TEST SUMMARY")
+    print("=" * 30)
+    for test_name, result in results:
+        print(f"{test_name}: {'✅ PASS' if result else '❌ FAIL'}")
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\nOverall: {passed}/{len(results)} tests passed")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the semantic cache of triage decisions.
+
+Uses hand-made embeddings and a temporary directory, so these run instantly without
+an OpenAI key or an encoder model.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+from routing_cache import RoutingCache, roster_fingerprint
+
+
+def _vector(*values, dim=8):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector
+
+
+def test_similar_prompt_hits():
+    """A prompt close enough to a cached one reuses its decision; a different one misses"""
+    cache = RoutingCache("roster", threshold=0.9)
+    cache.store(_vector(1, 0), "SINGLE: Web Scraper")
+    decision, score = cache.lookup(_vector(1, 0.1))
+    assert decision == "SINGLE: Web Scraper" and score >= 0.9
+    assert cache.lookup(_vector(0, 1)) is None
+    assert cache.lookup(_vector(0, 0)) is None  # zero vector never matches
+    stats = cache.stats()
+    assert stats["entries"] == 1 and stats["hits"] == 1 and stats["misses"] == 2
+    return True
+
+
+def test_near_duplicates_replace_and_eviction():
+    """Storing a near-duplicate replaces it; past max_entries the oldest entry is evicted"""
+    cache = RoutingCache("roster", threshold=0.9, max_entries=2)
+    cache.store(_vector(1, 0), "SINGLE: Web Scraper")
+    cache.store(_vector(1, 0.05), "SINGLE: Data Analyst")
+    assert cache.stats()["entries"] == 1
+    assert cache.lookup(_vector(1, 0))[0] == "SINGLE: Data Analyst"
+
+    cache.store(_vector(0, 1), "SINGLE: Content Writer")
+    time.sleep(0.01)
+    cache.store(_vector(0, 0, 1), "SINGLE: Graphic Designer")
+    assert cache.stats()["evicted"] == 1
+    assert cache.lookup(_vector(1, 0)) is None
+    assert cache.lookup(_vector(0, 0, 1))[0] == "SINGLE: Graphic Designer"
+    return True
+
+
+def test_ttl_forget_and_invalidate():
+    """Expired entries stop matching, forget() drops a failed decision, invalidate() empties the cache"""
+    cache = RoutingCache("roster", threshold=0.9, ttl_seconds=0.05)
+    cache.store(_vector(1, 0), "SINGLE: Web Scraper")
+    time.sleep(0.1)
+    assert cache.lookup(_vector(1, 0)) is None
+    assert cache.stats()["expired"] == 1
+
+    cache = RoutingCache("roster", threshold=0.9)
+    cache.store(_vector(1, 0), "SINGLE: Web Scraper")
+    cache.store(_vector(0, 1), "SINGLE: Content Writer")
+    cache.forget(_vector(1, 0))
+    assert cache.lookup(_vector(1, 0)) is None
+    assert cache.lookup(_vector(0, 1))[0] == "SINGLE: Content Writer"
+    cache.invalidate("new roster")
+    assert cache.stats()["entries"] == 0 and cache.fingerprint == "new roster"
+    return True
+
+
+def test_persistence_respects_roster():
+    """A saved cache reloads under the same roster fingerprint and is discarded under another"""
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "routing_cache.npz")
+        agents = {"Web Scraper": type("Agent", (), {"handoff_description": "Scrapes", "instructions": "Scrape"})()}
+        fingerprint = roster_fingerprint(agents, "hashing")
+        assert fingerprint != roster_fingerprint(agents, "minilm")
+
+        cache = RoutingCache(fingerprint, path=path)
+        cache.store(_vector(1, 0), "SINGLE: Web Scraper")
+        cache.save()
+        assert RoutingCache(fingerprint, path=path).lookup(_vector(1, 0))[0] == "SINGLE: Web Scraper"
+        changed = RoutingCache(roster_fingerprint(agents, "minilm"), path=path)
+        assert changed.lookup(_vector(1, 0)) is None
+        assert changed.stats()["invalidated"] == 1
+        return True
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Running offline routing cache tests")
+    print("=" * 50)
+
+    tests = [
+        ("Similar prompt hits", test_similar_prompt_hits),
+        ("Near-duplicates replace and eviction", test_near_duplicates_replace_and_eviction),
+        ("TTL, forget and invalidate", test_ttl_forget_and_invalidate),
+        ("Persistence respects roster", test_persistence_respects_roster),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} failed with exception: {e}")
+            result = False
+        results.append((test_name, result))
+
+    print("\n📊 TEST SUMMARY")
+    print("=" * 30)
+    for test_name, result in results:
+        print(f"{test_name}: {'✅ PASS' if result else '❌ FAIL'}")
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\nOverall: {passed}/{len(results)} tests passed")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    main()
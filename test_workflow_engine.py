@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the multi-agent workflow engine.
+
+Steps are plain coroutines that sleep or raise, so these run in about a second
+without an OpenAI key or any agent.
+"""
+
+import time
+import asyncio
+
+import pytest
+
+from workflow_engine import WorkflowPlan, run_plan
+
+
+def test_parse_stages():
+    """The triage syntax becomes a graph whose stages round-trip"""
+    plan = WorkflowPlan.parse("Web Scraper & Market Research Analyst -> Content Writer -> Social Media Manager")
+    assert plan.dependencies["Content Writer"] == ["Web Scraper", "Market Research Analyst"]
+    assert plan.dependencies["Social Media Manager"] == ["Content Writer"]
+    assert plan.stages() == [["Web Scraper", "Market Research Analyst"], ["Content Writer"], ["Social Media Manager"]]
+    assert plan.workflow == "Web Scraper & Market Research Analyst -> Content Writer -> Social Media Manager"
+    assert plan.dependents["Web Scraper"] == ["Content Writer"]
+    assert WorkflowPlan.sequential(["A", "B", "C"]).stages() == [["A"], ["B"], ["C"]]
+    return True
+
+
+def test_invalid_plans_are_rejected():
+    """Cycles, self-dependencies, unknown steps and empty steps raise ValueError"""
+    with pytest.raises(ValueError, match="cycle"):
+        WorkflowPlan({"A": ["C"], "B": ["A"], "C": ["B"]})
+    with pytest.raises(ValueError, match="depends on itself"):
+        WorkflowPlan({"A": ["A"]})
+    with pytest.raises(ValueError, match="not a step"):
+        WorkflowPlan({"A": ["Nobody"]})
+    with pytest.raises(ValueError, match="no steps"):
+        WorkflowPlan({})
+    with pytest.raises(ValueError, match="Empty step"):
+        WorkflowPlan.parse("A -> -> B")
+    return True
+
+
+def test_repeated_agent_gets_its_own_step():
+    """An agent listed again runs as a separate, numbered step that depends on the steps before it"""
+    plan = WorkflowPlan.parse("Content Writer -> Graphic Designer -> Content Writer")
+    assert plan.steps == ["Content Writer", "Graphic Designer", "Content Writer (2)"]
+    assert plan.dependencies["Content Writer (2)"] == ["Graphic Designer"]
+    assert [plan.agents[step] for step in plan.steps] == ["Content Writer", "Graphic Designer", "Content Writer"]
+    assert plan.workflow == "Content Writer -> Graphic Designer -> Content Writer"
+    assert WorkflowPlan.parse("A & B -> A").dependencies == {"A": [], "B": [], "A (2)": ["A", "B"]}
+
+    async def run_step(step, inputs):
+        return f"{plan.agents[step]} after {list(inputs)}"
+
+    outputs, _ = asyncio.run(run_plan(plan, run_step))
+    assert outputs["Content Writer"] == "Content Writer after []"
+    assert outputs["Content Writer (2)"] == "Content Writer after ['Graphic Designer']"
+    return True
+
+
+def test_independent_steps_run_in_parallel():
+    """Steps of one stage overlap, and each step receives exactly its dependencies' outputs"""
+    plan = WorkflowPlan.parse("A & B & C -> D")
+    received = {}
+
+    async def run_step(step, inputs):
+        received[step] = inputs
+        await asyncio.sleep(0.2)
+        return f"{step} output"
+
+    start = time.perf_counter()
+    outputs, durations = asyncio.run(run_plan(plan, run_step))
+    elapsed = time.perf_counter() - start
+    # Three parallel steps then one: two step durations, not four
+    assert elapsed < 0.6, elapsed
+    assert outputs == {step: f"{step} output" for step in "ABCD"}
+    assert received["D"] == {"A": "A output", "B": "B output", "C": "C output"}
+    assert received["A"] == {}
+    assert set(durations) == set("ABCD")
+    return True
+
+
+def test_failed_step_becomes_error_output():
+    """A step that raises gets an ERROR: output and its dependents still run with it"""
+    plan = WorkflowPlan.parse("A & B -> C")
+
+    async def run_step(step, inputs):
+        if step == "A":
+            raise RuntimeError("boom")
+        return f"{step} saw {sorted(inputs.items())}"
+
+    outputs, _ = asyncio.run(run_plan(plan, run_step))
+    assert outputs["A"] == "ERROR: Error executing A: boom"
+    assert outputs["B"] == "B saw []"
+    assert "ERROR: Error executing A: boom" in outputs["C"]
+    return True
+
+
+def test_critical_path():
+    """The longest dependency chain is reported with its total duration"""
+    plan = WorkflowPlan({"A": [], "B": [], "C": ["A", "B"], "D": ["B"]})
+    path, total = plan.critical_path({"A": 1.0, "B": 3.0, "C": 1.0, "D": 0.5})
+    assert path == ["B", "C"]
+    assert total == 4.0
+    return True
+
+
+def test_cancellation_stops_every_step():
+    """Cancelling the run cancels the steps still in flight"""
+    plan = WorkflowPlan.parse("A & B -> C")
+    cancelled = []
+
+    async def run_step(step, inputs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(step)
+            raise
+        return step
+
+    async def scenario():
+        run = asyncio.ensure_future(run_plan(plan, run_step))
+        await asyncio.sleep(0.05)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+
+    asyncio.run(scenario())
+    assert sorted(cancelled) == ["A", "B"]
+    return True
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Running offline workflow engine tests")
+    print("=" * 50)
+
+    tests = [
+        ("Parse stages", test_parse_stages),
+        ("Invalid plans are rejected", test_invalid_plans_are_rejected),
+        ("Repeated agent gets its own step", test_repeated_agent_gets_its_own_step),
+        ("Independent steps run in parallel", test_independent_steps_run_in_parallel),
+        ("Failed step becomes error output", test_failed_step_becomes_error_output),
+        ("Critical path", test_critical_path),
+        ("Cancellation stops every step", test_cancellation_stops_every_step),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+        except Exception as e:
+            print(f"❌ {test_name} failed with exception: {e}")
+            result = False
+        results.append((test_name, result))
+
+    print("\n📊 TEST SUMMARY")
+    print("=" * 30)
+    for test_name, result in results:
+        print(f"{test_name}: {'✅ PASS' if result else '❌ FAIL'}")
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\nOverall: {passed}/{len(results)} tests passed")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import os
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Codec ids stored alongside every blob reference:
+#   0          - raw UTF-8 (records written before compression existed)
+#   1          - zlib without a dictionary
+#   1 + v      - zlib with trained dictionary version v (v >= 1)
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+
+HOT_LEVEL = 1   # Recent records: cheap to write, still a large win on markdown
+COLD_LEVEL = 9  # Compacted records: written once, read rarely
+MAX_DICTIONARY_BYTES = 32 * 1024  # zlib only uses the last 32 KB of a preset dictionary
+
+
+def train_dictionary(samples: List[str], size: int = MAX_DICTIONARY_BYTES) -> bytes:
+    """
+    Build a zlib preset dictionary from sample texts.
+
+    zlib has no trainer of its own, so this collects the lines and word trigrams that
+    recur across samples (markdown headings, boilerplate phrases, agent intros) and packs
+    the most valuable ones into the dictionary, most frequent last since zlib matches
+    closer distances more cheaply.
+
+    Args:
+        samples: Representative texts (e.g. stored agent responses)
+        size: Maximum dictionary size in bytes
+
+    Returns:
+        Dictionary bytes (empty if the samples share nothing useful)
+    """
+    counts = Counter()
+    for text in samples:
+        seen = set()
+        for line in text.splitlines():
+            line = line.strip()
+            if 4 <= len(line) <= 120:
+                seen.add(line)
+        words = re.findall(r"\S+", text)
+        for i in range(len(words) - 2):
+            seen.add(" ".join(words[i:i + 3]))
+        # Count each fragment once per sample so one long document cannot dominate
+        counts.update(seen)
+
+    # Value of a fragment ~ bytes saved across documents that contain it
+    candidates = [(count * len(fragment), fragment) for fragment, count in counts.items() if count > 1]
+    candidates.sort(reverse=True)
+
+    chosen = []
+    total = 0
+    for _, fragment in candidates:
+        encoded = fragment.encode('utf-8') + b"\n"
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+        if total >= size:
+            break
+
+    # Most valuable fragments go last (closest to the data being compressed)
+    return b"".join(reversed(chosen))
+
+
+class TextCodec:
+    """
+    Per-record zlib compression with optional versioned preset dictionaries.
+
+    Dictionaries are stored next to the collection as <prefix>_zdict_v<N>.bin and are
+    never rewritten, so records encoded with an older version stay readable.
+    """
+
+    def __init__(self, dictionary_prefix: str, use_dictionary: bool = True):
+        """
+        Args:
+            dictionary_prefix: Path prefix for dictionary files (db_path/collection_name)
+            use_dictionary: Encode new records with the latest trained dictionary
+        """
+        self.dictionary_prefix = dictionary_prefix
+        self.use_dictionary = use_dictionary
+        self._dictionaries: Dict[int, bytes] = {}
+        self.dictionary_version = 0
+        version = 1
+        while os.path.exists(self._dictionary_path(version)):
+            self.dictionary_version = version
+            version += 1
+
+    def _dictionary_path(self, version: int) -> str:
+        return f"{self.dictionary_prefix}_zdict_v{version}.bin"
+
+    def _dictionary(self, version: int) -> bytes:
+        if version not in self._dictionaries:
+            with open(self._dictionary_path(version), 'rb') as f:
+                self._dictionaries[version] = f.read()
+        return self._dictionaries[version]
+
+    def dictionary_files(self) -> List[str]:
+        """Paths of every dictionary version on disk."""
+        return [self._dictionary_path(v) for v in range(1, self.dictionary_version + 1)]
+
+    def add_dictionary(self, dictionary: bytes) -> int:
+        """
+        Persist a newly trained dictionary as the next version.
+
+        Returns:
+            The new dictionary version
+        """
+        version = self.dictionary_version + 1
+        with open(self._dictionary_path(version), 'wb') as f:
+            f.write(dictionary)
+        self._dictionaries[version] = dictionary
+        self.dictionary_version = version
+        return version
+
+    def current_codec(self) -> int:
+        """Codec id that newly compressed records are written with."""
+        if self.use_dictionary and self.dictionary_version:
+            return CODEC_ZLIB + self.dictionary_version
+        return CODEC_ZLIB
+
+    def detach(self):
+        """
+        Load every dictionary version into memory and delete the files.
+
+        This codec keeps decoding records written with those versions (for readers of
+        older snapshots); a new TextCodec on the same prefix starts from version 0.
+        """
+        for version in range(1, self.dictionary_version + 1):
+            self._dictionary(version)
+        for path in self.dictionary_files():
+            if os.path.exists(path):
+                os.remove(path)
+
+    def encode(self, text: str, level: int = HOT_LEVEL) -> Tuple[bytes, int]:
+        """
+        Compress a text record.
+
+        Returns:
+            (payload, codec id)
+        """
+        data = text.encode('utf-8')
+        codec = self.current_codec()
+        if codec > CODEC_ZLIB:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, 9,
+                                          zlib.Z_DEFAULT_STRATEGY, self._dictionary(codec - CODEC_ZLIB))
+        else:
+            compressor = zlib.compressobj(level)
+        payload = compressor.compress(data) + compressor.flush()
+        # Tiny records can grow under compression; keep them raw
+        if len(payload) >= len(data):
+            return data, CODEC_RAW
+        return payload, codec
+
+    def decode(self, payload: bytes, codec: int) -> str:
+        """Decompress a record written by encode()."""
+        if codec == CODEC_RAW:
+            return payload.decode('utf-8')
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(payload).decode('utf-8')
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS, self._dictionary(codec - CODEC_ZLIB))
+        return (decompressor.decompress(payload) + decompressor.flush()).decode('utf-8')
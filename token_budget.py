@@ -0,0 +1,65 @@
+import os
+from functools import lru_cache
+from typing import Any, Callable, List, Sequence, Tuple
+
+# Encoding used by the GPT-4o / GPT-4.1 family (the Agents SDK default models)
+DEFAULT_ENCODING = "o200k_base"
+# Rough characters per token for English text, used only when tiktoken is not installed
+FALLBACK_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str = None):
+    """Load the tiktoken encoding for a model (None when tiktoken is not installed)."""
+    try:
+        import tiktoken
+    except ImportError:
+        print("⚠️ Warning: tiktoken is not installed; estimating token counts from text length")
+        return None
+    if model:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """
+    Count the tokens a model will see for `text`.
+
+    Args:
+        text: Text to measure
+        model: Model name (defaults to OPENAI_MODEL, else the o200k_base encoding)
+
+    Returns:
+        Token count (an estimate of len/4 when tiktoken is unavailable)
+    """
+    encoding = _encoding(model or os.getenv("OPENAI_MODEL"))
+    if encoding is None:
+        return -(-len(text) // FALLBACK_CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def pack_to_budget(items: Sequence, budget: int, counter: Callable[[Any], int] = count_tokens) -> Tuple[List[int], int]:
+    """
+    Greedily keep items, in priority order, while they fit a token budget.
+
+    An item that does not fit is skipped rather than ending the packing, so a smaller
+    lower-priority item can still use the remaining room.
+
+    Args:
+        items: Candidates (texts by default), highest priority first
+        budget: Maximum total tokens
+        counter: Returns an item's token count (e.g. one cached on the item instead of counting text)
+
+    Returns:
+        (indices of the kept items in priority order, tokens used)
+    """
+    kept, used = [], 0
+    for i, item in enumerate(items):
+        tokens = counter(item)
+        if used + tokens <= budget:
+            kept.append(i)
+            used += tokens
+    return kept, used
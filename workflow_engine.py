@@ -0,0 +1,181 @@
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Sequence, Tuple
+
+# Triage workflow syntax: stages separated by "->", agents that can run concurrently within
+# a stage joined by "&", e.g. "Web Scraper & Market Research Analyst -> Content Writer"
+STAGE_SEPARATOR = "->"
+PARALLEL_SEPARATOR = "&"
+
+
+class WorkflowPlan:
+    """
+    Dependency graph of a multi-agent workflow: each step runs an agent and lists the
+    steps whose outputs it needs. Steps without a path between them may run concurrently.
+    A step is named after its agent; an agent that appears again gets a numbered step
+    ("Content Writer (2)"), so the same agent can run at several points of a workflow.
+    """
+
+    def __init__(self, dependencies: Dict[str, Sequence[str]], description: str = "",
+                 agents: Dict[str, str] = None):
+        """
+        Args:
+            dependencies: step -> steps it depends on (insertion order is the display order)
+            description: What the workflow achieves
+            agents: step -> agent that runs it, for steps not named after their agent
+
+        Raises:
+            ValueError: A dependency is not a step of the plan, or the graph has a cycle
+        """
+        if not dependencies:
+            raise ValueError("Workflow has no steps")
+        self.description = description
+        self.dependencies = {step: list(dict.fromkeys(deps)) for step, deps in dependencies.items()}
+        self.agents = {step: (agents or {}).get(step, step) for step in self.dependencies}
+        for step, deps in self.dependencies.items():
+            for dep in deps:
+                if dep not in self.dependencies:
+                    raise ValueError(f"'{step}' depends on '{dep}', which is not a step of the workflow")
+                if dep == step:
+                    raise ValueError(f"'{step}' depends on itself")
+        self.dependents: Dict[str, List[str]] = {step: [] for step in self.dependencies}
+        for step, deps in self.dependencies.items():
+            for dep in deps:
+                self.dependents[dep].append(step)
+        self.levels = self._levels()
+        # Topological order, stable with respect to the order steps were given in
+        self.steps = sorted(self.dependencies, key=lambda step: self.levels[step])
+
+    def _levels(self) -> Dict[str, int]:
+        """Longest dependency chain below each step (0 for steps with no dependencies)."""
+        levels: Dict[str, int] = {}
+        visiting = set()
+
+        def level(step: str) -> int:
+            if step in levels:
+                return levels[step]
+            if step in visiting:
+                raise ValueError(f"Workflow has a dependency cycle through '{step}'")
+            visiting.add(step)
+            levels[step] = 1 + max((level(dep) for dep in self.dependencies[step]), default=-1)
+            visiting.discard(step)
+            return levels[step]
+
+        for step in self.dependencies:
+            level(step)
+        return levels
+
+    @classmethod
+    def parse(cls, workflow: str, description: str = "") -> "WorkflowPlan":
+        """
+        Build a plan from the triage syntax "A & B -> C -> D": every agent of a stage depends
+        on every agent of the stage before it. An agent may be listed more than once
+        ("A -> B -> A"); each later occurrence is a separate, numbered step.
+
+        Raises:
+            ValueError: Empty stage
+        """
+        stages = [[agent.strip() for agent in stage.split(PARALLEL_SEPARATOR)]
+                  for stage in workflow.split(STAGE_SEPARATOR)]
+        dependencies: Dict[str, List[str]] = {}
+        agents: Dict[str, str] = {}
+        previous: List[str] = []
+        for stage in stages:
+            if not all(stage):
+                raise ValueError(f"Empty step in workflow '{workflow}'")
+            steps = []
+            for agent in stage:
+                step, occurrence = agent, 1
+                while step in dependencies:
+                    occurrence += 1
+                    step = f"{agent} ({occurrence})"
+                dependencies[step] = previous
+                agents[step] = agent
+                steps.append(step)
+            previous = steps
+        return cls(dependencies, description, agents)
+
+    @classmethod
+    def sequential(cls, agents: Sequence[str], description: str = "") -> "WorkflowPlan":
+        """A plan that runs the agents one after another, each depending on the one before."""
+        return cls.parse(f" {STAGE_SEPARATOR} ".join(agents), description)
+
+    def stages(self) -> List[List[str]]:
+        """Steps grouped by level: every step of a stage can start once the earlier stages finish."""
+        stages: List[List[str]] = [[] for _ in range(max(self.levels.values()) + 1)]
+        for step in self.steps:
+            stages[self.levels[step]].append(step)
+        return stages
+
+    @property
+    def workflow(self) -> str:
+        """The plan in triage syntax (exact for staged plans; levels for arbitrary graphs)."""
+        return f" {STAGE_SEPARATOR} ".join(f" {PARALLEL_SEPARATOR} ".join(self.agents[step] for step in stage)
+                                           for stage in self.stages())
+
+    def critical_path(self, durations: Dict[str, float]) -> Tuple[List[str], float]:
+        """
+        The dependency chain with the largest total duration, which bounds the workflow's
+        end-to-end time when independent steps run concurrently.
+
+        Args:
+            durations: step -> duration
+
+        Returns:
+            (steps of the path in execution order, total duration)
+        """
+        finish: Dict[str, float] = {}
+        via: Dict[str, str] = {}
+        for step in self.steps:
+            start = 0.0
+            for dep in self.dependencies[step]:
+                if finish[dep] > start:
+                    start, via[step] = finish[dep], dep
+            finish[step] = start + durations.get(step, 0.0)
+        step = max(finish, key=finish.get)
+        total = finish[step]
+        path = [step]
+        while path[-1] in via:
+            path.append(via[path[-1]])
+        return path[::-1], total
+
+
+async def run_plan(plan: WorkflowPlan,
+                   run_step: Callable[[str, Dict[str, str]], Awaitable[str]]) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """
+    Execute a plan, starting every step as soon as all of its dependencies have finished.
+
+    A step that raises gets an "ERROR: ..." output and its dependents still run (with that
+    output as their input), matching how sequential workflows continue past a failed agent.
+
+    Args:
+        plan: The workflow to run
+        run_step: Coroutine function (step, {dependency: output}) -> output
+
+    Returns:
+        (step -> output, step -> duration in seconds)
+    """
+    tasks: Dict[str, asyncio.Task] = {}
+    durations: Dict[str, float] = {}
+
+    async def execute(step: str) -> str:
+        inputs = {}
+        for dep in plan.dependencies[step]:
+            inputs[dep] = await tasks[dep]
+        start = time.perf_counter()
+        try:
+            return await run_step(step, inputs)
+        except Exception as e:
+            return f"ERROR: Error executing {step}: {e}"
+        finally:
+            durations[step] = time.perf_counter() - start
+
+    for step in plan.steps:
+        tasks[step] = asyncio.ensure_future(execute(step))
+    try:
+        outputs = dict(zip(plan.steps, await asyncio.gather(*tasks.values())))
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+    return outputs, durations
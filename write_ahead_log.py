@@ -0,0 +1,119 @@
+import os
+import glob
+import json
+import threading
+from typing import Dict, Iterator, List
+
+# Durability levels for WAL appends:
+#   none   - buffered in the process; reaches disk at the next group commit
+#   flush  - handed to the OS on every append (survives a process crash)
+#   fsync  - forced to stable storage on every append (survives power loss)
+DURABILITY_LEVELS = ("none", "flush", "fsync")
+
+
+class WriteAheadLog:
+    """
+    Append-only JSON-lines log of records that are not yet in the collection files.
+
+    The log is split into numbered segments. A checkpoint rotates to a new segment,
+    writes the collection files, then discards the segments it covered, so the log
+    only ever holds the records appended since the last group commit.
+    """
+
+    def __init__(self, prefix: str, durability: str = "flush"):
+        """
+        Open the log, continuing after any segments left by a previous run.
+
+        Args:
+            prefix: Path prefix for segment files (db_path/collection_name)
+            durability: One of DURABILITY_LEVELS
+        """
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability '{durability}'. Expected one of: {', '.join(DURABILITY_LEVELS)}")
+        self.prefix = prefix
+        self.durability = durability
+        self._lock = threading.Lock()
+        existing = self._segment_numbers()
+        self._segment = (existing[-1] + 1) if existing else 1
+        self._file = None
+
+    def _segment_path(self, number: int) -> str:
+        return f"{self.prefix}_wal_{number:06d}.jsonl"
+
+    def _segment_numbers(self) -> List[int]:
+        numbers = []
+        for path in glob.glob(f"{glob.escape(self.prefix)}_wal_*.jsonl"):
+            suffix = path[len(self.prefix) + len("_wal_"):-len(".jsonl")]
+            if suffix.isdigit():
+                numbers.append(int(suffix))
+        return sorted(numbers)
+
+    def files(self) -> List[str]:
+        """Paths of every segment on disk, oldest first."""
+        return [self._segment_path(n) for n in self._segment_numbers()]
+
+    def append(self, record: Dict):
+        """
+        Append one record, then flush or fsync it according to the durability level.
+
+        Args:
+            record: JSON-serializable record
+        """
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self._segment_path(self._segment), 'a', encoding='utf-8')
+            self._file.write(line)
+            if self.durability != "none":
+                self._file.flush()
+                if self.durability == "fsync":
+                    os.fsync(self._file.fileno())
+
+    def rotate(self) -> int:
+        """
+        Close the current segment so later appends go to a new one.
+
+        Returns:
+            The last segment number covered by a checkpoint taken now
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._file.close()
+                self._file = None
+            covered = self._segment
+            self._segment += 1
+            return covered
+
+    def discard_through(self, segment: int):
+        """Delete every segment up to and including `segment` (its records are checkpointed)."""
+        for number in self._segment_numbers():
+            if number <= segment:
+                os.remove(self._segment_path(number))
+
+    def replay(self) -> Iterator[Dict]:
+        """
+        Yield the records of every closed segment on disk, oldest first.
+
+        A torn final line (the process died mid-write) ends its segment.
+        """
+        for path in self.files():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+
+    def close(self):
+        """Flush and close the current segment."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._file.close()
+                self._file = None
+
+    def clear(self):
+        """Delete every segment."""
+        self.close()
+        self.discard_through(self._segment)